@@ -7,6 +7,7 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
+from flask_apscheduler import APScheduler
 
 class Base(DeclarativeBase):
     pass
@@ -25,6 +26,9 @@ mail = Mail()
 # Initialize CSRF protection
 csrf = CSRFProtect()
 
+# Initialize the background job scheduler
+scheduler = APScheduler()
+
 # Make CSRF token available in the session
 def get_csrf_token():
     from flask import session
@@ -59,10 +63,61 @@ def create_app():
         MAIL_USERNAME=os.environ.get('MAIL_USERNAME'),
         MAIL_PASSWORD=os.environ.get('MAIL_PASSWORD'),
         MAIL_DEFAULT_SENDER=os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@example.com'),
+        # Outbound email queue settings
+        EMAIL_QUEUE_ENABLED=os.environ.get('EMAIL_QUEUE_ENABLED', 'True').lower() in ('true', '1', 't'),
+        EMAIL_OUTBOX_INTERVAL=int(os.environ.get('EMAIL_OUTBOX_INTERVAL', 5)),  # Seconds between sends
+        EMAIL_OUTBOX_BATCH_SIZE=int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50)),
+        EMAIL_OUTBOX_MAX_ATTEMPTS=int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5)),
+        # Host digest notifications
+        NOTIFICATION_DIGEST_WINDOW=int(os.environ.get('NOTIFICATION_DIGEST_WINDOW', 120)),  # Seconds to coalesce notifications
+        NOTIFICATION_DIGEST_INTERVAL=int(os.environ.get('NOTIFICATION_DIGEST_INTERVAL', 30)),  # Seconds between digest runs
+        # Audit log buffering
+        AUDIT_LOG_FLUSH_SIZE=int(os.environ.get('AUDIT_LOG_FLUSH_SIZE', 100)),  # Entries that trigger an immediate write
+        AUDIT_LOG_FLUSH_INTERVAL=float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 2)),  # Seconds between background flushes
+        AUDIT_LOG_BUFFER_SIZE=int(os.environ.get('AUDIT_LOG_BUFFER_SIZE', 10000)),
+        AUDIT_LOG_OVERFLOW=os.environ.get('AUDIT_LOG_OVERFLOW', 'drop'),  # drop or spill when the buffer is full
+        AUDIT_LOG_SPILL_PATH=os.environ.get('AUDIT_LOG_SPILL_PATH', os.path.join(app.instance_path, 'audit-spill.jsonl')),
+        # Table partitioning and retention
+        PARTITION_MONTHS_AHEAD=int(os.environ.get('PARTITION_MONTHS_AHEAD', 3)),
+        PARTITION_MAINTENANCE_INTERVAL=int(os.environ.get('PARTITION_MAINTENANCE_INTERVAL', 24)),  # Hours between runs
+        RETENTION_ENABLED=os.environ.get('RETENTION_ENABLED', 'False').lower() in ('true', '1', 't'),  # Delete history past plan retention; off unless set
+        RETENTION_BATCH_SIZE=int(os.environ.get('RETENTION_BATCH_SIZE', 1000)),
+        # Request profiling and metrics
+        PROFILING_ENABLED=os.environ.get('PROFILING_ENABLED', 'False').lower() in ('true', '1', 't'),
+        PROFILING_HEADER=os.environ.get('PROFILING_HEADER', 'X-Profile-SQL'),  # Admins sending this header with 1/true/on are profiled
+        PROFILING_TOKEN=os.environ.get('PROFILING_TOKEN'),  # Other clients are profiled when they send this value in the header
+        PROFILING_SAMPLE_RATE=float(os.environ.get('PROFILING_SAMPLE_RATE', 0)),  # Share of other requests profiled
+        PROFILING_SLOW_STATEMENTS=int(os.environ.get('PROFILING_SLOW_STATEMENTS', 5)),  # Slowest statements kept per endpoint
+        METRICS_ENABLED=os.environ.get('METRICS_ENABLED', 'True').lower() in ('true', '1', 't'),
+        METRICS_DIR=os.environ.get('METRICS_DIR', os.environ.get('PROMETHEUS_MULTIPROC_DIR')),  # Per-worker metric files; empty it before each start
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN'),  # Bearer token required by /metrics; without one it is not served
+        # Background jobs
+        SCHEDULER_ENABLED=os.environ.get('SCHEDULER_ENABLED', 'True').lower() in ('true', '1', 't'),
         # Application settings
         APP_NAME='Visitor Management System',
         ADMIN_EMAIL=os.environ.get('ADMIN_EMAIL', 'admin@example.com'),
-        MAX_CONTENT_LENGTH=16 * 1024 * 1024  # 16MB max upload size
+        MAX_CONTENT_LENGTH=16 * 1024 * 1024,  # 16MB max upload size
+        IMPORT_BATCH_SIZE=int(os.environ.get('IMPORT_BATCH_SIZE', 1000)),  # Rows written per import batch
+        PREREGISTRATION_CONFIRMATION_INTERVAL=int(os.environ.get('PREREGISTRATION_CONFIRMATION_INTERVAL', 30)),  # Seconds between confirmation runs
+        PREREGISTRATION_CONFIRMATION_BATCH_SIZE=int(os.environ.get('PREREGISTRATION_CONFIRMATION_BATCH_SIZE', 100)),  # Confirmations claimed per transaction
+        EXPRESS_TOKEN_VALID_DAYS=int(os.environ.get('EXPRESS_TOKEN_VALID_DAYS', 1)),  # Days after the expected arrival an express code or QR code still works
+        USER_CACHE_TTL=int(os.environ.get('USER_CACHE_TTL', 60)),  # Seconds a session's password/role stamp is cached
+        ORGANIZATION_CACHE_TTL=int(os.environ.get('ORGANIZATION_CACHE_TTL', 60)),  # Seconds an organization snapshot is cached
+        ROSTER_REVALIDATE_SECONDS=float(os.environ.get('ROSTER_REVALIDATE_SECONDS', 0)),  # Seconds an active roster is served before checking for other workers' changes
+        EXPORT_BATCH_SIZE=int(os.environ.get('EXPORT_BATCH_SIZE', 1000)),  # Rows fetched per export cursor batch
+        # Application cache: 'memory' (per worker), 'file' (per host) or 'redis' (shared)
+        CACHE_BACKEND=os.environ.get('CACHE_BACKEND', 'memory'),
+        CACHE_MEMORY_SIZE=int(os.environ.get('CACHE_MEMORY_SIZE', 10000)),  # Entries kept by the memory backend
+        CACHE_PATH=os.environ.get('CACHE_PATH', os.path.join(app.instance_path, 'cache')),
+        CACHE_FILE_PRUNE_INTERVAL=int(os.environ.get('CACHE_FILE_PRUNE_INTERVAL', 300)),  # Seconds between sweeps of expired cache files
+        CACHE_REDIS_URL=os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+        CACHE_KEY_PREFIX=os.environ.get('CACHE_KEY_PREFIX', 'vms'),
+        CACHE_DEFAULT_TTL=int(os.environ.get('CACHE_DEFAULT_TTL', 300)),  # Seconds entries without their own TTL are kept
+        # Blob storage for photos, logos and documents
+        BLOB_STORAGE_BACKEND=os.environ.get('BLOB_STORAGE_BACKEND', 'local'),
+        BLOB_STORAGE_PATH=os.environ.get('BLOB_STORAGE_PATH', os.path.join(app.instance_path, 'blobs')),
+        THUMBNAIL_CACHE_PATH=os.environ.get('THUMBNAIL_CACHE_PATH', os.path.join(app.instance_path, 'thumbnails')),
+        ASSETS_PATH=os.environ.get('ASSETS_PATH', os.path.join(app.instance_path, 'assets'))  # Output of `flask build-assets`
     )
     
     # Configure logging
@@ -79,6 +134,28 @@ def create_app():
     # Initialize CSRF protection
     csrf.init_app(app)
     
+    # Initialize blob storage
+    from app.blobstore import init_blob_store
+    init_blob_store(app)
+    
+    # Serve fingerprinted, precompressed static assets once built
+    from app.assets import init_assets
+    init_assets(app)
+    
+    # Initialize the application cache
+    from app.cache import init_cache
+    init_cache(app)
+    
+    # Initialize buffered audit logging
+    from app.audit import init_audit_log
+    init_audit_log(app)
+    
+    # Initialize request metrics and SQL profiling of sampled requests
+    from app.metrics import init_metrics
+    from app.profiling import init_profiling
+    init_metrics(app)
+    init_profiling(app)
+    
     # Register blueprints
     with app.app_context():
         # Import models to ensure they're registered with SQLAlchemy
@@ -117,6 +194,31 @@ def create_app():
         
         from app.routes.subscription import subscription
         app.register_blueprint(subscription)
+        
+        from app.routes.media import media
+        app.register_blueprint(media)
+        
+        from app.routes.metrics import metrics
+        app.register_blueprint(metrics)
+    
+    # Register CLI commands
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # Start background jobs
+    if app.config['SCHEDULER_ENABLED'] and not scheduler.running:
+        from app.mail_queue import schedule_outbox
+        from app.digests import schedule_digests
+        from app.audit import schedule_audit_flush
+        from app.partitions import schedule_partition_maintenance
+        from app.preregistration import schedule_preregistration_confirmations
+        scheduler.init_app(app)
+        schedule_outbox(app)
+        schedule_digests(app)
+        schedule_audit_flush(app)
+        schedule_partition_maintenance(app)
+        schedule_preregistration_confirmations(app)
+        scheduler.start()
     
     # Register template filters
     @app.template_filter('format_datetime')
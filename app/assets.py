@@ -0,0 +1,357 @@
+"""
+Static asset pipeline for Visitor Management System.
+``flask build-assets`` minifies the stylesheets and scripts under
+app/static, concatenates the bundles the kiosk pages load, and writes each
+file under a content-hashed name next to gzip and brotli variants, with a
+manifest of the names. url_for()
+then emits the hashed URLs, which are served precompressed and cached by
+browsers for a year. Without a manifest, as in development, the source
+files are served as before and bundles are concatenated on request.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import brotli
+from flask import current_app, request, send_file
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Bundles built from several source files, in load order
+ASSET_BUNDLES = {
+    'css/kiosk-bundle.css': ['css/main.css', 'css/kiosk.css'],
+}
+
+ASSET_EXTENSIONS = ('.css', '.js')
+MANIFEST_NAME = 'manifest.json'
+
+# Built file names end in the first 12 hex digits of their content hash
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.(css|js)$')
+
+# Hashed names never change content
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Precompressed variants, in order of preference
+ASSET_ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+
+_WORD = re.compile(r'[\w$]')
+_WORD_RUN = re.compile(r'[\w$]+')
+_CSS_TIGHT = set('{};,>')
+# After these tokens an expression has ended, so a slash is a division
+_OPERAND_END = set(')]')
+# Keywords after which a slash still starts a regular expression
+_REGEX_AFTER_WORDS = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                      'void', 'throw', 'instanceof', 'yield', 'await'}
+
+def _read_quoted(text, i):
+    """Return the index just past the string literal starting at text[i]."""
+    quote = text[i]
+    i += 1
+    while i < len(text) and text[i] != quote:
+        i += 2 if text[i] == '\\' else 1
+    return i + 1
+
+def minify_css(text):
+    """Remove comments and unneeded whitespace from a stylesheet."""
+    out = []
+    i = 0
+    space = False
+    while i < len(text):
+        char = text[i]
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+            space = True
+            continue
+        if char.isspace():
+            space = True
+            i += 1
+            continue
+        if space and out and out[-1][-1] not in _CSS_TIGHT and char not in _CSS_TIGHT:
+            out.append(' ')
+        space = False
+        if char in '"\'':
+            end = _read_quoted(text, i)
+            out.append(text[i:end])
+            i = end
+            continue
+        if char == '}' and out and out[-1] == ';':
+            out.pop()
+        out.append(char)
+        i += 1
+    return ''.join(out)
+
+def _keep_space(previous, following):
+    """Whether the whitespace between two JavaScript characters is significant."""
+    if _WORD.match(previous) and _WORD.match(following):
+        return True
+    if previous in '+-' and following in '+-':
+        return True
+    if previous == '/' or following == '/':
+        return True
+    return following == '.' and previous.isdigit()
+
+def minify_js(text):
+    """
+    Remove comments, indentation and blank lines from a script.
+
+    Line breaks are kept so automatic semicolon insertion is unaffected;
+    strings, template literals and regular expressions are copied as-is.
+    """
+    lines = [[]]
+    last = ''  # Last character written, or '' at the start of a line
+    previous = ''  # Last token written
+    operand = False  # Whether the tokens written so far end an expression
+    space = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end < 0 else end
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = len(text) if end < 0 else end + 2
+            # A comment spanning lines still ends a statement
+            char = '\n' if '\n' in text[i:end] else ' '
+            i = end - 1
+        if char == '\n':
+            if lines[-1]:
+                lines.append([])
+            last, space = '', False
+            i += 1
+            continue
+        if char.isspace():
+            space = True
+            i += 1
+            continue
+
+        if space and last and _keep_space(last, char):
+            lines[-1].append(' ')
+        space = False
+        if char in '"\'`':
+            end = _read_quoted(text, i)
+        elif char == '/' and not operand:
+            end = _read_regex(text, i)
+        elif _WORD.match(char):
+            end = _WORD_RUN.match(text, i).end()
+        elif text.startswith(('++', '--'), i):
+            end = i + 2
+        else:
+            end = i + 1
+        token = text[i:end]
+        operand = _ends_operand(token, previous, operand)
+        lines[-1].append(token)
+        # Template literals may span lines
+        if '\n' in token:
+            lines[-1] = [''.join(lines[-1])]
+        last = token[-1]
+        previous = token
+        i = end
+    return '\n'.join(''.join(line) for line in lines if line) + '\n'
+
+def _ends_operand(token, previous, operand):
+    """
+    Whether an expression has ended once ``token`` is written, so that a
+    following slash is a division rather than the start of a regular
+    expression.
+    """
+    if token in ('++', '--'):
+        # Postfix after an operand (x++ / 2), prefix otherwise (++x)
+        return operand
+    if token[0] in '"\'`' or token in _OPERAND_END:
+        return True
+    if token[0] == '/':
+        # A regular expression literal, not a division sign
+        return len(token) > 1
+    if _WORD.match(token):
+        # Property names (a.return) are operands even when they are keywords
+        return previous == '.' or token not in _REGEX_AFTER_WORDS
+    return False
+
+def _read_regex(text, i):
+    """Return the index just past the regular expression literal (with flags) at text[i]."""
+    i += 1
+    in_class = False
+    while i < len(text) and text[i] != '\n':
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            i += 1
+            break
+        i += 1
+    while i < len(text) and text[i].isalpha():
+        i += 1
+    return i
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+def _source_files(static_folder):
+    """Return the paths, relative to the static folder, of the assets to build."""
+    names = []
+    for directory, _, files in os.walk(static_folder):
+        for name in files:
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.relpath(os.path.join(directory, name), static_folder)
+                names.append(path.replace(os.sep, '/'))
+    return sorted(names)
+
+def _read_bundle(static_folder, filenames):
+    parts = []
+    for filename in filenames:
+        with open(os.path.join(static_folder, filename), encoding='utf-8') as f:
+            parts.append(f.read())
+    return '\n'.join(parts)
+
+def _write_file(path, data):
+    """Write a file atomically so a running server never serves part of it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def _compress(data):
+    """Return the precompressed variants of a file that are smaller than it."""
+    variants = {
+        'br': brotli.compress(data, quality=11),
+        'gzip': gzip.compress(data, compresslevel=9, mtime=0),
+    }
+    return {encoding: compressed for encoding, compressed in variants.items() if len(compressed) < len(data)}
+
+def build_assets(static_folder, output_path):
+    """
+    Minify, bundle, fingerprint and precompress the static assets.
+
+    Files from earlier builds are kept and still served (see
+    serve_static()), so pages already served or cached with their URLs
+    keep working after a new release.
+
+    Args:
+        static_folder (str): Directory of the source assets
+        output_path (str): Directory the built assets and manifest are written to
+
+    Returns:
+        dict: Manifest with 'files' (source name -> hashed name) and
+            'encodings' (hashed name -> precompressed encodings)
+    """
+    sources = {filename: [filename] for filename in _source_files(static_folder)}
+    sources.update(ASSET_BUNDLES)
+
+    manifest = {'files': {}, 'encodings': {}}
+    for filename, parts in sorted(sources.items()):
+        base, extension = os.path.splitext(filename)
+        data = MINIFIERS[extension](_read_bundle(static_folder, parts)).encode('utf-8')
+        hashed = f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+        path = os.path.join(output_path, hashed)
+        _write_file(path, data)
+        variants = _compress(data)
+        for encoding, suffix in ASSET_ENCODINGS:
+            if encoding in variants:
+                _write_file(path + suffix, variants[encoding])
+        manifest['files'][filename] = hashed
+        manifest['encodings'][hashed] = [encoding for encoding, _ in ASSET_ENCODINGS if encoding in variants]
+
+    # The manifest is written last so it only names complete files
+    _write_file(os.path.join(output_path, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+def load_manifest(output_path):
+    """Return the manifest of a build, or None if the assets have not been built."""
+    try:
+        with open(os.path.join(output_path, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.error(f"Error reading asset manifest: {str(e)}")
+        return None
+
+def hashed_static_url(endpoint, values):
+    """url_defaults hook pointing url_for('static', ...) at the built file."""
+    if endpoint != 'static':
+        return
+    manifest = current_app.extensions['assets']
+    if manifest is not None:
+        hashed = manifest['files'].get(values.get('filename'))
+        if hashed is not None:
+            values['filename'] = hashed
+
+def _earlier_build(filename):
+    """
+    Return the precompressed encodings of a file from an earlier build.
+
+    Only the current build is in the manifest, but pages rendered before a
+    release (or kept in the page cache) still link to the files it replaced.
+
+    Returns:
+        list: Encodings available for the file, or None if it is not a built file
+    """
+    if not HASHED_NAME.search(filename):
+        return None
+    path = safe_join(current_app.config['ASSETS_PATH'], filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return [encoding for encoding, suffix in ASSET_ENCODINGS if os.path.isfile(path + suffix)]
+
+def serve_static(filename):
+    """Serve built assets precompressed and immutable, other static files as Flask does."""
+    manifest = current_app.extensions['assets']
+    if manifest is not None:
+        encodings = manifest['encodings'].get(filename)
+        if encodings is None:
+            encodings = _earlier_build(filename)
+        if encodings is not None:
+            return _send_built(filename, encodings)
+    if filename in ASSET_BUNDLES:
+        body = _read_bundle(current_app.static_folder, ASSET_BUNDLES[filename])
+        return current_app.response_class(body, mimetype=mimetypes.guess_type(filename)[0])
+    return current_app.send_static_file(filename)
+
+def _send_built(filename, encodings):
+    path = os.path.join(current_app.config['ASSETS_PATH'], filename)
+    encoding = next((name for name, _ in ASSET_ENCODINGS
+                     if name in encodings and request.accept_encodings[name]), None)
+    suffix = dict(ASSET_ENCODINGS)[encoding] if encoding else ''
+    response = send_file(path + suffix, mimetype=mimetypes.guess_type(filename)[0], max_age=ASSET_MAX_AGE,
+                         etag=f'{filename}{suffix}')
+    if encoding:
+        response.content_encoding = encoding
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def init_assets(app):
+    """Serve the built assets, if any, through url_for('static', ...)."""
+    manifest = load_manifest(app.config['ASSETS_PATH'])
+    if manifest is None:
+        logger.info("Static assets are not built; serving source files")
+    app.extensions['assets'] = manifest
+    app.url_defaults(hashed_static_url)
+    if app.has_static_folder:
+        app.view_functions['static'] = serve_static
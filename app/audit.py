@@ -0,0 +1,203 @@
+"""
+Buffered audit logging for Visitor Management System.
+Log entries are collected in memory and written with one multi-row INSERT
+per request, or by a background flusher for events raised outside a
+request, instead of committing a transaction for every event.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from flask import current_app, g, has_request_context
+from app import db, scheduler
+from app.models import Log
+
+logger = logging.getLogger(__name__)
+
+_buffer_lock = threading.Lock()
+_buffer = []  # Entries raised outside a request, or from failed request flushes
+_spill_lock = threading.Lock()
+_metrics = {
+    'written': 0,
+    'dropped': 0,
+    'spilled': 0,
+    'flushes': 0,
+    'failed_flushes': 0,
+}
+
+def record_audit_event(organization_id, user_id, event_type, event_data=None):
+    """
+    Add an entry to the audit log buffer.
+
+    Inside a request the entry is written when the request ends; otherwise
+    it is written by the background flusher, or immediately once
+    AUDIT_LOG_FLUSH_SIZE entries are waiting.
+
+    Args:
+        organization_id: ID of the organization the event belongs to
+        user_id: ID of the user who caused the event, if any
+        event_type (str): Event name, e.g. visitor_check_in
+        event_data (dict, optional): Event details, stored as JSON
+    """
+    entry = {
+        'organization_id': organization_id,
+        'user_id': user_id,
+        'event_type': event_type,
+        'event_data': json.dumps(event_data) if event_data else None,
+        'created_at': datetime.utcnow(),
+    }
+    flush_size = current_app.config['AUDIT_LOG_FLUSH_SIZE']
+
+    if has_request_context():
+        entries = g.setdefault('audit_log_entries', [])
+        entries.append(entry)
+        if len(entries) >= flush_size:
+            flush_request_audit_log()
+        return
+
+    if _buffer_entries([entry]) >= flush_size:
+        flush_audit_log()
+
+def _buffer_entries(entries):
+    """Add entries to the shared buffer, applying the overflow policy; returns the buffer length."""
+    with _buffer_lock:
+        room = max(current_app.config['AUDIT_LOG_BUFFER_SIZE'] - len(_buffer), 0)
+        _buffer.extend(entries[:room])
+        overflow = entries[room:]
+        length = len(_buffer)
+
+    if overflow:
+        if current_app.config['AUDIT_LOG_OVERFLOW'] == 'spill':
+            _spill(overflow)
+        else:
+            with _buffer_lock:
+                _metrics['dropped'] += len(overflow)
+            logger.warning(f"Audit log buffer full, dropped {len(overflow)} entries")
+    return length
+
+def _spill(entries):
+    """Append entries that do not fit in the buffer to the spill file."""
+    path = current_app.config['AUDIT_LOG_SPILL_PATH']
+    try:
+        with _spill_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as spill:
+                for entry in entries:
+                    spill.write(json.dumps(dict(entry, created_at=entry['created_at'].isoformat())) + '\n')
+        with _buffer_lock:
+            _metrics['spilled'] += len(entries)
+    except OSError as e:
+        logger.error(f"Error spilling audit log entries: {str(e)}")
+        with _buffer_lock:
+            _metrics['dropped'] += len(entries)
+
+def _insert(entries):
+    """Write entries with a single multi-row INSERT on its own connection."""
+    with db.engine.begin() as connection:
+        connection.execute(Log.__table__.insert(), entries)
+    with _buffer_lock:
+        _metrics['written'] += len(entries)
+        _metrics['flushes'] += 1
+
+def _write_or_buffer(entries):
+    try:
+        _insert(entries)
+        return True
+    except Exception as e:
+        logger.error(f"Error writing audit log: {str(e)}")
+        with _buffer_lock:
+            _metrics['failed_flushes'] += 1
+        _buffer_entries(entries)
+        return False
+
+def flush_request_audit_log(exception=None):
+    """Write the entries collected during the current request."""
+    entries = g.pop('audit_log_entries', None)
+    if entries:
+        _write_or_buffer(entries)
+
+def _replay_spill():
+    """Write entries from the spill file back to the database."""
+    path = current_app.config['AUDIT_LOG_SPILL_PATH']
+    replaying = path + '.replay'
+    with _spill_lock:
+        # A leftover replay file is from a failed replay and is retried first
+        if not os.path.exists(replaying):
+            if not os.path.exists(path):
+                return 0
+            os.replace(path, replaying)
+
+    with open(replaying, encoding='utf-8') as spill:
+        entries = [json.loads(line) for line in spill if line.strip()]
+    for entry in entries:
+        entry['created_at'] = datetime.fromisoformat(entry['created_at'])
+
+    if entries:
+        _insert(entries)
+    os.remove(replaying)
+    return len(entries)
+
+def flush_audit_log():
+    """
+    Write every buffered entry, then any spilled entries.
+
+    Returns:
+        int: Number of entries written
+    """
+    with _buffer_lock:
+        entries = _buffer[:]
+        del _buffer[:]
+
+    written = 0
+    if entries:
+        if not _write_or_buffer(entries):
+            return 0
+        written = len(entries)
+
+    try:
+        written += _replay_spill()
+    except Exception as e:
+        logger.error(f"Error replaying spilled audit log entries: {str(e)}")
+    return written
+
+def get_audit_log_metrics():
+    """
+    Return this process's audit log buffer statistics.
+
+    Returns:
+        dict: buffered, written, dropped, spilled, flushes and failed_flushes
+    """
+    with _buffer_lock:
+        metrics = dict(_metrics)
+        metrics['buffered'] = len(_buffer)
+    return metrics
+
+def init_audit_log(app):
+    """Write request entries when each request ends, and the buffer at exit."""
+    app.teardown_request(flush_request_audit_log)
+
+    def flush_at_exit():
+        with app.app_context():
+            flush_audit_log()
+
+    atexit.register(flush_at_exit)
+
+def schedule_audit_flush(app):
+    """Register the background job that flushes the audit log buffer."""
+
+    def flush_audit_log_job():
+        with app.app_context():
+            flush_audit_log()
+
+    scheduler.add_job(
+        id='flush_audit_log',
+        func=flush_audit_log_job,
+        trigger='interval',
+        seconds=app.config['AUDIT_LOG_FLUSH_INTERVAL'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
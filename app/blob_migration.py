@@ -0,0 +1,99 @@
+"""
+Migration of legacy base64 columns into the blob store.
+Existing photos, logos and documents are streamed out of the database in
+batches and replaced with blob references.
+"""
+
+import base64
+import binascii
+import logging
+from sqlalchemy import text
+from app import db
+from app.blobstore import get_blob_store
+from app.models import Document, Organization, Staff, Visitor
+from app.query_utils import add_missing_columns, dialect_name
+
+logger = logging.getLogger(__name__)
+
+# (model, legacy base64 column, blob reference column)
+LEGACY_BLOB_COLUMNS = [
+    (Visitor, 'photo', 'photo_blob'),
+    (Staff, 'photo', 'photo_blob'),
+    (Organization, 'logo', 'logo_blob'),
+    (Document, 'content', 'content_blob'),
+]
+
+def decode_legacy_content(value):
+    """
+    Convert a legacy column value into the bytes to store.
+
+    Values are normally base64, optionally as a ``data:`` URL from the webcam
+    capture. Documents may also hold raw HTML, which is stored as UTF-8.
+    """
+    if value.startswith('data:') and ',' in value:
+        value = value.split(',', 1)[1]
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return value.encode('utf-8')
+
+def prepare_blob_columns():
+    """Add blob reference columns to tables created before they existed."""
+    for model, legacy_column, blob_column in LEGACY_BLOB_COLUMNS:
+        add_missing_columns(model, blob_column)
+
+    # Migrated documents no longer keep their content inline
+    if dialect_name() == 'postgresql':
+        db.session.execute(text('ALTER TABLE documents ALTER COLUMN content DROP NOT NULL'))
+        db.session.commit()
+
+def migrate_legacy_blobs(batch_size=100):
+    """
+    Move base64 column values into the blob store, one batch at a time.
+
+    Only the primary key and the legacy column are selected, each batch is
+    committed before the next is read, and the legacy value is cleared once
+    its blob reference is saved, so the migration can be interrupted and
+    resumed safely.
+
+    Args:
+        batch_size: Number of rows to migrate per transaction
+
+    Returns:
+        dict: Number of rows migrated per table
+    """
+    prepare_blob_columns()
+    store = get_blob_store()
+    migrated = {}
+
+    for model, legacy_column, blob_column in LEGACY_BLOB_COLUMNS:
+        legacy = getattr(model, legacy_column)
+        reference = getattr(model, blob_column)
+        count = 0
+        last_id = 0
+
+        while True:
+            rows = db.session.query(model.id, legacy).filter(
+                model.id > last_id,
+                legacy.isnot(None),
+                reference.is_(None)
+            ).order_by(model.id).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            for row_id, value in rows:
+                key = store.put(decode_legacy_content(value))
+                db.session.query(model).filter(model.id == row_id).update(
+                    {blob_column: key, legacy_column: None},
+                    synchronize_session=False
+                )
+
+            db.session.commit()
+            last_id = rows[-1][0]
+            count += len(rows)
+            logger.info(f"Migrated {count} {model.__tablename__}.{legacy_column} values to the blob store")
+
+        migrated[model.__tablename__] = count
+
+    return migrated
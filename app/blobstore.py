@@ -0,0 +1,149 @@
+"""
+Content-addressed blob storage for Visitor Management System.
+Photos, logos and documents are stored outside the database, keyed by the
+SHA-256 of their bytes, so identical uploads are stored once and model rows
+only carry a 64-character reference.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from flask import current_app
+
+BLOB_KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Content types served inline; anything else is sent as a download
+INLINE_CONTENT_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'application/pdf'}
+
+# Magic-number prefixes for the content types we store
+CONTENT_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF', 'application/pdf'),
+]
+
+def blob_key(data):
+    """Return the content address (SHA-256 hex digest) of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def is_blob_key(value):
+    """Check whether a string is a well-formed blob key."""
+    return bool(value) and BLOB_KEY_PATTERN.match(value) is not None
+
+def guess_content_type(data):
+    """Guess the MIME type of stored bytes from their leading signature."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, content_type in CONTENT_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return 'application/octet-stream'
+
+class BlobStore(ABC):
+    """
+    Interface for blob storage backends.
+
+    Backends implement _write, read, exists and delete; put() provides
+    hashing and dedupe on top of them.
+    """
+
+    def put(self, data):
+        """
+        Store bytes and return their key. Existing content is not rewritten.
+
+        Args:
+            data (bytes): The content to store
+
+        Returns:
+            str: The blob key
+        """
+        key = blob_key(data)
+        if not self.exists(key):
+            self._write(key, data)
+        return key
+
+    def local_path(self, key):
+        """Return a filesystem path for the blob, or None if not file-backed."""
+        return None
+
+    @abstractmethod
+    def _write(self, key, data):
+        """Store the bytes under a key that does not exist yet."""
+
+    @abstractmethod
+    def read(self, key):
+        """Return the blob's bytes, or None if it does not exist."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Check whether a blob is stored."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a blob if it exists."""
+
+class LocalBlobStore(BlobStore):
+    """Blob store backed by a directory on the local filesystem."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def local_path(self, key):
+        if not is_blob_key(key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _write(self, key, data):
+        path = self.local_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def read(self, key):
+        try:
+            with open(self.local_path(key), 'rb') as blob:
+                return blob.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+# Available backends, selected with the BLOB_STORAGE_BACKEND setting
+BLOB_BACKENDS = {
+    'local': lambda app: LocalBlobStore(
+        app.config.get('BLOB_STORAGE_PATH') or os.path.join(app.instance_path, 'blobs')
+    ),
+}
+
+def init_blob_store(app):
+    """Create the configured blob store and attach it to the application."""
+    backend = app.config.get('BLOB_STORAGE_BACKEND', 'local')
+    if backend not in BLOB_BACKENDS:
+        raise ValueError(f"Unknown blob storage backend: {backend}")
+    app.extensions['blob_store'] = BLOB_BACKENDS[backend](app)
+
+def get_blob_store():
+    """Return the blob store for the current application."""
+    return current_app.extensions['blob_store']
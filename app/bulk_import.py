@@ -0,0 +1,410 @@
+"""
+Bulk import for Visitor Management System.
+Uploaded CSV (or XLSX, or iCalendar) files are parsed one row at a time and written in
+batches, using COPY on PostgreSQL and executemany elsewhere, so large
+imports never hold the whole file or one huge transaction in memory.
+"""
+
+import csv
+import io
+import re
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from zipfile import BadZipFile
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from email_validator import validate_email, EmailNotValidError
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import func
+from app import db
+from app.models import Visitor
+from app.query_utils import dialect_name
+
+# Per-row errors kept for the report; further errors are only counted
+MAX_REPORTED_ERRORS = 100
+
+# Accepted spellings of header names, after lower-casing and replacing
+# spaces and dashes with underscores
+HEADER_ALIASES = {
+    'first': 'first_name',
+    'firstname': 'first_name',
+    'given_name': 'first_name',
+    'last': 'last_name',
+    'lastname': 'last_name',
+    'surname': 'last_name',
+    'family_name': 'last_name',
+    'e_mail': 'email',
+    'email_address': 'email',
+    'phone_number': 'phone',
+    'mobile': 'phone',
+    'organization': 'company',
+    'organisation': 'company',
+    'reason': 'purpose',
+    'first_visit': 'created_at',
+}
+
+VISITOR_COLUMNS = ['first_name', 'last_name', 'email', 'phone', 'company', 'purpose',
+                   'organization_id', 'created_at']
+
+class ImportFileError(Exception):
+    """Raised when an import file cannot be read at all."""
+    pass
+
+class ImportReport:
+    """Running totals and row errors for one import."""
+
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'message': message})
+
+    def to_dict(self, include_errors=True):
+        data = {
+            'processed': self.processed,
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'error_count': self.error_count,
+        }
+        if include_errors:
+            data['errors'] = self.errors
+        return data
+
+class RowError(ValueError):
+    """A single row failed validation."""
+    pass
+
+def normalize_header(name):
+    key = re.sub(r'[\s\-]+', '_', (name or '').strip().lower())
+    return HEADER_ALIASES.get(key, key)
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if not header:
+            raise ImportFileError('The file is empty.')
+        keys = [normalize_header(name) for name in header]
+        for row in reader:
+            if any(value.strip() for value in row):
+                yield reader.line_num, dict(zip(keys, row))
+    except UnicodeDecodeError:
+        raise ImportFileError('The file is not UTF-8 encoded CSV.')
+    finally:
+        # Leave the underlying upload stream open for the caller
+        text.detach()
+
+def _iter_xlsx(stream):
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException):
+        raise ImportFileError('The file is not an XLSX spreadsheet.')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if not header:
+            raise ImportFileError('The spreadsheet is empty.')
+        keys = [normalize_header(str(name) if name is not None else '') for name in header]
+        for line, row in enumerate(rows, start=2):
+            values = ['' if value is None else value for value in row]
+            if any(str(value).strip() for value in values):
+                yield line, dict(zip(keys, values))
+    finally:
+        workbook.close()
+
+def _unfold_ics(text):
+    """Yield (line number, logical line) with RFC 5545 folded lines joined."""
+    current = None
+    start = 0
+    for number, line in enumerate(text, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield start, current
+        current, start = line, number
+    if current:
+        yield start, current
+
+def _parse_ics_line(line):
+    """Split 'NAME;PARAM=VALUE:value' into (name, params, value)."""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition('=')
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), parameters, value
+
+def _ics_datetime(value, params):
+    """Convert a DTSTART value to a naive UTC datetime."""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d')
+    moment = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return moment
+    if params.get('TZID'):
+        try:
+            zone = ZoneInfo(params['TZID'])
+        except (ZoneInfoNotFoundError, ValueError):
+            return moment
+        return moment.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _ics_unescape(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+def _iter_ics(stream):
+    """
+    Yield one row per ATTENDEE of each VEVENT in an iCalendar file.
+
+    The event's DTSTART becomes expected_arrival, its SUMMARY the purpose
+    and its ORGANIZER the host_email; the attendee's CN is split into first
+    and last name.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        event = None
+        for number, line in _unfold_ics(text):
+            name, params, value = _parse_ics_line(line)
+            if name == 'BEGIN' and value.upper() == 'VEVENT':
+                event = {'attendees': []}
+            elif event is None:
+                continue
+            elif name == 'DTSTART':
+                try:
+                    event['expected_arrival'] = _ics_datetime(value, params)
+                except ValueError:
+                    event['expected_arrival'] = value
+            elif name == 'SUMMARY':
+                event['purpose'] = _ics_unescape(value)
+            elif name == 'ORGANIZER':
+                event['host_email'] = value.split(':', 1)[-1] if value.lower().startswith('mailto:') else value
+            elif name == 'ATTENDEE':
+                event['attendees'].append((number, params, value))
+            elif name == 'END' and value.upper() == 'VEVENT':
+                for attendee_line, attendee_params, attendee_value in event['attendees']:
+                    email = attendee_value.split(':', 1)[-1] if attendee_value.lower().startswith('mailto:') else attendee_value
+                    full_name = _ics_unescape(attendee_params.get('CN', '')).strip()
+                    first_name, _, last_name = full_name.rpartition(' ') if ' ' in full_name else (full_name, '', '')
+                    yield attendee_line, {
+                        'first_name': first_name or email.split('@')[0],
+                        'last_name': last_name or '-',
+                        'email': email,
+                        'purpose': event.get('purpose', ''),
+                        'expected_arrival': event.get('expected_arrival', ''),
+                        'host_email': event.get('host_email', ''),
+                    }
+                event = None
+    except UnicodeDecodeError:
+        raise ImportFileError('The file is not UTF-8 encoded iCalendar.')
+    finally:
+        text.detach()
+
+def copy_upload(stream):
+    """
+    Copy an uploaded file to a temporary file the caller owns.
+
+    The request closes its uploads once the view returns, before a
+    streamed response reads them; the caller closes the copy.
+    """
+    copy = tempfile.TemporaryFile()
+    shutil.copyfileobj(stream, copy)
+    copy.seek(0)
+    return copy
+
+def read_rows(stream, filename):
+    """
+    Iterate over the rows of an uploaded file without loading it whole.
+
+    Args:
+        stream: Binary file object
+        filename: Original file name, used to pick the format (.csv, .xlsx or .ics)
+
+    Returns:
+        iterator: (line number, dict of normalized column name to value)
+    """
+    filename = (filename or '').lower()
+    if filename.endswith('.xlsx'):
+        return _iter_xlsx(stream)
+    if filename.endswith('.ics'):
+        return _iter_ics(stream)
+    return _iter_csv(stream)
+
+def clean_text(row, key, max_length, required=False):
+    """Return a stripped cell value (None if blank), checking its length."""
+    value = row.get(key)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise RowError(f'{key} is required')
+        return None
+    if len(value) > max_length:
+        raise RowError(f'{key} is longer than {max_length} characters')
+    return value
+
+def clean_email(row, key='email', required=False):
+    """Return a normalized email address from a row, or None if blank."""
+    value = clean_text(row, key, 120, required=required)
+    if value is None:
+        return None
+    try:
+        return validate_email(value, check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise RowError(f'{key} is invalid: {str(e)}')
+
+def clean_datetime(row, key, required=False):
+    """Parse an ISO date or datetime cell (spreadsheet dates pass through)."""
+    value = row.get(key)
+    if isinstance(value, datetime):
+        return value
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise RowError(f'{key} is required')
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise RowError(f'{key} must be a date like 2024-01-31 or 2024-01-31 09:30')
+
+class BatchWriter:
+    """
+    Collects rows and writes them in batches.
+
+    On PostgreSQL each batch is loaded with COPY; other databases use a
+    single executemany INSERT. Every batch is committed on its own.
+    """
+
+    def __init__(self, table, columns, batch_size=1000):
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.rows = []
+        self.use_copy = dialect_name() == 'postgresql'
+
+    def add(self, row):
+        """Queue a row; returns the number of rows written if a batch was flushed."""
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Write and commit the queued rows; returns how many were written."""
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        try:
+            if self.use_copy:
+                self._copy(rows)
+            else:
+                db.session.execute(self.table.insert(), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(rows)
+
+    def _copy(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                value.isoformat(sep=' ') if isinstance(value, datetime) else value
+                for value in (row.get(column) for column in self.columns)
+            ])
+        buffer.seek(0)
+
+        connection = db.session.connection().connection.dbapi_connection
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {self.table.name} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+
+def existing_visitor_emails(organization_id):
+    """Load an organization's visitor emails (lower-cased) into a set."""
+    query = db.session.query(func.lower(Visitor.email)).filter(
+        Visitor.organization_id == organization_id,
+        Visitor.email.isnot(None)
+    ).execution_options(yield_per=5000)
+    return {email for (email,) in query}
+
+def iter_visitor_import(organization_id, rows, batch_size=1000):
+    """
+    Import visitors for an organization, yielding progress after each batch.
+
+    Rows whose email already belongs to one of the organization's visitors
+    (or appeared earlier in the file) are skipped as duplicates. Rows
+    without an email are always imported.
+
+    Args:
+        organization_id: ID of the organization to import into
+        rows: Iterator of (line number, row dict), e.g. from read_rows()
+        batch_size: Rows written per batch
+
+    Yields:
+        ImportReport: The running totals, after every batch and at the end
+    """
+    report = ImportReport()
+    seen = existing_visitor_emails(organization_id)
+    writer = BatchWriter(Visitor.__table__, VISITOR_COLUMNS, batch_size)
+    now = datetime.utcnow()
+
+    for line, row in rows:
+        report.processed += 1
+        try:
+            visitor = {
+                'first_name': clean_text(row, 'first_name', 64, required=True),
+                'last_name': clean_text(row, 'last_name', 64, required=True),
+                'email': clean_email(row),
+                'phone': clean_text(row, 'phone', 20),
+                'company': clean_text(row, 'company', 100),
+                'purpose': clean_text(row, 'purpose', 200),
+                'organization_id': organization_id,
+                'created_at': clean_datetime(row, 'created_at') or now,
+            }
+        except RowError as e:
+            report.add_error(line, str(e))
+            continue
+
+        if visitor['email']:
+            key = visitor['email'].lower()
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+
+        written = writer.add(visitor)
+        if written:
+            report.imported += written
+            yield report
+
+    report.imported += writer.flush()
+    yield report
+
+def import_visitors(organization_id, rows, batch_size=1000, progress=None):
+    """
+    Import visitors for an organization (see iter_visitor_import).
+
+    Args:
+        progress: Optional callable receiving the ImportReport after each batch
+
+    Returns:
+        ImportReport: Totals and the first MAX_REPORTED_ERRORS row errors
+    """
+    report = None
+    for report in iter_visitor_import(organization_id, rows, batch_size):
+        if progress:
+            progress(report)
+    return report
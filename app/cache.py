@@ -0,0 +1,535 @@
+"""
+Application cache for Visitor Management System.
+A small cache layer with pluggable backends, selected with CACHE_BACKEND:
+'memory' keeps an LRU in each worker, 'file' shares entries between the
+workers of one host through a directory of files, and 'redis' talks the
+Redis protocol to a shared server. Values are grouped in namespaces, which
+can be scoped to an organization and invalidated at once, expire after a
+TTL, and are loaded by one caller at a time when missing.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import pickle
+import random
+import socket
+import struct
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import unquote, urlparse
+from flask import current_app
+from app.metrics import register
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = register('vms_cache_requests_total', 'counter', 'Cache lookups by namespace and result.',
+                          ('namespace', 'result'))
+CACHE_LOADS = register('vms_cache_loads_total', 'counter', 'Values loaded after a cache miss.', ('namespace',))
+CACHE_COALESCED = register('vms_cache_coalesced_total', 'counter',
+                           'Cache misses answered by another caller\'s load.', ('namespace',))
+
+# How often a caller waiting on another's load checks for the value
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+
+class CacheError(Exception):
+    """A cache backend could not complete an operation."""
+
+class CacheBackend(ABC):
+    """
+    Interface for cache backends.
+
+    Keys are strings and values bytes. ``ttl`` is in seconds; None keeps
+    the value until it is evicted or deleted.
+    """
+
+    shared = False  # Whether entries are visible to other workers
+
+    @abstractmethod
+    def get(self, key):
+        """Return the value of a key, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key, value, ttl=None):
+        """Set a key, replacing any existing value."""
+
+    @abstractmethod
+    def add(self, key, value, ttl=None):
+        """Set a key only if it does not exist; return True if it was set."""
+
+    @abstractmethod
+    def incr(self, key):
+        """Increment an integer key, starting from 0, and return the new value."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a key if it exists."""
+
+class MemoryBackend(CacheBackend):
+    """LRU of entries in this worker's memory."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (expires_at or None, value)
+
+    def _live(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= now:
+            del self.entries[key]
+            return None
+        return entry
+
+    def _store(self, key, value, ttl):
+        self.entries[key] = (time.monotonic() + ttl if ttl is not None else None, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        with self.lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def incr(self, key):
+        with self.lock:
+            entry = self._live(key, time.monotonic())
+            value = int(entry[1]) + 1 if entry is not None else 1
+            self._store(key, str(value).encode('ascii'), None)
+            return value
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+class FileBackend(CacheBackend):
+    """
+    Entries shared by the workers of one host, one file per key.
+
+    A file holds its expiry time followed by the value. Files are written
+    to a temporary name and renamed into place, so readers never see a
+    partial value; counters are updated the same way under an flock on a
+    lock file next to them. Reads are served
+    from the OS page cache. Expired files are pruned by the worker that
+    writes after CACHE_FILE_PRUNE_INTERVAL.
+    """
+
+    shared = True
+    _EXPIRES = struct.Struct('<d')  # Wall-clock expiry, 0 for none
+
+    def __init__(self, root, prune_interval=300):
+        self.root = root
+        self.prune_interval = prune_interval
+        self.pruned_at = time.monotonic()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _encode(self, value, ttl):
+        return self._EXPIRES.pack(time.time() + ttl if ttl is not None else 0.0) + value
+
+    def _decode(self, data):
+        if len(data) < self._EXPIRES.size:
+            return None
+        expires_at = self._EXPIRES.unpack_from(data)[0]
+        if expires_at and expires_at <= time.time():
+            return None
+        return data[self._EXPIRES.size:]
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return self._decode(f.read())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def set(self, key, value, ttl=None):
+        self._write(self._path(key), self._encode(value, ttl))
+        self._maybe_prune()
+
+    def add(self, key, value, ttl=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                except FileNotFoundError:
+                    continue
+                # A file still being written by its creator counts as present
+                if len(data) < self._EXPIRES.size or self._decode(data) is not None:
+                    return False
+                # Expired: remove it and try once more
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._encode(value, ttl))
+            return True
+        return False
+
+    def incr(self, key):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The lock is a separate file, as the counter itself is replaced
+        with open(path + '.lock', 'a+b') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            current = self.get(key)
+            value = int(current) + 1 if current else 1
+            self._write(path, self._encode(str(value).encode('ascii'), None))
+            return value
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _maybe_prune(self):
+        if time.monotonic() - self.pruned_at < self.prune_interval:
+            return
+        self.pruned_at = time.monotonic()
+        now = time.time()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, 'rb') as f:
+                        header = f.read(self._EXPIRES.size)
+                    if len(header) == self._EXPIRES.size and 0 < self._EXPIRES.unpack(header)[0] <= now:
+                        os.remove(path)
+                except OSError:
+                    continue
+
+class RedisBackend(CacheBackend):
+    """
+    Entries on a Redis server, spoken to directly over RESP.
+
+    Only GET, SET (with PX and NX), INCR and DEL are used, so any server
+    implementing them works, including app.fake_redis for local runs.
+    Each thread keeps its own connection.
+    """
+
+    shared = True
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.local.sock = sock
+        self.local.reader = sock.makefile('rb')
+        if self.password:
+            self._send('AUTH', self.password)
+        if self.db:
+            self._send('SELECT', self.db)
+
+    def _close(self):
+        sock = getattr(self.local, 'sock', None)
+        if sock is not None:
+            try:
+                self.local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+        self.local.sock = None
+
+    def _send(self, *args):
+        parts = [f'*{len(args)}\r\n'.encode('ascii')]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self.local.sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self.local.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise CacheError('Connection closed by the Redis server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode('utf-8')
+        if kind == b'-':
+            raise CacheError(payload.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise CacheError(f'Unexpected Redis reply: {line!r}')
+
+    def _command(self, *args):
+        try:
+            if getattr(self.local, 'sock', None) is None:
+                self._connect()
+            return self._send(*args)
+        except (OSError, CacheError) as e:
+            self._close()
+            raise CacheError(str(e)) from e
+
+    def get(self, key):
+        return self._command('GET', key)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            self._command('SET', key, value)
+        else:
+            self._command('SET', key, value, 'PX', max(1, int(ttl * 1000)))
+
+    def add(self, key, value, ttl=None):
+        args = ['SET', key, value, 'NX']
+        if ttl is not None:
+            args += ['PX', max(1, int(ttl * 1000))]
+        return self._command(*args) is not None
+
+    def incr(self, key):
+        return self._command('INCR', key)
+
+    def delete(self, key):
+        self._command('DEL', key)
+
+class CacheNamespace:
+    """
+    A group of cache keys, optionally scoped to one organization.
+
+    Keys embed the namespace's generation number, so clear() makes every
+    key of the namespace unreachable in one increment; the orphaned
+    entries expire with their TTL.
+    """
+
+    def __init__(self, cache, name, organization_id=None):
+        self.cache = cache
+        self.name = name
+        scope = f'{name}:org{organization_id}' if organization_id is not None else name
+        self.generation_key = f'{cache.prefix}:gen:{scope}'
+        self.scope = scope
+
+    def _key(self, key):
+        generation = self.cache.backend.get(self.generation_key)
+        return f'{self.cache.prefix}:{self.scope}:{int(generation) if generation else 0}:{key}'
+
+    def _lookup(self, full_key):
+        """Return (found, value) for a full key."""
+        data = self.cache.backend.get(full_key)
+        if data is None:
+            return False, None
+        return True, pickle.loads(data)
+
+    def get(self, key, default=None):
+        """Return a cached value, or ``default`` if it is missing."""
+        try:
+            found, value = self._lookup(self._key(key))
+        except Exception as e:
+            logger.error(f"Error reading cache key {self.scope}:{key}: {str(e)}")
+            CACHE_REQUESTS.inc(namespace=self.name, result='error')
+            return default
+        CACHE_REQUESTS.inc(namespace=self.name, result='hit' if found else 'miss')
+        return value if found else default
+
+    def set(self, key, value, ttl=None):
+        """Cache a value for ``ttl`` seconds (default: CACHE_DEFAULT_TTL)."""
+        try:
+            self.cache.backend.set(self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                                   ttl if ttl is not None else self.cache.default_ttl)
+        except Exception as e:
+            logger.error(f"Error writing cache key {self.scope}:{key}: {str(e)}")
+
+    def delete(self, key):
+        try:
+            self.cache.backend.delete(self._key(key))
+        except Exception as e:
+            logger.error(f"Error deleting cache key {self.scope}:{key}: {str(e)}")
+
+    def clear(self):
+        """Invalidate every key in the namespace."""
+        try:
+            self.cache.backend.incr(self.generation_key)
+        except Exception as e:
+            logger.error(f"Error clearing cache namespace {self.scope}: {str(e)}")
+
+    def get_or_set(self, key, loader, ttl=None):
+        """
+        Return a cached value, calling ``loader`` to produce it on a miss.
+
+        Concurrent misses for the same key are coalesced: within a worker
+        callers wait on a lock, and across workers (shared backends) on a
+        short-lived lock key, so only one of them runs the loader.
+
+        Args:
+            key (str): Key within the namespace
+            loader (callable): Produces the value when it is not cached
+            ttl (float, optional): Seconds to keep the value (default: CACHE_DEFAULT_TTL)
+
+        Returns:
+            The cached or loaded value
+        """
+        try:
+            full_key = self._key(key)
+            found, value = self._lookup(full_key)
+        except Exception as e:
+            logger.error(f"Error reading cache key {self.scope}:{key}: {str(e)}")
+            CACHE_REQUESTS.inc(namespace=self.name, result='error')
+            return loader()
+        CACHE_REQUESTS.inc(namespace=self.name, result='hit' if found else 'miss')
+        if found:
+            return value
+
+        with self.cache.flight_lock(full_key):
+            locked = False
+            try:
+                found, value = self._lookup(full_key)
+                if not found and self.cache.backend.shared:
+                    locked = self._acquire_shared(full_key)
+                    if not locked:
+                        # The other loader may not finish in time; then load it here
+                        found, value = self._wait_shared(full_key)
+            except Exception as e:
+                logger.error(f"Error coordinating cache load of {self.scope}:{key}: {str(e)}")
+                found = False
+            if found:
+                CACHE_COALESCED.inc(namespace=self.name)
+                return value
+
+            try:
+                value = loader()
+                CACHE_LOADS.inc(namespace=self.name)
+                # The value loaded, so failing to cache it is only logged
+                try:
+                    self.cache.backend.set(full_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                                           ttl if ttl is not None else self.cache.default_ttl)
+                except Exception as e:
+                    logger.error(f"Error writing cache key {self.scope}:{key}: {str(e)}")
+            finally:
+                if locked:
+                    self._release_shared(full_key)
+            return value
+
+    def _release_shared(self, full_key):
+        try:
+            self.cache.backend.delete(f'{full_key}:lock')
+        except Exception as e:
+            logger.error(f"Error releasing cache lock {full_key}: {str(e)}")
+
+    def _acquire_shared(self, full_key):
+        return self.cache.backend.add(f'{full_key}:lock', b'1', self.cache.lock_timeout)
+
+    def _wait_shared(self, full_key):
+        deadline = time.monotonic() + self.cache.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(SINGLE_FLIGHT_POLL_SECONDS * (0.5 + random.random()))
+            found, value = self._lookup(full_key)
+            if found:
+                return True, value
+            if self.cache.backend.get(f'{full_key}:lock') is None:
+                break
+        return False, None
+
+class Cache:
+    """Cache front end: namespacing, TTLs, serialization and single-flight loads."""
+
+    def __init__(self, backend, prefix='vms', default_ttl=300, lock_timeout=10):
+        self.backend = backend
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self._flights_lock = threading.Lock()
+        self._flights = {}  # full key -> [lock, waiters]
+
+    @property
+    def shared(self):
+        """Whether cached values are shared with the other workers."""
+        return self.backend.shared
+
+    def namespace(self, name, organization_id=None):
+        """Return the namespace ``name``, scoped to an organization if given."""
+        return CacheNamespace(self, name, organization_id)
+
+    @contextmanager
+    def flight_lock(self, full_key):
+        """Serialize loads of one key within this worker."""
+        with self._flights_lock:
+            flight = self._flights.setdefault(full_key, [threading.Lock(), 0])
+            flight[1] += 1
+        flight[0].acquire()
+        try:
+            yield
+        finally:
+            flight[0].release()
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    self._flights.pop(full_key, None)
+
+# Available backends, selected with the CACHE_BACKEND setting
+CACHE_BACKENDS = {
+    'memory': lambda app: MemoryBackend(app.config['CACHE_MEMORY_SIZE']),
+    'file': lambda app: FileBackend(
+        app.config.get('CACHE_PATH') or os.path.join(app.instance_path, 'cache'),
+        app.config['CACHE_FILE_PRUNE_INTERVAL']
+    ),
+    'redis': lambda app: RedisBackend(app.config['CACHE_REDIS_URL']),
+}
+
+def init_cache(app):
+    """Create the configured cache and attach it to the application."""
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    app.extensions['cache'] = Cache(CACHE_BACKENDS[backend](app), app.config['CACHE_KEY_PREFIX'],
+                                    app.config['CACHE_DEFAULT_TTL'])
+
+def get_cache():
+    """Return the cache for the current application."""
+    return current_app.extensions['cache']
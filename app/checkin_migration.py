@@ -0,0 +1,177 @@
+"""
+Migration adding checkins.organization_id and the organization-scoped indexes.
+The column is backfilled from visitors in short batches and, on PostgreSQL,
+indexes are built with CREATE INDEX CONCURRENTLY and the column is made
+NOT NULL through a validated check constraint, so check-ins keep flowing
+while the migration runs.
+"""
+
+import logging
+from sqlalchemy import func, select, update
+from sqlalchemy.schema import CreateIndex
+from app import db
+from app.models import CheckIn, Visitor
+from app.partitions import is_partitioned, list_partitions
+from app.query_utils import add_missing_columns, dialect_name
+
+logger = logging.getLogger(__name__)
+
+# Temporary constraint that lets SET NOT NULL skip its table scan
+NOT_NULL_CONSTRAINT = 'checkins_organization_id_not_null'
+
+# Indexes added for the organization-scoped query shapes
+MIGRATED_INDEXES = [
+    'idx_checkins_org_time',
+    'idx_checkins_org_active',
+    'idx_checkins_visitor_time',
+    'idx_visitors_org_created',
+]
+
+def prepare_checkin_columns():
+    """Add checkins.organization_id to tables created before it existed."""
+    add_missing_columns(CheckIn, 'organization_id')
+
+def backfill_checkin_organizations(batch_size=1000):
+    """
+    Copy each check-in's organization from its visitor, one id range at a time.
+
+    Every batch is its own short transaction that only locks the rows in
+    its id range, so the backfill never blocks check-ins for long and can
+    be interrupted and resumed.
+
+    Args:
+        batch_size: Width of the id range updated per transaction
+
+    Returns:
+        int: Number of check-ins updated
+    """
+    max_id = db.session.query(func.max(CheckIn.id)).scalar() or 0
+    organization = select(Visitor.organization_id).where(
+        Visitor.id == CheckIn.visitor_id
+    ).scalar_subquery()
+
+    updated = 0
+    for start in range(0, max_id, batch_size):
+        result = db.session.execute(
+            update(CheckIn).where(
+                CheckIn.id > start,
+                CheckIn.id <= start + batch_size,
+                CheckIn.organization_id.is_(None)
+            ).values(organization_id=organization).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        updated += result.rowcount
+    return updated
+
+def _index_ddl(index, concurrently=False, only=False, name=None, table=None):
+    """Compile CREATE INDEX IF NOT EXISTS for an index, optionally retargeted."""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=db.engine.dialect))
+    table_name = index.table.name
+    if name:
+        ddl = ddl.replace(f' {index.name} ', f' {name} ', 1)
+    if table:
+        ddl = ddl.replace(f' ON {table_name} ', f' ON {table} ', 1)
+    if only:
+        ddl = ddl.replace(f' ON {table_name} ', f' ON ONLY {table_name} ', 1)
+    if concurrently:
+        ddl = ddl.replace('CREATE INDEX ', 'CREATE INDEX CONCURRENTLY ', 1)
+    return ddl
+
+def create_migrated_indexes():
+    """
+    Build the organization-scoped indexes on existing tables.
+
+    On PostgreSQL each index is built concurrently outside a transaction.
+    Partitioned tables cannot be indexed concurrently as a whole, so the
+    index is declared on the parent only, built concurrently on each
+    partition and then attached.
+
+    Returns:
+        list: Names of the indexes processed
+    """
+    indexes = [index for table in (CheckIn.__table__, Visitor.__table__)
+               for index in table.indexes if index.name in MIGRATED_INDEXES]
+
+    if dialect_name() != 'postgresql':
+        for index in indexes:
+            index.create(bind=db.engine, checkfirst=True)
+        return [index.name for index in indexes]
+
+    partitions = {name: list_partitions(name) for name in {index.table.name for index in indexes}
+                  if is_partitioned(name)}
+    db.session.commit()
+
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for index in indexes:
+            table_name = index.table.name
+            if table_name not in partitions:
+                connection.exec_driver_sql(_index_ddl(index, concurrently=True))
+                continue
+
+            connection.exec_driver_sql(_index_ddl(index, only=True))
+            children = [name for _, name in partitions[table_name]] + [f'{table_name}_default']
+            for child in children:
+                child_index = f'{child}_{index.name[len("idx_"):]}'
+                connection.exec_driver_sql(_index_ddl(index, concurrently=True, name=child_index, table=child))
+                attached = connection.exec_driver_sql(
+                    "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                    "WHERE c.relname = %(name)s", {'name': child_index}
+                ).first()
+                if not attached:
+                    connection.exec_driver_sql(f'ALTER INDEX {index.name} ATTACH PARTITION {child_index}')
+
+    return [index.name for index in indexes]
+
+def require_checkin_organizations():
+    """
+    Make checkins.organization_id NOT NULL, as the model declares it.
+
+    On PostgreSQL a NOT VALID check constraint is added and then validated,
+    which does not block writes, so SET NOT NULL can rely on it instead of
+    scanning the table under an exclusive lock. Partitioned tables are
+    altered directly, which checks each partition. Other databases create
+    the column NOT NULL with the table and are left alone.
+
+    Returns:
+        bool: True if the column is NOT NULL afterwards
+    """
+    if dialect_name() != 'postgresql':
+        return False
+
+    missing = db.session.query(func.count(CheckIn.id)).filter(CheckIn.organization_id.is_(None)).scalar()
+    if missing:
+        db.session.commit()
+        logger.warning(f"{missing} check-ins have no organization; organization_id stays nullable")
+        return False
+
+    partitioned = is_partitioned(CheckIn.__table__.name)
+    db.session.commit()
+
+    table = CheckIn.__table__.name
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if not partitioned:
+            connection.exec_driver_sql(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {NOT_NULL_CONSTRAINT}')
+            connection.exec_driver_sql(f'ALTER TABLE {table} ADD CONSTRAINT {NOT_NULL_CONSTRAINT} '
+                                       f'CHECK (organization_id IS NOT NULL) NOT VALID')
+            connection.exec_driver_sql(f'ALTER TABLE {table} VALIDATE CONSTRAINT {NOT_NULL_CONSTRAINT}')
+        connection.exec_driver_sql(f'ALTER TABLE {table} ALTER COLUMN organization_id SET NOT NULL')
+        if not partitioned:
+            connection.exec_driver_sql(f'ALTER TABLE {table} DROP CONSTRAINT {NOT_NULL_CONSTRAINT}')
+    return True
+
+def migrate_checkin_organizations(batch_size=1000):
+    """
+    Add, backfill, index and require checkins.organization_id.
+
+    Returns:
+        tuple: (check-ins backfilled, index names created, whether the
+        column is now NOT NULL)
+    """
+    prepare_checkin_columns()
+    updated = backfill_checkin_organizations(batch_size)
+    # Check-ins written by older workers while the backfill ran
+    updated += backfill_checkin_organizations(batch_size)
+    indexes = create_migrated_indexes()
+    required = require_checkin_organizations()
+    logger.info(f"Backfilled organization_id on {updated} check-ins")
+    return updated, indexes, required
@@ -0,0 +1,202 @@
+"""
+Flask CLI commands for Visitor Management System.
+Run with ``flask --app main <command>``.
+"""
+
+import time
+import click
+
+def register_commands(app):
+    """Register maintenance commands on the application."""
+
+    @app.cli.command('backfill-rollups')
+    @click.option('--organization-id', type=int, default=None,
+                  help='Only rebuild rollups for this organization.')
+    def backfill_rollups_command(organization_id):
+        """Rebuild daily visit rollups from the checkins table."""
+        from app.rollups import backfill_rollups
+
+        count = backfill_rollups(organization_id)
+        click.echo(f"Rebuilt daily visit rollups for {count} organization(s).")
+
+    @app.cli.command('migrate-blobs')
+    @click.option('--batch-size', type=int, default=100, show_default=True,
+                  help='Rows to migrate per transaction.')
+    def migrate_blobs_command(batch_size):
+        """Move legacy base64 photos, logos and documents into the blob store."""
+        from app.blob_migration import migrate_legacy_blobs
+
+        migrated = migrate_legacy_blobs(batch_size)
+        for table, count in migrated.items():
+            click.echo(f"{table}: migrated {count} row(s).")
+
+    @app.cli.command('upgrade-schema')
+    def upgrade_schema_command():
+        """Add columns and indexes introduced since the database was created."""
+        from app.blob_migration import prepare_blob_columns
+        from app.checkin_migration import prepare_checkin_columns
+        from app.digests import prepare_digest_columns
+        from app.preregistration import prepare_preregistration_columns
+        from app.search import prepare_search_indexes
+
+        prepare_blob_columns()
+        prepare_digest_columns()
+        prepare_checkin_columns()
+        prepare_preregistration_columns()
+        prepare_search_indexes()
+        click.echo("Database schema is up to date.")
+
+    @app.cli.command('migrate-checkin-organizations')
+    @click.option('--batch-size', type=int, default=1000, show_default=True,
+                  help='Check-in ids updated per transaction.')
+    def migrate_checkin_organizations_command(batch_size):
+        """Backfill checkins.organization_id, build the organization indexes and make it NOT NULL."""
+        from app.checkin_migration import migrate_checkin_organizations
+
+        updated, indexes, required = migrate_checkin_organizations(batch_size)
+        click.echo(f"Backfilled organization_id on {updated} check-in(s).")
+        click.echo(f"Indexes: {', '.join(indexes)}")
+        if required:
+            click.echo("organization_id is now NOT NULL.")
+
+    @app.cli.command('partition-tables')
+    @click.option('--months-ahead', type=int, default=None,
+                  help='Future monthly partitions to create (default: PARTITION_MONTHS_AHEAD).')
+    def partition_tables_command(months_ahead):
+        """Convert logs and checkins into monthly partitioned tables (PostgreSQL)."""
+        from app.partitions import PARTITIONED_TABLES, partition_table
+
+        months_ahead = months_ahead if months_ahead is not None else app.config['PARTITION_MONTHS_AHEAD']
+        for table_name in PARTITIONED_TABLES:
+            if partition_table(table_name, months_ahead):
+                click.echo(f"{table_name}: partitioned by month.")
+            else:
+                click.echo(f"{table_name}: already partitioned or not on PostgreSQL, skipped.")
+
+    @app.cli.command('maintain-partitions')
+    def maintain_partitions_command():
+        """Create upcoming partitions and, with RETENTION_ENABLED, remove history past plan retention."""
+        from app.partitions import maintain_partitions
+
+        results = maintain_partitions(app.config['PARTITION_MONTHS_AHEAD'], app.config['RETENTION_BATCH_SIZE'],
+                                      app.config['RETENTION_ENABLED'])
+        if results is None:
+            click.echo("Maintenance is already running in another process.")
+            return
+        if not app.config['RETENTION_ENABLED']:
+            click.echo("Retention is off; set RETENTION_ENABLED=true to delete history past plan retention.")
+        for table_name, counts in results.items():
+            click.echo(f"{table_name}: dropped {counts['partitions_dropped']} partition(s), "
+                       f"deleted {counts['rows_deleted']} row(s).")
+
+    @app.cli.command('import-visitors')
+    @click.argument('organization_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', type=int, default=None,
+                  help='Rows written per batch (default: IMPORT_BATCH_SIZE).')
+    def import_visitors_command(organization_id, path, batch_size):
+        """Import visitors for an organization from a CSV or XLSX file."""
+        from app.bulk_import import ImportFileError, import_visitors, read_rows
+
+        def progress(report):
+            click.echo(f"Processed {report.processed} row(s), imported {report.imported}, "
+                       f"{report.duplicates} duplicate(s), {report.error_count} error(s).")
+
+        with open(path, 'rb') as stream:
+            try:
+                report = import_visitors(organization_id, read_rows(stream, path),
+                                         batch_size or app.config['IMPORT_BATCH_SIZE'], progress)
+            except ImportFileError as e:
+                raise click.ClickException(str(e))
+
+        for error in report.errors:
+            click.echo(f"Line {error['line']}: {error['message']}", err=True)
+        if report.error_count > len(report.errors):
+            click.echo(f"... and {report.error_count - len(report.errors)} more error(s).", err=True)
+
+    @app.cli.command('preregister-visitors')
+    @click.argument('organization_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--host-id', type=int, default=None,
+                  help='Staff id hosting guests whose row names no known host.')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Rows written per batch (default: IMPORT_BATCH_SIZE).')
+    def preregister_visitors_command(organization_id, path, host_id, batch_size):
+        """Preregister visitors from a CSV, XLSX or iCalendar (.ics) file."""
+        from app.bulk_import import ImportFileError, read_rows
+        from app.preregistration import iter_preregistration_import
+
+        with open(path, 'rb') as stream:
+            try:
+                for report in iter_preregistration_import(organization_id, read_rows(stream, path), host_id,
+                                                          batch_size or app.config['IMPORT_BATCH_SIZE']):
+                    click.echo(f"Processed {report.processed} row(s), preregistered {report.imported}, "
+                               f"{report.duplicates} duplicate(s), {report.error_count} error(s).")
+            except ImportFileError as e:
+                raise click.ClickException(str(e))
+
+        for error in report.errors:
+            click.echo(f"Line {error['line']}: {error['message']}", err=True)
+        if report.error_count > len(report.errors):
+            click.echo(f"... and {report.error_count - len(report.errors)} more error(s).", err=True)
+
+    @app.cli.command('send-preregistration-confirmations')
+    def send_preregistration_confirmations_command():
+        """Send confirmation emails for new preregistrations."""
+        from app.preregistration import process_preregistration_confirmations
+
+        # Confirmation emails link QR codes with external URLs
+        with app.test_request_context():
+            sent = process_preregistration_confirmations(app.config['PREREGISTRATION_CONFIRMATION_BATCH_SIZE'])
+        click.echo(f"Sent {sent} confirmation(s).")
+
+    @app.cli.command('send-outbox')
+    @click.option('--once', is_flag=True, help='Send one batch and exit.')
+    def send_outbox_command(once):
+        """Send queued emails from the outbox as a standalone worker."""
+        from app.mail_queue import process_outbox
+
+        while True:
+            sent = process_outbox()
+            if once:
+                click.echo(f"Sent {sent} email(s).")
+                return
+            if not sent:
+                time.sleep(app.config['EMAIL_OUTBOX_INTERVAL'])
+
+    @app.cli.command('send-digests')
+    @click.option('--window', type=int, default=None,
+                  help='Digest window in seconds (default: NOTIFICATION_DIGEST_WINDOW).')
+    def send_digests_command(window):
+        """Send host digests whose window has elapsed."""
+        from app.digests import process_digests
+
+        sent = process_digests(window)
+        click.echo(f"Sent {sent} digest(s).")
+
+    @app.cli.command('flush-audit-log')
+    def flush_audit_log_command():
+        """Write buffered and spilled audit log entries."""
+        from app.audit import flush_audit_log
+
+        written = flush_audit_log()
+        click.echo(f"Wrote {written} audit log entries.")
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify, bundle, fingerprint and precompress the static assets."""
+        from app.assets import build_assets
+
+        manifest = build_assets(app.static_folder, app.config['ASSETS_PATH'])
+        for filename, hashed in manifest['files'].items():
+            encodings = ', '.join(manifest['encodings'][hashed]) or 'uncompressed'
+            click.echo(f"{filename} -> {hashed} ({encodings})")
+        click.echo("Restart the application to serve the new assets.")
+
+    @app.cli.command('outbox-status')
+    def outbox_status_command():
+        """Show outbox queue depth and send statistics."""
+        from app.mail_queue import get_outbox_metrics
+
+        for name, value in get_outbox_metrics().items():
+            click.echo(f"{name}: {value}")
@@ -27,6 +27,11 @@ class Config:
     APP_NAME = 'Visitor Management System'
     ADMIN_EMAIL = os.environ.get('ADMIN_EMAIL', 'admin@example.com')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+    
+    # Blob storage for photos, logos and documents
+    BLOB_STORAGE_BACKEND = os.environ.get('BLOB_STORAGE_BACKEND', 'local')
+    BLOB_STORAGE_PATH = os.environ.get('BLOB_STORAGE_PATH')
+    THUMBNAIL_CACHE_PATH = os.environ.get('THUMBNAIL_CACHE_PATH')
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -0,0 +1,166 @@
+"""
+Digest notifications for Visitor Management System.
+Hosts who opt in receive one email summarising every check-in and check-out
+within the digest window instead of one email per event.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from flask import current_app, render_template
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db, scheduler
+from app.models import CheckIn, PendingNotification, Staff
+from app.organizations import get_organization
+from app.query_utils import add_missing_columns
+
+logger = logging.getLogger(__name__)
+
+def prepare_digest_columns():
+    """Add the digest opt-in column to staff tables created before it existed."""
+    add_missing_columns(Staff, 'notification_digest')
+
+def queue_digest_notification(checkin, is_checkout=False):
+    """
+    Hold a visit notification for the host's next digest.
+
+    Args:
+        checkin: The CheckIn model instance
+        is_checkout: Boolean indicating if this is a checkout notification
+    """
+    try:
+        db.session.add(PendingNotification(
+            staff_id=checkin.staff_id,
+            check_in_id=checkin.id,
+            is_checkout=is_checkout
+        ))
+        db.session.commit()
+    except Exception as e:
+        print(f"Error queueing digest notification: {str(e)}")
+        db.session.rollback()
+
+def send_host_digest(host, notifications):
+    """
+    Send one email covering a host's pending notifications.
+
+    Args:
+        host: The Staff model instance receiving the digest
+        notifications: PendingNotification rows, oldest first
+
+    Returns:
+        bool: True if the digest was sent (or queued for sending)
+    """
+    from app.utils import send_email, visit_duration
+
+    organization = get_organization(host.organization_id)
+    events = [{
+        'visitor': notification.checkin.visitor,
+        'checkin': notification.checkin,
+        'is_checkout': notification.is_checkout,
+        'duration': visit_duration(notification.checkin) if notification.is_checkout else ''
+    } for notification in notifications]
+
+    arrivals = sum(1 for event in events if not event['is_checkout'])
+    departures = len(events) - arrivals
+    parts = []
+    if arrivals:
+        parts.append(f"{arrivals} arrival{'s' if arrivals != 1 else ''}")
+    if departures:
+        parts.append(f"{departures} departure{'s' if departures != 1 else ''}")
+    subject = f"Visitor Update: {' and '.join(parts)}"
+
+    context = dict(
+        host=host,
+        organization=organization,
+        events=events,
+        arrivals=arrivals,
+        departures=departures,
+        current_year=datetime.utcnow().year
+    )
+    # The email is committed with the deletion of the notifications
+    return send_email(
+        subject=subject,
+        recipients=[host.email],
+        text_body=render_template('email/visit_digest.txt', **context),
+        html_body=render_template('email/visit_digest.html', **context),
+        commit=False
+    )
+
+def process_digests(window=None):
+    """
+    Send digests for hosts whose oldest pending notification is older than the window.
+
+    Each host's rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED on
+    PostgreSQL and deleted in the same transaction that queues the email,
+    so concurrent workers never send the same digest twice.
+
+    Args:
+        window: Digest window in seconds (default: NOTIFICATION_DIGEST_WINDOW)
+
+    Returns:
+        int: Number of digests sent
+    """
+    window = window if window is not None else current_app.config['NOTIFICATION_DIGEST_WINDOW']
+    cutoff = datetime.utcnow() - timedelta(seconds=window)
+
+    staff_ids = [row.staff_id for row in db.session.query(
+        PendingNotification.staff_id
+    ).group_by(
+        PendingNotification.staff_id
+    ).having(
+        func.min(PendingNotification.created_at) <= cutoff
+    ).all()]
+
+    sent = 0
+    for staff_id in staff_ids:
+        notifications = PendingNotification.query.options(
+            joinedload(PendingNotification.checkin).joinedload(CheckIn.visitor)
+        ).filter_by(
+            staff_id=staff_id
+        ).order_by(
+            PendingNotification.created_at
+        ).with_for_update(of=PendingNotification, skip_locked=True).all()
+
+        if not notifications:
+            db.session.commit()
+            continue
+
+        host = Staff.query.get(staff_id)
+        try:
+            for notification in notifications:
+                db.session.delete(notification)
+            if host and host.email:
+                if not send_host_digest(host, notifications):
+                    # Keep the notifications for the next run
+                    db.session.rollback()
+                    continue
+                sent += 1
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error sending digest to staff {staff_id}: {str(e)}")
+            db.session.rollback()
+
+    return sent
+
+def schedule_digests(app):
+    """Register the background job that sends host digests."""
+
+    def send_digests_job():
+        # Emails build external URLs, which needs a request context outside
+        # of a request; SERVER_NAME sets the host they point at
+        with app.test_request_context():
+            try:
+                process_digests()
+            except Exception as e:
+                logger.error(f"Error sending digest notifications: {str(e)}")
+                db.session.rollback()
+
+    scheduler.add_job(
+        id='send_digests',
+        func=send_digests_job,
+        trigger='interval',
+        seconds=app.config['NOTIFICATION_DIGEST_INTERVAL'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
@@ -0,0 +1,188 @@
+"""
+Email template rendering for Visitor Management System.
+Organization email templates are compiled once into sandboxed Jinja
+templates and cached per organization and template type, so sending a
+notification does not re-read or re-parse the template each time.
+Templates are written by organization admins, so they only ever see
+plain values copied from the models, never the models themselves.
+"""
+
+import html
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from jinja2.sandbox import ImmutableSandboxedEnvironment
+from app import db
+from app.models import EmailTemplate
+
+# How long a cached template is trusted before its updated_at is rechecked.
+# Saves in this process invalidate immediately; other workers pick up the
+# change within this window.
+TEMPLATE_REVALIDATE_SECONDS = 60
+TEMPLATE_CACHE_SIZE = 1024
+
+# Model attributes exposed to templates as plain dicts
+VISITOR_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'company')
+HOST_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'department', 'position')
+ORGANIZATION_FIELDS = ('name', 'contact_email', 'contact_phone', 'address')
+CHECKIN_FIELDS = ('purpose', 'check_in_time', 'check_out_time')
+PREREGISTRATION_FIELDS = VISITOR_FIELDS + ('purpose', 'expected_arrival')
+
+_BLOCK_TAGS = re.compile(r'<\s*(br|/p|/div|/h\d|/tr|/li)\b[^>]*>', re.IGNORECASE)
+_TAGS = re.compile(r'<[^>]+>')
+_BLANK_LINES = re.compile(r'\n\s*\n+')
+
+def _finalize(value):
+    """Render missing values as empty strings rather than 'None'."""
+    return '' if value is None else value
+
+def _format_datetime(value, format='%Y-%m-%d %H:%M'):
+    if value is None or isinstance(value, str):
+        return value or ''
+    return value.strftime(format)
+
+# User-authored templates run in a sandbox that also forbids changing the
+# values they are given; the HTML body is autoescaped
+_subject_env = ImmutableSandboxedEnvironment(autoescape=False, finalize=_finalize)
+_body_env = ImmutableSandboxedEnvironment(autoescape=True, finalize=_finalize)
+for _env in (_subject_env, _body_env):
+    _env.filters['format_datetime'] = _format_datetime
+
+def template_values(instance, fields):
+    """
+    Copy model attributes into a plain dict for an email template.
+
+    Args:
+        instance: The model instance, or None
+        fields: Names of the attributes to copy
+
+    Returns:
+        dict: Attribute values, empty if there is no instance
+    """
+    if instance is None:
+        return {}
+    return {field: getattr(instance, field) for field in fields}
+
+def html_to_text(body):
+    """Derive a plain text alternative from a rendered HTML body."""
+    text = _BLOCK_TAGS.sub('\n', body)
+    text = html.unescape(_TAGS.sub('', text))
+    lines = [line.strip() for line in text.splitlines()]
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+class CompiledEmailTemplate:
+    """An organization's email template compiled for repeated rendering."""
+
+    def __init__(self, template):
+        self.id = template.id
+        self.updated_at = template.updated_at
+        self.subject = _subject_env.from_string(template.subject)
+        self.body = _body_env.from_string(template.body)
+
+    def render(self, context):
+        """
+        Render the template.
+
+        Args:
+            context (dict): Template variables
+
+        Returns:
+            tuple: (subject, text_body, html_body)
+        """
+        subject = ' '.join(self.subject.render(context).split())
+        html_body = self.body.render(context)
+        return subject, html_to_text(html_body), html_body
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()  # (organization_id, template_type) -> (checked_at, CompiledEmailTemplate or None)
+
+def _store(key, compiled):
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), compiled)
+        _cache.move_to_end(key)
+        while len(_cache) > TEMPLATE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def get_compiled_template(organization_id, template_type):
+    """
+    Return the compiled email template for an organization.
+
+    Cached templates are revalidated against the row's updated_at after
+    TEMPLATE_REVALIDATE_SECONDS, and only recompiled if it changed.
+
+    Args:
+        organization_id: ID of the organization
+        template_type: e.g. check_in, check_out, preregister
+
+    Returns:
+        CompiledEmailTemplate: The template, or None if the organization has none
+    """
+    key = (organization_id, template_type)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+
+    if cached is not None:
+        checked_at, compiled = cached
+        if time.monotonic() - checked_at < TEMPLATE_REVALIDATE_SECONDS:
+            return compiled
+
+        # Cheap check: only the id and timestamp are fetched
+        current = db.session.query(EmailTemplate.id, EmailTemplate.updated_at).filter_by(
+            organization_id=organization_id, template_type=template_type
+        ).first()
+        if (current is None and compiled is None) or (
+                current is not None and compiled is not None
+                and (current.id, current.updated_at) == (compiled.id, compiled.updated_at)):
+            _store(key, compiled)
+            return compiled
+
+    template = EmailTemplate.query.filter_by(
+        organization_id=organization_id, template_type=template_type
+    ).first()
+    compiled = CompiledEmailTemplate(template) if template else None
+    _store(key, compiled)
+    return compiled
+
+def invalidate_email_template(organization_id, template_type=None):
+    """Drop cached templates for an organization (optionally one type only)."""
+    with _cache_lock:
+        for key in list(_cache):
+            if key[0] == organization_id and (template_type is None or key[1] == template_type):
+                del _cache[key]
+
+# Stand-in values a template is test-rendered with before it is saved
+_SAMPLE_PERSON = {'first_name': 'Alex', 'last_name': 'Sample', 'email': 'alex@example.com',
+                  'phone': '', 'company': 'Example Ltd', 'department': '', 'position': '',
+                  'purpose': 'Meeting', 'expected_arrival': datetime(2024, 1, 1, 9)}
+SAMPLE_CONTEXT = {
+    'visitor_name': 'Alex Sample', 'visitor_email': 'alex@example.com', 'visitor_company': 'Example Ltd',
+    'visitor_purpose': 'Meeting', 'check_in_time': '2024-01-01 09:00', 'check_out_time': '2024-01-01 10:00',
+    'duration': '1 hours, 0 minutes', 'host_name': 'Alex Sample', 'organization_name': 'Example Ltd',
+    'code': 'ABCD1234', 'token': 'sample-token', 'expected_arrival': '2024-01-01 09:00',
+    'qr_url': 'https://example.com/qr.png',
+    'visitor': _SAMPLE_PERSON, 'host': _SAMPLE_PERSON,
+    'checkin': {'purpose': 'Meeting', 'check_in_time': datetime(2024, 1, 1, 9), 'check_out_time': None},
+    'organization': {'name': 'Example Ltd', 'contact_email': 'office@example.com', 'contact_phone': '',
+                     'address': ''},
+}
+
+def validate_email_template(subject, body):
+    """
+    Check that a template's subject and body compile and render.
+
+    Rendering with sample values rejects templates that call methods which
+    do not exist or that the sandbox forbids.
+
+    Returns:
+        str: The error message, or None if the template is valid
+    """
+    try:
+        _subject_env.from_string(subject).render(SAMPLE_CONTEXT)
+        _body_env.from_string(body).render(SAMPLE_CONTEXT)
+    except Exception as e:
+        return str(e)
+    return None
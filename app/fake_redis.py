@@ -0,0 +1,113 @@
+"""
+Minimal in-process Redis stand-in for Visitor Management System.
+Implements the commands the Redis cache backend uses (PING, AUTH, SELECT,
+GET, SET with EX/PX/NX/XX, INCR, DEL, FLUSHDB) over RESP, so the backend
+can be run locally and exercised without a Redis server.
+"""
+
+import socketserver
+import threading
+import time
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """A RESP server keeping its data in a dict; bind to port 0 for any free port."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _FakeRedisHandler)
+        self.lock = threading.Lock()
+        self.data = {}  # key -> (value bytes, expires_at or None)
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        """Serve in a background thread and return the server."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    def execute(self, command, args):
+        """Run one command and return its reply as a Python value."""
+        command = command.upper()
+        with self.lock:
+            if command == b'PING':
+                return 'PONG'
+            if command in (b'AUTH', b'SELECT'):
+                return 'OK'
+            if command == b'FLUSHDB':
+                self.data.clear()
+                return 'OK'
+            if command == b'GET':
+                entry = self._live(args[0])
+                return entry[0] if entry else None
+            if command == b'SET':
+                return self._set(args)
+            if command == b'INCR':
+                entry = self._live(args[0])
+                try:
+                    value = int(entry[0]) + 1 if entry else 1
+                except ValueError:
+                    return ValueError('ERR value is not an integer or out of range')
+                self.data[args[0]] = (str(value).encode('ascii'), entry[1] if entry else None)
+                return value
+            if command == b'DEL':
+                return sum(1 for key in args if self.data.pop(key, None) is not None)
+        return ValueError(f"ERR unknown command '{command.decode('utf-8', 'replace')}'")
+
+    def _set(self, args):
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for name, scale in ((b'EX', 1.0), (b'PX', 0.001)):
+            if name in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(name) + 1]) * scale
+        exists = self._live(key) is not None
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        self.data[key] = (value, expires_at)
+        return 'OK'
+
+class _FakeRedisHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b'*'):
+                self._reply(ValueError('ERR inline commands are not supported'))
+                continue
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self._reply(self.server.execute(args[0], args[1:]))
+
+    def _reply(self, value):
+        if value is None:
+            data = b'$-1\r\n'
+        elif isinstance(value, ValueError):
+            data = f'-{value}\r\n'.encode('utf-8')
+        elif isinstance(value, str):
+            data = f'+{value}\r\n'.encode('utf-8')
+        elif isinstance(value, int):
+            data = b':%d\r\n' % value
+        else:
+            data = b'$%d\r\n%s\r\n' % (len(value), value)
+        self.wfile.write(data)
@@ -1,9 +1,18 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField
 from wtforms import TextAreaField, IntegerField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, ValidationError
 from app.models import User
+from app.thumbnails import is_uploadable_image
+
+def image_file(form, field):
+    """Reject uploads that do not decode as an image, whatever their extension."""
+    if field.data and hasattr(field.data, 'read'):
+        data = field.data.read()
+        field.data.seek(0)
+        if data and not is_uploadable_image(data):
+            raise ValidationError('The file is not a valid image.')
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -47,7 +56,7 @@ class OrganizationSettingsForm(FlaskForm):
     address = TextAreaField('Address', validators=[Optional(), Length(max=200)])
     primary_color = StringField('Primary Color', validators=[Optional(), Length(max=20)])
     secondary_color = StringField('Secondary Color', validators=[Optional(), Length(max=20)])
-    logo = FileField('Logo', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!')])
+    logo = FileField('Logo', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!'), image_file])
     submit = SubmitField('Save Settings')
 
 class StaffForm(FlaskForm):
@@ -57,7 +66,8 @@ class StaffForm(FlaskForm):
     phone = StringField('Phone', validators=[Optional(), Length(max=20)])
     department = StringField('Department', validators=[Optional(), Length(max=64)])
     position = StringField('Position', validators=[Optional(), Length(max=64)])
-    photo = FileField('Photo', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!')])
+    photo = FileField('Photo', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'], 'Images only!'), image_file])
+    notification_digest = BooleanField('Send visitor notifications as a digest')
     submit = SubmitField('Save Staff')
 
 class VisitorCheckInForm(FlaskForm):
@@ -85,6 +95,19 @@ class PreregisterVisitorForm(FlaskForm):
     staff_id = SelectField('Host', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Preregister Visitor')
 
+class PreregistrationImportForm(FlaskForm):
+    file = FileField('Guest List', validators=[FileRequired(), FileAllowed(['csv', 'ics', 'xlsx'], 'CSV, iCalendar or XLSX files only!')])
+    staff_id = SelectField('Default Host', coerce=int, validators=[DataRequired()])
+    submit = SubmitField('Preregister Guests')
+
+class ExpressCheckInForm(FlaskForm):
+    code = StringField('Check-in Code', validators=[DataRequired(), Length(max=64)])
+    submit = SubmitField('Check In')
+
+class VisitorImportForm(FlaskForm):
+    file = FileField('Visitor File', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'CSV or XLSX files only!')])
+    submit = SubmitField('Import Visitors')
+
 class EmailTemplateForm(FlaskForm):
     name = StringField('Template Name', validators=[DataRequired(), Length(min=2, max=100)])
     subject = StringField('Email Subject', validators=[DataRequired(), Length(min=2, max=200)])
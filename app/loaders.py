@@ -0,0 +1,45 @@
+"""
+Relationship loading profiles for Visitor Management System.
+Views that show check-ins with their visitor and host name a profile here
+instead of relying on the lazy relationships, so a page loads its visitors
+and hosts in the same statement as the check-ins whatever the row count,
+and selects only the columns the profile displays.
+"""
+
+from sqlalchemy.orm import contains_eager, joinedload
+from app.models import CheckIn, Staff, Visitor
+
+# Visitor and host columns shown in check-in listings (dashboard, reports)
+LISTING_VISITOR_COLUMNS = (Visitor.first_name, Visitor.last_name, Visitor.email,
+                           Visitor.company, Visitor.photo_blob)
+LISTING_HOST_COLUMNS = (Staff.first_name, Staff.last_name)
+
+# Profile name -> (visitor columns, host columns); None loads every column
+# except deferred ones such as the legacy base64 photo
+LOADER_PROFILES = {
+    'listing': (LISTING_VISITOR_COLUMNS, LISTING_HOST_COLUMNS),
+    # Check-out handling: notification emails use the full visitor and host
+    'notification': (None, None),
+}
+
+def checkin_loader_options(profile, visitor_joined=False):
+    """
+    Return query options loading a check-in's visitor and host for a profile.
+
+    Args:
+        profile (str): Name of a profile in LOADER_PROFILES
+        visitor_joined (bool): The query already joins Visitor (e.g. to filter
+            on it), so the visitor is populated from that join
+
+    Returns:
+        list: Loader options for ``Query.options()``
+    """
+    visitor_columns, host_columns = LOADER_PROFILES[profile]
+
+    visitor = contains_eager(CheckIn.visitor) if visitor_joined else joinedload(CheckIn.visitor, innerjoin=True)
+    host = joinedload(CheckIn.host)
+    if visitor_columns is not None:
+        visitor = visitor.load_only(*visitor_columns)
+    if host_columns is not None:
+        host = host.load_only(*host_columns)
+    return [visitor, host]
@@ -0,0 +1,244 @@
+"""
+Outbound email queue for Visitor Management System.
+Emails are written to the email_outbox table inside the request and sent by
+a background job, so request latency no longer depends on the mail server.
+"""
+
+import base64
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from app import db, mail, scheduler
+from app.models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# Retry delays grow exponentially from the base up to the cap
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+# Emails claimed by a worker that dies before sending them are retried
+# after this long
+CLAIM_TIMEOUT_SECONDS = 600
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'sent': 0,
+    'failed': 0,
+    'retried': 0,
+    'batches': 0,
+    'send_seconds_total': 0.0,
+    'queue_seconds_total': 0.0,
+    'last_batch_at': None,
+}
+
+def enqueue_email(subject, recipients, text_body, html_body, sender,
+                  cc=None, bcc=None, attachments=None, organization_id=None, commit=False):
+    """
+    Add an email to the outbox.
+
+    The email is part of the caller's transaction and is sent once the
+    caller commits it.
+
+    Args:
+        subject (str): Email subject
+        recipients (list): List of recipients
+        text_body (str): Plain text email body
+        html_body (str): HTML email body
+        sender (str): Email sender
+        cc (list, optional): List of cc recipients
+        bcc (list, optional): List of bcc recipients
+        attachments (list, optional): List of attachment dicts with keys 'filename', 'content_type', and 'data'
+        organization_id (int, optional): Organization the email belongs to
+        commit (bool): Commit the session, with everything else pending in
+            it, immediately
+
+    Returns:
+        OutboundEmail: The queued email
+    """
+    if attachments:
+        attachments = json.dumps([{
+            'filename': attachment['filename'],
+            'content_type': attachment['content_type'],
+            'data': base64.b64encode(attachment['data']).decode('ascii')
+        } for attachment in attachments])
+
+    email = OutboundEmail(
+        organization_id=organization_id,
+        subject=subject,
+        sender=sender,
+        recipients=json.dumps(recipients),
+        cc=json.dumps(cc) if cc else None,
+        bcc=json.dumps(bcc) if bcc else None,
+        text_body=text_body,
+        html_body=html_body,
+        attachments=attachments or None,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(email)
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
+    return email
+
+def build_message(email):
+    """Build a Flask-Mail Message from a queued email."""
+    msg = Message(email.subject, sender=email.sender, recipients=json.loads(email.recipients))
+    msg.body = email.text_body
+    msg.html = email.html_body
+    if email.cc:
+        msg.cc = json.loads(email.cc)
+    if email.bcc:
+        msg.bcc = json.loads(email.bcc)
+    for attachment in json.loads(email.attachments or '[]'):
+        msg.attach(
+            filename=attachment['filename'],
+            content_type=attachment['content_type'],
+            data=base64.b64decode(attachment['data'])
+        )
+    return msg
+
+def retry_delay(attempts):
+    """Return the backoff before the next attempt after a number of failures."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+def _record_failure(email, error, max_attempts, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.id} after {email.attempts} attempts: {error}")
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts)
+
+def process_outbox(batch_size=None):
+    """
+    Send one batch of due emails over a single SMTP connection.
+
+    Rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL
+    and their next attempt moved CLAIM_TIMEOUT_SECONDS ahead, then the claim
+    is committed before anything is sent, so several workers can drain the
+    outbox without sending an email twice or holding row locks during SMTP.
+
+    Args:
+        batch_size: Maximum number of emails to send (default: EMAIL_OUTBOX_BATCH_SIZE)
+
+    Returns:
+        int: Number of emails sent
+    """
+    batch_size = batch_size or current_app.config['EMAIL_OUTBOX_BATCH_SIZE']
+    max_attempts = current_app.config['EMAIL_OUTBOX_MAX_ATTEMPTS']
+    now = datetime.utcnow()
+
+    claimed = OutboundEmail.query.filter(
+        OutboundEmail.status == 'pending',
+        OutboundEmail.next_attempt_at <= now
+    ).order_by(
+        OutboundEmail.next_attempt_at
+    ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not claimed:
+        db.session.commit()
+        return 0
+
+    ids = [email.id for email in claimed]
+    for email in claimed:
+        email.next_attempt_at = now + timedelta(seconds=CLAIM_TIMEOUT_SECONDS)
+    db.session.commit()
+
+    emails = OutboundEmail.query.filter(OutboundEmail.id.in_(ids)).order_by(OutboundEmail.id).all()
+
+    sent = failed = retried = 0
+    send_seconds = queue_seconds = 0.0
+    attempted = set()
+
+    try:
+        with mail.connect() as connection:
+            for email in emails:
+                attempted.add(email.id)
+                started = time.perf_counter()
+                try:
+                    connection.send(build_message(email))
+                except Exception as e:
+                    _record_failure(email, e, max_attempts, now)
+                    if email.status == 'failed':
+                        failed += 1
+                    else:
+                        retried += 1
+                    continue
+
+                send_seconds += time.perf_counter() - started
+                email.status = 'sent'
+                email.sent_at = datetime.utcnow()
+                email.attempts += 1
+                queue_seconds += (email.sent_at - email.created_at).total_seconds()
+                sent += 1
+    except Exception as e:
+        # The SMTP connection could not be opened; retry every unsent email later
+        logger.error(f"Error connecting to mail server: {str(e)}")
+        for email in emails:
+            if email.id not in attempted:
+                _record_failure(email, e, max_attempts, now)
+                if email.status == 'failed':
+                    failed += 1
+                else:
+                    retried += 1
+
+    db.session.commit()
+
+    with _metrics_lock:
+        _metrics['sent'] += sent
+        _metrics['failed'] += failed
+        _metrics['retried'] += retried
+        _metrics['batches'] += 1
+        _metrics['send_seconds_total'] += send_seconds
+        _metrics['queue_seconds_total'] += queue_seconds
+        _metrics['last_batch_at'] = datetime.utcnow()
+
+    return sent
+
+def get_outbox_metrics():
+    """
+    Return outbox queue depth and this process's send statistics.
+
+    Returns:
+        dict: queue_depth, sent, failed, retried, batches, average SMTP send
+        time and average time from enqueue to send, in seconds
+    """
+    queue_depth = OutboundEmail.query.filter_by(status='pending').count()
+    with _metrics_lock:
+        metrics = dict(_metrics)
+
+    sent = metrics['sent']
+    metrics['queue_depth'] = queue_depth
+    metrics['avg_send_seconds'] = metrics['send_seconds_total'] / sent if sent else 0.0
+    metrics['avg_queue_seconds'] = metrics['queue_seconds_total'] / sent if sent else 0.0
+    return metrics
+
+def schedule_outbox(app):
+    """Register the background job that drains the outbox."""
+    if not app.config['EMAIL_QUEUE_ENABLED']:
+        return
+
+    def send_outbox_job():
+        with app.app_context():
+            try:
+                process_outbox()
+            except Exception as e:
+                logger.error(f"Error processing email outbox: {str(e)}")
+                db.session.rollback()
+
+    scheduler.add_job(
+        id='send_outbox',
+        func=send_outbox_job,
+        trigger='interval',
+        seconds=app.config['EMAIL_OUTBOX_INTERVAL'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
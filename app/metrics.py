@@ -0,0 +1,313 @@
+"""
+Request metrics for Visitor Management System.
+Counters, gauges and histograms in Prometheus text format without an
+external client library. With METRICS_DIR set (e.g. under gunicorn), each
+worker writes its samples to its own memory-mapped file and /metrics sums
+the files of every worker, so no lock or message is shared between
+processes; without it samples are kept in process memory.
+"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from flask import current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+# Request latency buckets in seconds and response size buckets in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+MMAP_INITIAL_SIZE = 1024 * 1024
+_HEADER = struct.Struct('<I4x')  # Bytes used, padded to 8
+_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+class MmapValues:
+    """
+    Float samples of one process in a growable memory-mapped file.
+
+    The file is a header with the bytes in use followed by entries of a
+    key length, the UTF-8 key padded to 8 bytes and an 8-byte double. Only
+    the owning process writes it; readers parse a snapshot of the bytes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # Between the threads of this worker only
+        self.positions = {}  # key -> offset of its value
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < MMAP_INITIAL_SIZE:
+            self.file.truncate(MMAP_INITIAL_SIZE)
+            size = MMAP_INITIAL_SIZE
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.used = _HEADER.unpack_from(self.map, 0)[0] or _HEADER.size
+        for key, _, position in _iter_entries(self.map, self.used):
+            self.positions[key] = position
+
+    def _position(self, key):
+        position = self.positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode('utf-8')
+        padded = _LENGTH.size + len(encoded)
+        padded += -padded % 8
+        if self.used + padded + _VALUE.size > len(self.map):
+            self._grow(self.used + padded + _VALUE.size)
+        _LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + _LENGTH.size:self.used + _LENGTH.size + len(encoded)] = encoded
+        position = self.used + padded
+        _VALUE.pack_into(self.map, position, 0.0)
+        # Publish the entry only once it is complete
+        self.used = position + _VALUE.size
+        _HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def _grow(self, needed):
+        size = len(self.map)
+        while size < needed:
+            size *= 2
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def inc(self, key, amount):
+        with self.lock:
+            position = self._position(key)
+            _VALUE.pack_into(self.map, position, _VALUE.unpack_from(self.map, position)[0] + amount)
+
+    def set_max(self, key, value):
+        with self.lock:
+            position = self._position(key)
+            if value > _VALUE.unpack_from(self.map, position)[0]:
+                _VALUE.pack_into(self.map, position, value)
+
+class DictValues:
+    """Float samples kept in process memory, when no METRICS_DIR is set."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set_max(self, key, value):
+        with self.lock:
+            if value > self.values.get(key, 0.0):
+                self.values[key] = value
+
+def _iter_entries(buffer, used):
+    """Yield (key, value, value offset) for each entry of a samples file."""
+    position = _HEADER.size
+    while position + _LENGTH.size <= used:
+        length = _LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + _LENGTH.size:position + _LENGTH.size + length]).decode('utf-8')
+        padded = _LENGTH.size + length
+        position += padded + (-padded % 8)
+        yield key, _VALUE.unpack_from(buffer, position)[0], position
+        position += _VALUE.size
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return {}
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, value, _ in _iter_entries(data, used)}
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+_store_lock = threading.Lock()
+_store = None
+_store_pid = None
+
+def _values():
+    """Return this process's sample store, opening a new one after a fork."""
+    global _store, _store_pid
+    pid = os.getpid()
+    if _store_pid != pid:
+        with _store_lock:
+            if _store_pid != pid:
+                directory = current_app.config.get('METRICS_DIR')
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                    _store = MmapValues(os.path.join(directory, f'worker_{pid}.db'))
+                else:
+                    _store = DictValues()
+                _store_pid = pid
+    return _store
+
+def _key(family, sample, labels):
+    return json.dumps([family, sample, labels], separators=(',', ':'))
+
+class Metric:
+    """
+    A metric family.
+
+    ``aggregate`` decides how workers' samples combine: 'sum', 'max', or
+    'livesum' (summed over running workers only, for in-flight gauges).
+    """
+
+    def __init__(self, name, kind, help_text, labelnames=(), aggregate='sum', buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.aggregate = aggregate
+        self.buckets = buckets
+
+    def _labels(self, labels):
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+    def inc(self, amount=1, **labels):
+        _values().inc(_key(self.name, self.name, self._labels(labels)), amount)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_max(self, value, **labels):
+        _values().set_max(_key(self.name, self.name, self._labels(labels)), value)
+
+    def observe(self, value, **labels):
+        values = _values()
+        pairs = self._labels(labels)
+        for bound in self.buckets:
+            # Every bucket is written so they are all exposed, in order
+            values.inc(_key(self.name, f'{self.name}_bucket', pairs + [['le', repr(float(bound))]]),
+                       1 if value <= bound else 0)
+        values.inc(_key(self.name, f'{self.name}_bucket', pairs + [['le', '+Inf']]), 1)
+        values.inc(_key(self.name, f'{self.name}_sum', pairs), value)
+        values.inc(_key(self.name, f'{self.name}_count', pairs), 1)
+
+_registry = {}  # name -> Metric
+
+def register(name, kind, help_text, labelnames=(), aggregate='sum', buckets=None):
+    """Define a metric family, or return it if it is already defined."""
+    if name not in _registry:
+        _registry[name] = Metric(name, kind, help_text, labelnames, aggregate, buckets)
+    return _registry[name]
+
+REQUESTS = register('vms_http_requests_total', 'counter', 'HTTP requests handled.',
+                    ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = register('vms_http_request_duration_seconds', 'histogram', 'Time to produce a response.',
+                           ('endpoint', 'method'), buckets=LATENCY_BUCKETS)
+RESPONSE_SIZE = register('vms_http_response_size_bytes', 'histogram', 'Size of non-streamed response bodies.',
+                         ('endpoint',), buckets=SIZE_BUCKETS)
+IN_FLIGHT = register('vms_http_requests_in_flight', 'gauge', 'Requests being handled.',
+                     ('endpoint',), aggregate='livesum')
+
+def _collect():
+    """Combine the samples of every worker into key -> value."""
+    directory = current_app.config.get('METRICS_DIR')
+    if not directory:
+        with _store_lock:
+            store = _store if _store_pid == os.getpid() else None
+        if store is None:
+            return {}
+        with store.lock:
+            return dict(store.values)
+
+    combined = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'worker_*.db'))):
+        try:
+            pid = int(os.path.basename(path)[len('worker_'):-len('.db')])
+            samples = _read_file(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error reading metrics file {path}: {str(e)}")
+            continue
+        alive = None
+        for key, value in samples.items():
+            metric = _registry.get(json.loads(key)[0])
+            if metric is None:
+                continue
+            if metric.aggregate == 'livesum':
+                if alive is None:
+                    alive = _pid_alive(pid)
+                if not alive:
+                    continue
+            if metric.aggregate == 'max':
+                combined[key] = max(combined.get(key, value), value)
+            else:
+                combined[key] = combined.get(key, 0.0) + value
+    return combined
+
+def escape_label(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+def render_metrics():
+    """
+    Render every registered metric, combined across workers, in Prometheus text format.
+
+    Returns:
+        str: The exposition text
+    """
+    samples = {}  # family -> [(sample name, labels, value)], in first-written order
+    for key, value in _collect().items():
+        family, sample, labels = json.loads(key)
+        samples.setdefault(family, []).append((sample, labels, value))
+
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.help}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for sample, labels, value in samples.get(name, []):
+            label_text = ','.join(f'{label}="{escape_label(text)}"' for label, text in labels)
+            lines.append(f'{sample}{{{label_text}}} {_number(value)}' if label_text else f'{sample} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+def start_request_metrics():
+    """Count the request as in flight and start its timer."""
+    if not current_app.config['METRICS_ENABLED']:
+        return
+    g.metrics_endpoint = request.endpoint or 'unmatched'  # Unmatched URLs share one label value
+    g.metrics_started = time.perf_counter()
+    g.metrics_recorded = False
+    IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+def record_response_metrics(response):
+    """Record the latency, status and body size of a response."""
+    endpoint = g.get('metrics_endpoint')
+    if endpoint is None:
+        return response
+    REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_started, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if not response.is_streamed:
+        RESPONSE_SIZE.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+    g.metrics_recorded = True
+    return response
+
+def finish_request_metrics(error=None):
+    """Leave the in-flight count, recording requests that ended in an unhandled error."""
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is None:
+        return
+    if not g.get('metrics_recorded'):
+        REQUEST_LATENCY.observe(time.perf_counter() - g.metrics_started, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=500)
+    IN_FLIGHT.dec(endpoint=endpoint)
+
+def init_metrics(app):
+    """Record latency, status, size and in-flight metrics for every request."""
+    app.before_request(start_request_metrics)
+    app.after_request(record_response_metrics)
+    app.teardown_request(finish_request_metrics)
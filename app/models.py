@@ -4,12 +4,14 @@ import os
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.orm import deferred
 from app import db, login_manager
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load a user from the database."""
-    return User.query.get(int(user_id))
+    """Load the logged-in user from its session snapshot, querying only to revalidate it."""
+    from app.user_sessions import load_session_user
+    return load_session_user(user_id)
 
 class Organization(db.Model):
     __tablename__ = 'organizations'
@@ -17,7 +19,8 @@ class Organization(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    logo = db.Column(db.Text, nullable=True)  # Base64 encoded logo
+    logo_blob = db.Column(db.String(64), nullable=True)  # Blob store key of the logo
+    logo = deferred(db.Column(db.Text, nullable=True))  # Legacy base64 logo, moved out by `flask migrate-blobs`
     primary_color = db.Column(db.String(20), default="#007bff")
     secondary_color = db.Column(db.String(20), default="#6c757d")
     contact_email = db.Column(db.String(120), nullable=True)
@@ -108,7 +111,9 @@ class Staff(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     department = db.Column(db.String(64), nullable=True)
     position = db.Column(db.String(64), nullable=True)
-    photo = db.Column(db.Text, nullable=True)  # Base64 encoded photo
+    photo_blob = db.Column(db.String(64), nullable=True)  # Blob store key of the photo
+    photo = deferred(db.Column(db.Text, nullable=True))  # Legacy base64 photo, moved out by `flask migrate-blobs`
+    notification_digest = db.Column(db.Boolean, default=False)  # Coalesce visit notifications into digests
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -125,7 +130,8 @@ class Visitor(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     company = db.Column(db.String(100), nullable=True)
     purpose = db.Column(db.String(200), nullable=True)
-    photo = db.Column(db.Text, nullable=True)  # Base64 encoded photo
+    photo_blob = db.Column(db.String(64), nullable=True)  # Blob store key of the photo
+    photo = deferred(db.Column(db.Text, nullable=True))  # Legacy base64 photo, moved out by `flask migrate-blobs`
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -135,13 +141,16 @@ class Visitor(db.Model):
     def __repr__(self):
         return f'<Visitor {self.first_name} {self.last_name}>'
 
+db.Index('idx_visitors_org_created', Visitor.organization_id, Visitor.created_at.desc(), Visitor.id.desc())
+
 class CheckIn(db.Model):
     __tablename__ = 'checkins'
     
     id = db.Column(db.Integer, primary_key=True)
     visitor_id = db.Column(db.Integer, db.ForeignKey('visitors.id'), nullable=False)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
-    check_in_time = db.Column(db.DateTime, default=datetime.utcnow)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)  # Copied from the visitor on insert
+    check_in_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Partition key on PostgreSQL
     check_out_time = db.Column(db.DateTime, nullable=True)
     badge_printed = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
@@ -154,17 +163,28 @@ class CheckIn(db.Model):
     def __repr__(self):
         return f'<CheckIn {self.visitor_id} at {self.check_in_time}>'
 
+# Indexes for the organization-scoped listings, reports and active check-in lookups
+db.Index('idx_checkins_org_time', CheckIn.organization_id, CheckIn.check_in_time.desc(), CheckIn.id.desc())
+db.Index('idx_checkins_org_active', CheckIn.organization_id,
+         postgresql_where=CheckIn.check_out_time.is_(None),
+         sqlite_where=CheckIn.check_out_time.is_(None))
+db.Index('idx_checkins_visitor_time', CheckIn.visitor_id, CheckIn.check_in_time)
+
 class Badge(db.Model):
     __tablename__ = 'badges'
     
     id = db.Column(db.Integer, primary_key=True)
-    check_in_id = db.Column(db.Integer, db.ForeignKey('checkins.id'), nullable=False)
+    # No foreign key: once checkins is partitioned its primary key is
+    # (id, check_in_time), which check_in_id alone cannot reference.
+    # Retention deletes a check-in's badges before the check-in.
+    check_in_id = db.Column(db.Integer, nullable=False)
     template_data = db.Column(db.Text, nullable=False)  # JSON string with badge data
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     printed_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
-    check_in = db.relationship('CheckIn', backref='badge', lazy=True)
+    check_in = db.relationship('CheckIn', primaryjoin='CheckIn.id == foreign(Badge.check_in_id)',
+                               backref='badge', lazy=True)
     
     def __repr__(self):
         return f'<Badge {self.id} for CheckIn {self.check_in_id}>'
@@ -189,7 +209,8 @@ class Document(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    content = db.Column(db.Text, nullable=False)  # Could be PDF content as base64 or HTML content
+    content_blob = db.Column(db.String(64), nullable=True)  # Blob store key of the PDF or HTML content
+    content = deferred(db.Column(db.Text, nullable=True))  # Legacy base64 PDF or HTML, moved out by `flask migrate-blobs`
     document_type = db.Column(db.String(50), nullable=False)  # e.g. nda, policy, waiver
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -219,6 +240,9 @@ class Subscription(db.Model):
 
 class PreregisteredVisitor(db.Model):
     __tablename__ = 'preregistered_visitors'
+    __table_args__ = (
+        db.Index('idx_preregistered_visitors_code', 'code', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(64), nullable=False)
@@ -232,6 +256,9 @@ class PreregisteredVisitor(db.Model):
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default="pending")  # pending, checked_in, cancelled
+    code = db.Column(db.String(16), nullable=True)  # Express check-in code given to the visitor
+    confirmation_sent_at = db.Column(db.DateTime, nullable=True)  # When the confirmation email was queued
+    check_in_id = db.Column(db.Integer, nullable=True)  # CheckIn created by express check-in
     
     # Relationships
     host = db.relationship('Staff', backref='preregistered_visitors', lazy=True)
@@ -263,11 +290,84 @@ class Log(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     event_type = db.Column(db.String(50), nullable=False)
     event_data = db.Column(db.Text, nullable=True)  # JSON string with event details
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Partition key on PostgreSQL
     
     # Relationships
     organization = db.relationship('Organization', backref='logs', lazy=True)
     user = db.relationship('User', backref='logs', lazy=True)
     
     def __repr__(self):
-        return f'<Log {self.event_type} at {self.created_at}>'
\ No newline at end of file
+        return f'<Log {self.event_type} at {self.created_at}>'
+
+class DailyVisitRollup(db.Model):
+    __tablename__ = 'daily_visit_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'day', name='uq_daily_visit_rollups_org_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)  # UTC day of the check-in
+    check_ins = db.Column(db.Integer, nullable=False, default=0)
+    unique_visitors = db.Column(db.Integer, nullable=False, default=0)
+    completed_visits = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DailyVisitRollup {self.day} for Organization {self.organization_id}>'
+
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('idx_email_outbox_pending', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(120), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    cc = db.Column(db.Text, nullable=True)  # JSON list of addresses
+    bcc = db.Column(db.Text, nullable=True)  # JSON list of addresses
+    text_body = db.Column(db.Text, nullable=True)
+    html_body = db.Column(db.Text, nullable=True)
+    attachments = db.Column(db.Text, nullable=True)  # JSON list with base64 encoded data
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboundEmail {self.id} {self.status}>'
+
+class RosterVersion(db.Model):
+    __tablename__ = 'roster_versions'
+    
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # Bumped by every check-in and check-out
+    
+    def __repr__(self):
+        return f'<RosterVersion {self.version} for Organization {self.organization_id}>'
+
+class PendingNotification(db.Model):
+    __tablename__ = 'pending_notifications'
+    __table_args__ = (
+        db.Index('idx_pending_notifications_staff', 'staff_id', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
+    # No foreign key, as for Badge.check_in_id
+    check_in_id = db.Column(db.Integer, nullable=False)
+    is_checkout = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Relationships
+    checkin = db.relationship('CheckIn', primaryjoin='CheckIn.id == foreign(PendingNotification.check_in_id)',
+                              lazy=True)
+    
+    def __repr__(self):
+        return f'<PendingNotification {self.staff_id} {self.check_in_id}>'
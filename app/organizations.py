@@ -0,0 +1,111 @@
+"""
+Organization snapshots for Visitor Management System.
+Views that only display an organization or check its plan read a slim,
+immutable snapshot from the application cache, kept for
+ORGANIZATION_CACHE_TTL, instead of loading the Organization row on every
+request. Saves that change an organization invalidate its snapshot; with
+a shared cache backend that reaches every worker, otherwise other workers
+see the change once their copy expires.
+
+Each organization also has a version, the time its current snapshot was
+first cached, which keys the kiosk pages rendered from it.
+"""
+
+import time
+from collections import namedtuple
+from flask import abort, current_app
+from app import db
+from app.cache import get_cache
+from app.models import Organization
+from app.subscription_plans import get_plan_features
+
+# Columns copied into a snapshot; the legacy base64 logo and the badge
+# template are left out
+SNAPSHOT_COLUMNS = ['id', 'name', 'logo_blob', 'primary_color', 'secondary_color',
+                    'contact_email', 'contact_phone', 'address',
+                    'subscription_plan', 'subscription_status', 'subscription_expires_at',
+                    'enable_photo_capture', 'enable_badge_printing', 'enable_auto_checkout',
+                    'enable_email_notifications']
+
+# Subscription statuses that take an organization's kiosk offline; a
+# cancelled subscription falls back to the free plan and stays usable
+INACTIVE_SUBSCRIPTION_STATUSES = ('unpaid', 'incomplete_expired', 'suspended')
+
+# Seconds a version is kept in a shared cache, where invalidations reach
+# every worker; other caches keep it only as long as a snapshot
+ORGANIZATION_VERSION_TTL = 24 * 3600
+
+class OrganizationSnapshot(namedtuple('OrganizationSnapshot', SNAPSHOT_COLUMNS + ['features'])):
+    """Read-only copy of an organization with its plan's resolved features."""
+    __slots__ = ()
+
+    @property
+    def is_active(self):
+        """Whether the organization's subscription status lets it use the kiosk."""
+        return self.subscription_status not in INACTIVE_SUBSCRIPTION_STATUSES
+
+    def has_feature(self, feature_name):
+        """Whether the organization's plan includes a feature."""
+        return bool(self.features.get(feature_name))
+
+    def within_limit(self, limit_name, current_count):
+        """Whether a count is still below the plan's limit (no limit means unlimited)."""
+        limit = self.features.get(limit_name)
+        return not limit or current_count < limit
+
+    def __reduce__(self):
+        # The feature map is rebuilt from the plan rather than pickled
+        return (_snapshot_from_row, (tuple(self[:-1]),))
+
+def _snapshot_from_row(row):
+    return OrganizationSnapshot(*row, features=get_plan_features(row[SNAPSHOT_COLUMNS.index('subscription_plan')]))
+
+def _load_snapshot(organization_id):
+    row = db.session.query(
+        *(getattr(Organization, column) for column in SNAPSHOT_COLUMNS)
+    ).filter(Organization.id == organization_id).first()
+    return _snapshot_from_row(tuple(row)) if row is not None else None
+
+def get_organization(organization_id):
+    """
+    Return a snapshot of an organization, loading it if it is not cached.
+
+    Args:
+        organization_id: ID of the organization
+
+    Returns:
+        OrganizationSnapshot: The snapshot, or None if there is no such organization
+    """
+    return get_cache().namespace('organization', organization_id).get_or_set(
+        'snapshot', lambda: _load_snapshot(organization_id), current_app.config['ORGANIZATION_CACHE_TTL']
+    )
+
+def get_organization_or_404(organization_id):
+    """Return an organization's snapshot, or abort with 404 if it does not exist."""
+    snapshot = get_organization(organization_id)
+    if snapshot is None:
+        abort(404)
+    return snapshot
+
+def organization_version(organization_id=None):
+    """
+    Return an organization's version: when it was first cached after a change, in epoch milliseconds.
+
+    Args:
+        organization_id: ID of the organization, or None for the version of
+            the organization list, which changes with any organization
+
+    Returns:
+        int: The version
+    """
+    cache = get_cache()
+    ttl = ORGANIZATION_VERSION_TTL if cache.shared else current_app.config['ORGANIZATION_CACHE_TTL']
+    return cache.namespace('organization', organization_id).get_or_set(
+        'version', lambda: int(time.time() * 1000), ttl
+    )
+
+def invalidate_organization(organization_id):
+    """Drop an organization's cached snapshot and bump its version after it is changed."""
+    cache = get_cache()
+    cache.namespace('organization', organization_id).clear()
+    cache.namespace('organization').delete('version')
@@ -0,0 +1,47 @@
+"""
+Cached pages for Visitor Management System.
+Pages that depend only on an organization's branding are rendered once per
+organization version and kept in the application cache. Responses carry an
+ETag of the rendered body and the version as Last-Modified, so kiosks that
+reload them all day get a 304 without the page being rendered again.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from flask import current_app, request, session
+from app.cache import get_cache
+
+def _render(render):
+    body = render()
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    return body, hashlib.sha256(body).hexdigest()[:32]
+
+def cached_page(version, render, organization_id=None):
+    """
+    Return a page rendered once per organization version, answering conditional requests.
+
+    Pages with flashed messages to show are rendered every time and not cached.
+
+    Args:
+        version (int): Version of the organization the page shows, from organization_version()
+        render: Function returning the page HTML
+        organization_id: ID of the organization, or None for pages about every organization
+
+    Returns:
+        Response: The page, or an empty 304 response if the client's copy is current
+    """
+    if session.get('_flashes'):
+        return render()
+
+    # Pages expire with the snapshots they are rendered from, which another
+    # worker may still hold from before the version changed
+    body, etag = get_cache().namespace('page', organization_id).get_or_set(
+        f'{request.endpoint}:{version}', lambda: _render(render), current_app.config['ORGANIZATION_CACHE_TTL']
+    )
+    response = current_app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(version // 1000, timezone.utc)
+    # Let clients keep the page but check it on every load
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination for Visitor Management System.
+Pages are addressed by the sort key of the last row shown rather than by an
+offset, so fetching any page costs the same no matter how deep it is.
+Rows are ordered newest first with NULL sort keys first, PostgreSQL's
+default for descending indexes, so the organization indexes still serve
+the ordering.
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, tuple_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+class KeysetPage:
+    """One page of rows and the cursor for the page that follows it."""
+
+    def __init__(self, items, next_cursor, cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def encode_cursor(values):
+    """Encode a row's sort key values as an opaque URL-safe cursor."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, columns):
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Args:
+        cursor: The cursor string from the request
+        columns: The sort columns the cursor was built from
+
+    Returns:
+        list: Sort key values, or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        # The last column identifies the row and is never NULL
+        if values[-1] is None:
+            return None
+        return [_decode_value(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+def _decode_value(value, column):
+    """Check a cursor value against its column's type; tampered cursors raise ValueError."""
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise ValueError(f"Expected a timestamp for {column.key}")
+        return datetime.fromisoformat(value)
+    # JSON booleans are ints to Python, but never a valid sort key
+    if not isinstance(value, python_type) or isinstance(value, bool):
+        raise ValueError(f"Expected {python_type.__name__} for {column.key}")
+    return value
+
+def _after(columns, values):
+    """Filter for the rows that sort after ``values`` (descending, NULLs first)."""
+    if len(columns) == 1 or None not in values:
+        return tuple_(*columns) < tuple_(*values)
+    column, value = columns[0], values[0]
+    rest = _after(columns[1:], values[1:])
+    if value is None:
+        return or_(column.isnot(None), and_(column.is_(None), rest))
+    return or_(column < value, and_(column == value, rest))
+
+def keyset_paginate(query, columns, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Return the page of a query that follows the given cursor.
+
+    Rows are ordered by ``columns`` descending, NULLs first; the last column
+    must be unique and not NULL (normally the primary key) so every row has
+    a distinct position.
+
+    Args:
+        query: A Flask-SQLAlchemy query with filters applied but no ordering
+        columns: Sort columns, e.g. (Visitor.created_at, Visitor.id)
+        cursor: Cursor from a previous page's next_cursor (optional)
+        per_page: Number of rows per page
+
+    Returns:
+        KeysetPage: The rows on this page and the cursor for the next one
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    after = decode_cursor(cursor, columns)
+    if after is not None:
+        query = query.filter(_after(columns, after))
+
+    rows = query.order_by(*[column.desc().nulls_first() for column in columns]).limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+
+    return KeysetPage(items, next_cursor, cursor if after is not None else None)
@@ -0,0 +1,317 @@
+"""
+Time partitioning and retention for Visitor Management System.
+On PostgreSQL the logs and checkins tables are range partitioned by month,
+future partitions are created ahead of time, and expired months are removed
+by dropping whole partitions. On other databases (SQLite in tests) the
+tables stay unpartitioned and retention falls back to batched DELETEs.
+Retention deletes tenant data, so it only runs when RETENTION_ENABLED is set.
+"""
+
+import logging
+import re
+from datetime import date, datetime
+from sqlalchemy import inspect, select, text
+from app import db, scheduler
+from app.models import Badge, CheckIn, Log, Organization, PendingNotification
+from app.query_utils import dialect_name
+from app.roster import bump_roster_versions
+from app.subscription_plans import get_plan_feature
+
+logger = logging.getLogger(__name__)
+
+# table name -> (model, partition key column, plan feature holding its retention in months)
+PARTITIONED_TABLES = {
+    'logs': (Log, 'created_at', 'log_retention_months'),
+    'checkins': (CheckIn, 'check_in_time', 'checkin_retention_months'),
+}
+
+# Serializes maintenance between workers that all run the scheduler
+MAINTENANCE_LOCK_ID = 7241001
+
+def _month_start(value, offset=0):
+    """Return the first day of the month ``offset`` months after ``value``."""
+    months = value.year * 12 + value.month - 1 + offset
+    return date(months // 12, months % 12 + 1, 1)
+
+def partition_name(table_name, month):
+    """Return the name of a table's partition for the month starting on ``month``."""
+    return f'{table_name}_p{month.year:04d}_{month.month:02d}'
+
+def is_partitioned(table_name):
+    """Return True if the table is a partitioned table on PostgreSQL."""
+    if dialect_name() != 'postgresql':
+        return False
+    return db.session.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {'table': table_name}).first() is not None
+
+def list_partitions(table_name):
+    """
+    Return the monthly partitions of a table.
+
+    Returns:
+        list: (month start date, partition name) tuples, oldest first
+    """
+    pattern = re.compile(rf'^{table_name}_p(\d{{4}})_(\d{{2}})$')
+    names = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :table AND pg_table_is_visible(p.oid)"
+    ), {'table': table_name}).scalars()
+
+    partitions = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+def _create_partition(table_name, month):
+    db.session.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, month)} "
+        f"PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_month_start(month, 1).isoformat()}')"
+    ))
+
+def partition_table(table_name, months_ahead=3):
+    """
+    Convert an existing table into a monthly range-partitioned table.
+
+    The table is rebuilt inside one transaction: the old table is renamed,
+    a partitioned copy with the same columns, defaults and indexes is
+    created, partitions covering the existing rows are added and the rows
+    are copied over. The primary key becomes (id, partition key), which a
+    single id column cannot reference, so foreign keys to the table (from
+    databases created before the models declared badges.check_in_id and
+    pending_notifications.check_in_id without one) are dropped first.
+
+    Args:
+        table_name: A key of PARTITIONED_TABLES
+        months_ahead: Number of future monthly partitions to create
+
+    Returns:
+        bool: True if the table was converted, False if it already was
+        partitioned or the database is not PostgreSQL
+    """
+    if dialect_name() != 'postgresql' or is_partitioned(table_name):
+        return False
+
+    model, column, _ = PARTITIONED_TABLES[table_name]
+    legacy = f'{table_name}_unpartitioned'
+    inspector = inspect(db.engine)
+    primary_key = inspector.get_pk_constraint(table_name)['name']
+    references = [
+        (referring, foreign_key['name'])
+        for referring in inspector.get_table_names()
+        for foreign_key in inspector.get_foreign_keys(referring)
+        if foreign_key['referred_table'] == table_name and referring != table_name
+    ]
+    sequence = db.session.execute(text(
+        "SELECT pg_get_serial_sequence(:table, 'id')"
+    ), {'table': table_name}).scalar()
+
+    statements = [
+        f"ALTER TABLE {referring} DROP CONSTRAINT {name}" for referring, name in references
+    ]
+    statements += [
+        f"ALTER TABLE {table_name} RENAME TO {legacy}",
+        f"ALTER TABLE {legacy} DROP CONSTRAINT {primary_key}",
+        f"UPDATE {legacy} SET {column} = timezone('utc', now()) WHERE {column} IS NULL",
+        f"CREATE TABLE {table_name} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING INDEXES) "
+        f"PARTITION BY RANGE ({column})",
+        f"ALTER TABLE {table_name} ADD PRIMARY KEY (id, {column})",
+        f"CREATE TABLE {table_name}_default PARTITION OF {table_name} DEFAULT",
+    ]
+    for constraint in model.__table__.foreign_key_constraints:
+        columns = ', '.join(c.name for c in constraint.columns)
+        referred = ', '.join(element.column.name for element in constraint.elements)
+        statements.append(
+            f"ALTER TABLE {table_name} ADD FOREIGN KEY ({columns}) "
+            f"REFERENCES {constraint.referred_table.name} ({referred})"
+        )
+    for statement in statements:
+        db.session.execute(text(statement))
+
+    oldest = db.session.execute(text(f"SELECT min({column}) FROM {legacy}")).scalar()
+    month = _month_start(oldest or datetime.utcnow())
+    last = _month_start(datetime.utcnow(), months_ahead)
+    while month <= last:
+        _create_partition(table_name, month)
+        month = _month_start(month, 1)
+
+    db.session.execute(text(f"INSERT INTO {table_name} SELECT * FROM {legacy}"))
+    if sequence:
+        db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table_name}.id"))
+    db.session.execute(text(f"DROP TABLE {legacy}"))
+    db.session.commit()
+    return True
+
+def create_future_partitions(months_ahead=3):
+    """
+    Create monthly partitions from the current month up to ``months_ahead``.
+
+    Returns:
+        int: Number of partition tables checked or created
+    """
+    count = 0
+    this_month = _month_start(datetime.utcnow())
+    for table_name in PARTITIONED_TABLES:
+        if not is_partitioned(table_name):
+            continue
+        for offset in range(months_ahead + 1):
+            _create_partition(table_name, _month_start(this_month, offset))
+            count += 1
+    db.session.commit()
+    return count
+
+def _retention_by_organization(feature):
+    """Map each organization ID to its plan's retention in months (None keeps forever)."""
+    return {
+        organization_id: get_plan_feature(plan or 'free', feature)
+        for organization_id, plan in db.session.query(Organization.id, Organization.subscription_plan)
+    }
+
+def _delete_dependents(model, ids):
+    """
+    Remove rows that referenced purged check-ins (a list of ids or a
+    subquery), and take the visitors still checked in among them off the
+    active rosters.
+    """
+    if model is CheckIn:
+        db.session.execute(Badge.__table__.delete().where(Badge.check_in_id.in_(ids)))
+        db.session.execute(PendingNotification.__table__.delete().where(
+            PendingNotification.check_in_id.in_(ids)
+        ))
+        organization_ids = db.session.execute(
+            select(CheckIn.organization_id).where(
+                CheckIn.id.in_(ids),
+                CheckIn.check_out_time.is_(None),
+                CheckIn.organization_id.isnot(None)
+            ).distinct()
+        ).scalars().all()
+        bump_roster_versions(organization_ids)
+
+def _purge_rows(model, column, organization_ids, cutoff, batch_size):
+    """Delete an organization group's rows older than ``cutoff`` in small batches."""
+    key = getattr(model, column)
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            select(model.id).where(
+                key < cutoff, model.organization_id.in_(organization_ids)
+            ).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        _delete_dependents(model, ids)
+        db.session.execute(model.__table__.delete().where(model.id.in_(ids)))
+        db.session.commit()
+        deleted += len(ids)
+
+def apply_retention(batch_size=1000, today=None):
+    """
+    Remove logs and check-ins older than each organization's plan allows.
+
+    On partitioned tables every monthly partition that is past the longest
+    retention of any organization is dropped outright. Organizations whose
+    plan keeps less history have their older rows removed from the
+    remaining partitions in batches. Daily visit rollups are kept, so
+    dashboard and report totals survive the purge.
+
+    Args:
+        batch_size: Rows deleted per transaction when deleting rows
+        today: Date retention is measured from (default: today, UTC)
+
+    Returns:
+        dict: Per table, the number of partitions dropped and rows deleted
+    """
+    this_month = _month_start(today or datetime.utcnow())
+    results = {}
+
+    for table_name, (model, column, feature) in PARTITIONED_TABLES.items():
+        retention = _retention_by_organization(feature)
+        dropped = deleted = 0
+
+        # Partitions can only go once no organization still keeps them
+        if retention and None not in retention.values() and is_partitioned(table_name):
+            drop_before = _month_start(this_month, -max(retention.values()))
+            for month, name in list_partitions(table_name):
+                if month >= drop_before:
+                    break
+                _delete_dependents(model, select(text('id')).select_from(text(name)))
+                db.session.execute(text(f"DROP TABLE {name}"))
+                db.session.commit()
+                dropped += 1
+
+        groups = {}
+        for organization_id, months in retention.items():
+            if months is not None:
+                groups.setdefault(months, []).append(organization_id)
+        for months, organization_ids in groups.items():
+            cutoff = datetime.combine(_month_start(this_month, -months), datetime.min.time())
+            deleted += _purge_rows(model, column, organization_ids, cutoff, batch_size)
+
+        results[table_name] = {'partitions_dropped': dropped, 'rows_deleted': deleted}
+    return results
+
+def _maintain(months_ahead, batch_size, retention):
+    create_future_partitions(months_ahead)
+    return apply_retention(batch_size) if retention else {}
+
+def maintain_partitions(months_ahead=3, batch_size=1000, retention=False):
+    """
+    Create upcoming partitions and, if asked, apply retention, once across all workers.
+
+    Args:
+        months_ahead: Future monthly partitions to create
+        batch_size: Rows deleted per transaction when applying retention
+        retention: Delete history past plan retention (RETENTION_ENABLED)
+
+    Returns:
+        dict: Results of apply_retention (empty when retention is off), or
+        None if another worker holds the lock
+    """
+    if dialect_name() != 'postgresql':
+        return _maintain(months_ahead, batch_size, retention)
+
+    # The advisory lock is held on its own connection for the whole run,
+    # since the session commits (and may change connection) along the way
+    with db.engine.connect() as lock_connection:
+        locked = lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(:id)"), {'id': MAINTENANCE_LOCK_ID}
+        ).scalar()
+        if not locked:
+            return None
+        try:
+            return _maintain(months_ahead, batch_size, retention)
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': MAINTENANCE_LOCK_ID})
+
+def schedule_partition_maintenance(app):
+    """Register the daily job that creates partitions and, if enabled, applies retention."""
+
+    def maintain_partitions_job():
+        with app.app_context():
+            try:
+                results = maintain_partitions(
+                    app.config['PARTITION_MONTHS_AHEAD'],
+                    app.config['RETENTION_BATCH_SIZE'],
+                    app.config['RETENTION_ENABLED']
+                )
+                if results:
+                    logger.info(f"Partition maintenance: {results}")
+            except Exception as e:
+                logger.error(f"Error maintaining partitions: {str(e)}")
+                db.session.rollback()
+
+    scheduler.add_job(
+        id='maintain_partitions',
+        func=maintain_partitions_job,
+        trigger='interval',
+        hours=app.config['PARTITION_MAINTENANCE_INTERVAL'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
@@ -0,0 +1,489 @@
+"""
+Visitor preregistration for Visitor Management System.
+Guests are preregistered one at a time or in bulk from CSV or iCalendar
+attendee lists. Each preregistration gets a short express check-in code
+and a signed QR token; confirmation emails carrying both are sent by a
+background job. The kiosk verifies a scanned token by its HMAC alone, or
+looks a typed code up through a unique index.
+"""
+
+import base64
+import binascii
+import hashlib
+import hmac
+import io
+import logging
+import secrets
+import struct
+from datetime import date, datetime
+from flask import current_app, render_template, url_for
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app import db, scheduler
+from app.bulk_import import (BatchWriter, ImportReport, RowError, clean_datetime, clean_email,
+                             clean_text)
+from app.email_rendering import (HOST_FIELDS, ORGANIZATION_FIELDS, PREREGISTRATION_FIELDS, get_compiled_template,
+                                  template_values)
+from app.models import CheckIn, PreregisteredVisitor, Staff, Visitor
+from app.organizations import get_organization
+from app.query_utils import add_missing_columns
+from app.rollups import record_check_in
+
+logger = logging.getLogger(__name__)
+
+# Unambiguous characters only (no 0/O or 1/I), so codes can be read aloud or typed
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 8
+
+# Express tokens: preregistration id, organization id and last valid day
+# (days since EPOCH), followed by a truncated HMAC-SHA256 signature
+TOKEN_FORMAT = '>IIH'
+TOKEN_SIGNATURE_BYTES = 10
+TOKEN_LENGTH = struct.calcsize(TOKEN_FORMAT) + TOKEN_SIGNATURE_BYTES
+TOKEN_TEXT_LENGTH = len(base64.urlsafe_b64encode(bytes(TOKEN_LENGTH)).rstrip(b'='))
+EPOCH = date(2000, 1, 1)
+
+PREREGISTRATION_COLUMNS = ['first_name', 'last_name', 'email', 'phone', 'company', 'purpose',
+                           'expected_arrival', 'staff_id', 'organization_id', 'created_at',
+                           'status', 'code']
+
+class ExpressCheckInError(Exception):
+    """Raised when an express check-in code cannot be used."""
+    pass
+
+def prepare_preregistration_columns():
+    """Add the express check-in columns and code index to existing tables."""
+    add_missing_columns(PreregisteredVisitor, 'code', 'confirmation_sent_at', 'check_in_id')
+    for index in PreregisteredVisitor.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+def generate_code():
+    """Return a random express check-in code."""
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+def normalize_code(code):
+    """Upper-case a typed code and drop spaces and dashes."""
+    return ''.join(ch for ch in (code or '').upper() if ch.isalnum())
+
+def preregister_visitor(organization_id, staff_id, first_name, last_name, email, expected_arrival,
+                        phone=None, company=None, purpose=None):
+    """
+    Preregister a single visitor; the confirmation email goes out with the next batch.
+
+    Returns:
+        PreregisteredVisitor: The new preregistration
+    """
+    preregistration = PreregisteredVisitor(
+        first_name=first_name,
+        last_name=last_name,
+        email=email,
+        phone=phone,
+        company=company,
+        purpose=purpose,
+        expected_arrival=expected_arrival,
+        staff_id=staff_id,
+        organization_id=organization_id,
+        created_at=datetime.utcnow(),
+        status='pending',
+        code=generate_code()
+    )
+    db.session.add(preregistration)
+    db.session.commit()
+    return preregistration
+
+def _staff_by_email(organization_id):
+    return {
+        email.lower(): staff_id
+        for staff_id, email in db.session.query(Staff.id, Staff.email).filter(
+            Staff.organization_id == organization_id, Staff.email.isnot(None)
+        )
+    }
+
+def existing_preregistrations(organization_id):
+    """Load (lower-cased email, expected arrival) of an organization's pending preregistrations."""
+    query = db.session.query(
+        func.lower(PreregisteredVisitor.email), PreregisteredVisitor.expected_arrival
+    ).filter(
+        PreregisteredVisitor.organization_id == organization_id,
+        PreregisteredVisitor.status == 'pending'
+    ).execution_options(yield_per=5000)
+    return {(email, arrival) for email, arrival in query}
+
+def iter_preregistration_import(organization_id, rows, default_staff_id=None, batch_size=1000):
+    """
+    Preregister visitors in bulk, yielding progress after each batch.
+
+    Each row needs first_name, last_name, email and expected_arrival. The
+    host is the staff member whose email matches the row's host_email
+    (an iCalendar event's organizer), otherwise ``default_staff_id``. A
+    guest already preregistered for the same arrival time is skipped as a
+    duplicate.
+
+    Args:
+        organization_id: ID of the organization to preregister for
+        rows: Iterator of (line number, row dict), e.g. from read_rows()
+        default_staff_id: Host for rows that do not name one
+        batch_size: Rows written per batch
+
+    Yields:
+        ImportReport: The running totals, after every batch and at the end
+    """
+    report = ImportReport()
+    seen = existing_preregistrations(organization_id)
+    hosts = _staff_by_email(organization_id)
+    writer = BatchWriter(PreregisteredVisitor.__table__, PREREGISTRATION_COLUMNS, batch_size)
+    now = datetime.utcnow()
+
+    for line, row in rows:
+        report.processed += 1
+        try:
+            host_email = clean_text(row, 'host_email', 120)
+            staff_id = hosts.get(host_email.lower()) if host_email else None
+            if staff_id is None:
+                staff_id = default_staff_id
+            if staff_id is None:
+                raise RowError(f'no staff member with email {host_email}' if host_email else 'host_email is required')
+            preregistration = {
+                'first_name': clean_text(row, 'first_name', 64, required=True),
+                'last_name': clean_text(row, 'last_name', 64, required=True),
+                'email': clean_email(row, required=True),
+                'phone': clean_text(row, 'phone', 20),
+                'company': clean_text(row, 'company', 100),
+                'purpose': clean_text(row, 'purpose', 200),
+                'expected_arrival': clean_datetime(row, 'expected_arrival', required=True),
+                'staff_id': staff_id,
+                'organization_id': organization_id,
+                'created_at': now,
+                'status': 'pending',
+                'code': generate_code(),
+            }
+        except RowError as e:
+            report.add_error(line, str(e))
+            continue
+
+        key = (preregistration['email'].lower(), preregistration['expected_arrival'])
+        if key in seen:
+            report.duplicates += 1
+            continue
+        seen.add(key)
+
+        written = writer.add(preregistration)
+        if written:
+            report.imported += written
+            yield report
+
+    report.imported += writer.flush()
+    yield report
+
+def _deliver(subject, recipients, text_body, html_body, organization_id):
+    """Queue an email in the current transaction, or send it when the outbox is off."""
+    from app.mail_queue import enqueue_email
+    from app.utils import send_email
+
+    if current_app.config.get('EMAIL_QUEUE_ENABLED'):
+        enqueue_email(subject, recipients, text_body, html_body, current_app.config['MAIL_DEFAULT_SENDER'],
+                      organization_id=organization_id)
+        return True
+    return send_email(subject=subject, recipients=recipients, text_body=text_body, html_body=html_body)
+
+def send_preregistration_confirmation(preregistration, organization):
+    """
+    Email a preregistered visitor their visit details, express check-in
+    code and QR code.
+
+    The organization's preregister template is used when it has one;
+    templates written before express check-in existed do not mention the
+    code or QR code, so they are appended to them.
+
+    Returns:
+        bool: True if the email was sent (or queued for sending)
+    """
+    host = preregistration.host
+    token = generate_express_token(preregistration)
+    qr_url = url_for('kiosk.express_qr', org_id=organization.id, token=token,
+                     _external=True) if qr_code_available() else None
+    context = {
+        'visitor_name': f"{preregistration.first_name} {preregistration.last_name}",
+        'visitor_email': preregistration.email,
+        'visitor_company': preregistration.company or '',
+        'visitor_purpose': preregistration.purpose or '',
+        'expected_arrival': preregistration.expected_arrival.strftime('%Y-%m-%d %H:%M'),
+        'host_name': f"{host.first_name} {host.last_name}" if host else '',
+        'organization_name': organization.name,
+        'code': preregistration.code,
+        'token': token,
+        'qr_url': qr_url,
+        'visitor': template_values(preregistration, PREREGISTRATION_FIELDS),
+        'host': template_values(host, HOST_FIELDS),
+        'organization': template_values(organization, ORGANIZATION_FIELDS)
+    }
+
+    try:
+        template = get_compiled_template(organization.id, 'preregister')
+    except Exception as e:
+        logger.error(f"Error compiling preregistration template: {str(e)}")
+        template = None
+
+    if template:
+        try:
+            subject, text_body, html_body = template.render(context)
+        except Exception as e:
+            # A template that cannot render falls back to the built-in one
+            logger.error(f"Error rendering preregistration template: {str(e)}")
+            template = None
+
+    if template:
+        if preregistration.code not in text_body:
+            text_body += f"\n\nYour express check-in code: {preregistration.code}"
+            html_body += f"<p>Your express check-in code: <strong>{preregistration.code}</strong></p>"
+        if qr_url and qr_url not in html_body:
+            html_body += f'<p><img src="{qr_url}" alt="Check-in QR code" width="200" height="200"></p>'
+    else:
+        # The built-in templates are ours, so they are given the models
+        context.update(visitor=preregistration, host=host, organization=organization,
+                       current_year=datetime.utcnow().year)
+        subject = f"Your visit to {organization.name} on {context['expected_arrival']}"
+        text_body = render_template('email/preregistration_confirmation.txt', **context)
+        html_body = render_template('email/preregistration_confirmation.html', **context)
+
+    return _deliver(subject, [preregistration.email], text_body, html_body, organization.id)
+
+def process_preregistration_confirmations(batch_size=100):
+    """
+    Send confirmation emails for preregistrations that have not had one.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED on
+    PostgreSQL, and marked as sent in the same transaction that queues the
+    emails, so concurrent workers never confirm the same guest twice.
+
+    Returns:
+        int: Number of confirmations sent
+    """
+    organizations = {}
+    sent = 0
+    while True:
+        batch = PreregisteredVisitor.query.options(
+            joinedload(PreregisteredVisitor.host)
+        ).filter(
+            PreregisteredVisitor.confirmation_sent_at.is_(None),
+            PreregisteredVisitor.status == 'pending'
+        ).order_by(
+            PreregisteredVisitor.id
+        ).limit(batch_size).with_for_update(of=PreregisteredVisitor, skip_locked=True).all()
+
+        if not batch:
+            db.session.commit()
+            return sent
+
+        now = datetime.utcnow()
+        for preregistration in batch:
+            organization_id = preregistration.organization_id
+            if organization_id not in organizations:
+                organizations[organization_id] = get_organization(organization_id)
+            try:
+                if send_preregistration_confirmation(preregistration, organizations[organization_id]):
+                    sent += 1
+            except Exception as e:
+                logger.error(f"Error confirming preregistration {preregistration.id}: {str(e)}")
+            # Failed sends are not retried here; the outbox retries queued emails
+            preregistration.confirmation_sent_at = now
+        db.session.commit()
+
+def _token_key():
+    """Derive the express token key from SECRET_KEY, separate from its other uses."""
+    secret = current_app.config['SECRET_KEY']
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    return hmac.new(secret, b'express-check-in', hashlib.sha256).digest()
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def _last_valid_day(preregistration):
+    """Return the last day (days since EPOCH) a preregistration's code and QR code work."""
+    return (preregistration.expected_arrival.date() - EPOCH).days + current_app.config['EXPRESS_TOKEN_VALID_DAYS']
+
+def generate_express_token(preregistration):
+    """
+    Return a compact signed token identifying a preregistration.
+
+    The token packs the preregistration and organization ids and the last
+    day it is valid (EXPRESS_TOKEN_VALID_DAYS after the expected arrival)
+    with a truncated HMAC-SHA256, so a kiosk can verify it without
+    touching the database. It is 27 URL-safe characters, small enough for
+    a low-density QR code that scans quickly.
+    """
+    payload = struct.pack(TOKEN_FORMAT, preregistration.id, preregistration.organization_id,
+                          _last_valid_day(preregistration))
+    signature = hmac.new(_token_key(), payload, hashlib.sha256).digest()[:TOKEN_SIGNATURE_BYTES]
+    return _b64encode(payload + signature)
+
+def verify_express_token(token, organization_id, today=None):
+    """
+    Check an express token's signature and expiry without a database query.
+
+    Args:
+        token (str): Token from the visitor's QR code
+        organization_id: Organization of the kiosk that scanned it
+        today (date, optional): Date to check expiry against (default: today, UTC)
+
+    Returns:
+        int: The preregistration id the token was issued for
+
+    Raises:
+        ExpressCheckInError: If the token is malformed, forged, expired or
+        belongs to another organization
+    """
+    try:
+        data = _b64decode((token or '').strip())
+    except (ValueError, binascii.Error):
+        data = b''
+    if len(data) != TOKEN_LENGTH:
+        raise ExpressCheckInError('This QR code could not be read.')
+
+    payload, signature = data[:-TOKEN_SIGNATURE_BYTES], data[-TOKEN_SIGNATURE_BYTES:]
+    expected = hmac.new(_token_key(), payload, hashlib.sha256).digest()[:TOKEN_SIGNATURE_BYTES]
+    if not hmac.compare_digest(signature, expected):
+        raise ExpressCheckInError('This QR code is not valid.')
+
+    preregistration_id, token_organization_id, expires = struct.unpack(TOKEN_FORMAT, payload)
+    if token_organization_id != organization_id:
+        raise ExpressCheckInError('This QR code is for a different location.')
+    if ((today or datetime.utcnow().date()) - EPOCH).days > expires:
+        raise ExpressCheckInError('This QR code has expired.')
+    return preregistration_id
+
+def is_express_token(value):
+    """Tell a scanned token apart from a typed code."""
+    return len((value or '').strip()) == TOKEN_TEXT_LENGTH
+
+def qr_code_available():
+    """Return True if QR images can be rendered (the qrcode package is installed)."""
+    try:
+        import qrcode  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def render_qr_code(data):
+    """
+    Render data as a QR code PNG.
+
+    Returns:
+        bytes: PNG image data
+
+    Raises:
+        ImportError: If the qrcode package is not installed
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _complete_express_check_in(preregistration):
+    """Check in a locked pending preregistration and commit, in one transaction."""
+    organization_id = preregistration.organization_id
+    visitor = Visitor.query.filter_by(
+        email=preregistration.email, organization_id=organization_id
+    ).first()
+    if not visitor:
+        visitor = Visitor(
+            first_name=preregistration.first_name,
+            last_name=preregistration.last_name,
+            email=preregistration.email,
+            phone=preregistration.phone,
+            company=preregistration.company,
+            purpose=preregistration.purpose,
+            organization_id=organization_id,
+            created_at=datetime.utcnow()
+        )
+        db.session.add(visitor)
+        db.session.flush()
+
+    checkin = CheckIn(
+        visitor_id=visitor.id,
+        staff_id=preregistration.staff_id,
+        organization_id=organization_id,
+        purpose=preregistration.purpose,
+        check_in_time=datetime.utcnow()
+    )
+    db.session.add(checkin)
+    db.session.flush()
+    record_check_in(checkin, organization_id)
+    preregistration.status = 'checked_in'
+    preregistration.check_in_id = checkin.id
+    db.session.commit()
+    return checkin
+
+def _check_pending(preregistration, not_found):
+    if preregistration is None:
+        db.session.rollback()
+        raise ExpressCheckInError(not_found)
+    if preregistration.status != 'pending':
+        db.session.rollback()
+        raise ExpressCheckInError('You have already checked in.' if preregistration.status == 'checked_in'
+                                  else 'This visit has been cancelled.')
+
+def express_check_in(organization_id, code):
+    """
+    Check in a preregistered visitor by their express code or QR token.
+
+    Scanned tokens are verified by their signature before the database is
+    touched; typed codes are looked up through the unique code index. Both
+    expire EXPRESS_TOKEN_VALID_DAYS after the expected arrival. The
+    visitor record is reused (or created from the preregistration), and
+    the check-in, rollup and preregistration status are written in a
+    single transaction.
+
+    Returns:
+        CheckIn: The new check-in
+
+    Raises:
+        ExpressCheckInError: If the code or token is invalid, expired, used or cancelled
+    """
+    if is_express_token(code):
+        preregistration_id = verify_express_token(code, organization_id)
+        preregistration = PreregisteredVisitor.query.filter_by(
+            id=preregistration_id, organization_id=organization_id
+        ).with_for_update().first()
+        _check_pending(preregistration, 'We could not find your visit.')
+    else:
+        preregistration = PreregisteredVisitor.query.filter_by(
+            code=normalize_code(code), organization_id=organization_id
+        ).with_for_update().first()
+        _check_pending(preregistration, 'We could not find a visit with that code.')
+        # Typed codes are valid for as long as the QR code token
+        if (datetime.utcnow().date() - EPOCH).days > _last_valid_day(preregistration):
+            db.session.rollback()
+            raise ExpressCheckInError('This code has expired.')
+    return _complete_express_check_in(preregistration)
+
+def schedule_preregistration_confirmations(app):
+    """Register the background job that sends preregistration confirmations."""
+
+    def send_confirmations_job():
+        # The email links the logo and QR code with url_for, which needs a
+        # request context outside of a request
+        with app.test_request_context():
+            try:
+                process_preregistration_confirmations(app.config['PREREGISTRATION_CONFIRMATION_BATCH_SIZE'])
+            except Exception as e:
+                logger.error(f"Error sending preregistration confirmations: {str(e)}")
+                db.session.rollback()
+
+    scheduler.add_job(
+        id='send_preregistration_confirmations',
+        func=send_confirmations_job,
+        trigger='interval',
+        seconds=app.config['PREREGISTRATION_CONFIRMATION_INTERVAL'],
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
@@ -0,0 +1,157 @@
+"""
+SQL profiling for Visitor Management System.
+Counts the SQL statements each profiled request issues and the time spent
+in the database, reports them in a Server-Timing header and adds them to
+per-endpoint metrics for /metrics. Requests are profiled when an admin
+(or a client holding PROFILING_TOKEN) sends the profiling header, or when
+they are sampled at PROFILING_SAMPLE_RATE, so it can stay enabled in
+production. Only requested profiles get the Server-Timing header.
+"""
+
+import heapq
+import hmac
+import random
+import re
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.metrics import escape_label, register
+
+# Characters of a statement kept when it is reported as one of the slowest
+STATEMENT_TEXT_LENGTH = 160
+
+_SPACES = re.compile(r'\s+')
+
+class RequestProfile:
+    """SQL statements issued while handling one request."""
+
+    def __init__(self, slow_statements, requested=False):
+        self.started = time.perf_counter()
+        self.requested = requested  # Asked for with the profiling header
+        self.statements = 0
+        self.duration = 0.0
+        self.slow_statements = slow_statements
+        self.slowest = []  # Min-heap of (seconds, statement)
+
+    def record(self, statement, duration):
+        self.statements += 1
+        self.duration += duration
+        if len(self.slowest) < self.slow_statements:
+            heapq.heappush(self.slowest, (duration, statement))
+        elif self.slowest and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, statement))
+
+SQL_REQUESTS = register('vms_sql_profiled_requests_total', 'counter', 'Requests profiled for SQL statements.',
+                        ('endpoint',))
+SQL_STATEMENTS = register('vms_sql_statements_total', 'counter', 'SQL statements issued by profiled requests.',
+                          ('endpoint',))
+SQL_DURATION = register('vms_sql_duration_seconds_total', 'counter', 'Time profiled requests spent in SQL statements.',
+                        ('endpoint',))
+SQL_STATEMENTS_MAX = register('vms_sql_statements_max', 'gauge', 'Most SQL statements issued by one profiled request.',
+                              ('endpoint',), aggregate='max')
+
+_slowest_lock = threading.Lock()
+_slowest = {}  # endpoint -> {normalized statement: slowest duration seen by this worker}
+
+def normalize_statement(statement):
+    """Collapse a statement's whitespace and shorten it for reporting."""
+    text = _SPACES.sub(' ', statement).strip()
+    if len(text) > STATEMENT_TEXT_LENGTH:
+        text = text[:STATEMENT_TEXT_LENGTH - 3] + '...'
+    return text
+
+def current_profile():
+    """Return the profile of the request being handled, if it is profiled."""
+    if not has_request_context():
+        return None
+    return g.get('sql_profile')
+
+def _profile_requested():
+    """Whether the request asks to be profiled and may see the result."""
+    config = current_app.config
+    value = request.headers.get(config['PROFILING_HEADER'])
+    if not value:
+        return False
+    token = config['PROFILING_TOKEN']
+    if token and hmac.compare_digest(value, token):
+        return True
+    return value.lower() in ('1', 'true', 'on') and current_user.is_authenticated and current_user.is_admin
+
+def start_request_profile():
+    """Start profiling the current request if it is requested or sampled."""
+    config = current_app.config
+    if not config['PROFILING_ENABLED'] or request.endpoint == 'static':
+        return
+    requested = _profile_requested()
+    if requested or random.random() < config['PROFILING_SAMPLE_RATE']:
+        g.sql_profile = RequestProfile(config['PROFILING_SLOW_STATEMENTS'], requested)
+
+def finish_request_profile(response):
+    """Fold the profile into the endpoint totals and, if it was requested, add the Server-Timing header."""
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    if profile.requested:
+        total = time.perf_counter() - profile.started
+        response.headers.add('Server-Timing', f'db;dur={profile.duration * 1000:.1f};desc="{profile.statements} queries"')
+        response.headers.add('Server-Timing', f'app;dur={(total - profile.duration) * 1000:.1f}')
+
+    endpoint = request.endpoint or 'unmatched'
+    SQL_REQUESTS.inc(endpoint=endpoint)
+    SQL_STATEMENTS.inc(profile.statements, endpoint=endpoint)
+    SQL_DURATION.inc(profile.duration, endpoint=endpoint)
+    SQL_STATEMENTS_MAX.set_max(profile.statements, endpoint=endpoint)
+
+    slow_statements = current_app.config['PROFILING_SLOW_STATEMENTS']
+    with _slowest_lock:
+        slowest = _slowest.setdefault(endpoint, {})
+        for duration, statement in profile.slowest:
+            text = normalize_statement(statement)
+            if duration > slowest.get(text, 0.0):
+                slowest[text] = duration
+        if len(slowest) > slow_statements:
+            _slowest[endpoint] = dict(heapq.nlargest(slow_statements, slowest.items(), key=lambda item: item[1]))
+    return response
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        conn.info.setdefault('profile_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = conn.info.get('profile_started')
+    if profile is not None and started:
+        profile.record(statement, time.perf_counter() - started.pop())
+
+def render_slowest_statements():
+    """
+    Render the slowest statements this worker has seen per endpoint.
+
+    Statement texts are kept per worker rather than in the shared metric
+    files, whose keys are never removed.
+
+    Returns:
+        str: One gauge family in Prometheus text format
+    """
+    with _slowest_lock:
+        slowest = sorted((endpoint, sorted(statements.items(), key=lambda item: -item[1]))
+                         for endpoint, statements in _slowest.items())
+
+    lines = ['# HELP vms_sql_slowest_statement_seconds Slowest SQL statements seen per endpoint by this worker.',
+             '# TYPE vms_sql_slowest_statement_seconds gauge']
+    for endpoint, statements in slowest:
+        for text, duration in statements:
+            lines.append(f'vms_sql_slowest_statement_seconds{{endpoint="{escape_label(endpoint)}",'
+                         f'statement="{escape_label(text)}"}} {duration:.6f}')
+    return '\n'.join(lines) + '\n'
+
+def init_profiling(app):
+    """Profile selected requests and add their Server-Timing headers."""
+    app.before_request(start_request_profile)
+    app.after_request(finish_request_profile)
@@ -0,0 +1,80 @@
+"""
+Dialect-aware SQL helpers for Visitor Management System.
+PostgreSQL is the production database; SQLite is supported for local testing.
+"""
+
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from app import db
+
+class seconds_between(FunctionElement):
+    """Whole seconds elapsed between two timestamp expressions."""
+    type = Integer()
+    inherit_cache = True
+    name = 'seconds_between'
+
+@compiles(seconds_between)
+def _seconds_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(EXTRACT(EPOCH FROM (%s - %s)) AS INTEGER)" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+@compiles(seconds_between, 'sqlite')
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(ROUND((julianday(%s) - julianday(%s)) * 86400) AS INTEGER)" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+def dialect_name():
+    """Return the name of the dialect bound to the current session."""
+    return db.session.get_bind().dialect.name
+
+def upsert(table):
+    """
+    Return an INSERT construct supporting ``on_conflict_do_update``.
+
+    Args:
+        table: The SQLAlchemy Table to insert into
+
+    Returns:
+        Insert: A dialect-specific insert statement
+    """
+    if dialect_name() == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(table)
+
+def add_missing_columns(model, *column_names):
+    """
+    Add model columns that are missing from an existing table.
+
+    ``db.create_all()`` only creates missing tables, so columns added to a
+    model later need an ALTER TABLE on databases created before the change.
+
+    Args:
+        model: The model class whose table should be updated
+        column_names: Names of the columns to add if missing
+
+    Returns:
+        list: Names of the columns that were added
+    """
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    dialect = db.engine.dialect
+
+    added = []
+    for name in column_names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        db.session.execute(text(
+            f'ALTER TABLE {table.name} ADD COLUMN {name} {column.type.compile(dialect=dialect)}'
+        ))
+        added.append(name)
+
+    db.session.commit()
+    return added
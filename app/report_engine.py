@@ -0,0 +1,212 @@
+"""
+Report engine for Visitor Management System.
+Computes report statistics with grouped SQL aggregates so that report pages
+never materialise the full set of matching check-ins in Python.
+"""
+
+import csv
+import io
+import json
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.loaders import checkin_loader_options
+from app.models import CheckIn, Staff, Visitor
+from app.pagination import DEFAULT_PER_PAGE, keyset_paginate
+from app.query_utils import seconds_between
+
+def report_conditions(organization_id, start=None, end=None, staff_id=None, purpose=None):
+    """
+    Build the SQL filter conditions for a report.
+
+    Args:
+        organization_id: ID of the organization
+        start: Earliest check-in time to include (optional)
+        end: Latest check-in time to include (optional)
+        staff_id: Only include visits to this host (optional)
+        purpose: Case-insensitive substring of the visit purpose (optional)
+
+    Returns:
+        list: SQLAlchemy conditions over CheckIn
+    """
+    conditions = [CheckIn.organization_id == organization_id]
+    if start:
+        conditions.append(CheckIn.check_in_time >= start)
+    if end:
+        conditions.append(CheckIn.check_in_time <= end)
+    if staff_id:
+        conditions.append(CheckIn.staff_id == staff_id)
+    if purpose:
+        conditions.append(CheckIn.purpose.ilike(f'%{purpose}%'))
+    return conditions
+
+def get_report_summary(conditions):
+    """
+    Compute report statistics in two round trips.
+
+    Args:
+        conditions: Filter conditions from report_conditions()
+
+    Returns:
+        dict: total_checkins, unique_visitors, avg_duration (minutes),
+        most_visited_host, first_time_visitors, returning_visitors and
+        visit_frequency (ordered mapping of 'YYYY-MM-DD' to visit count)
+    """
+    matching = select(
+        CheckIn.id, CheckIn.visitor_id, CheckIn.staff_id,
+        CheckIn.check_in_time, CheckIn.check_out_time
+    ).where(*conditions).cte('report_checkins')
+
+    single_visit = select(matching.c.visitor_id).group_by(
+        matching.c.visitor_id
+    ).having(func.count() == 1).subquery()
+
+    first_time = select(func.count()).select_from(single_visit).correlate(None).scalar_subquery()
+
+    top_host = select(
+        Staff.first_name + ' ' + Staff.last_name
+    ).join(
+        matching, matching.c.staff_id == Staff.id
+    ).group_by(
+        Staff.id, Staff.first_name, Staff.last_name
+    ).order_by(
+        func.count().desc()
+    ).limit(1).correlate(None).scalar_subquery()
+
+    completed = matching.c.check_out_time.isnot(None)
+    total, unique, avg_seconds, first_time_count, host_name = db.session.execute(
+        select(
+            func.count(matching.c.id),
+            func.count(func.distinct(matching.c.visitor_id)),
+            func.avg(case((completed, seconds_between(matching.c.check_in_time, matching.c.check_out_time)))),
+            first_time,
+            top_host
+        ).select_from(matching)
+    ).one()
+
+    day = func.date(CheckIn.check_in_time, type_=db.Date)
+    frequency = db.session.execute(
+        select(day, func.count(CheckIn.id)).where(*conditions).group_by(day).order_by(day)
+    ).all()
+
+    first_time_count = first_time_count or 0
+    return {
+        'total_checkins': total,
+        'unique_visitors': unique,
+        'avg_duration': float(avg_seconds) / 60 if avg_seconds is not None else 0,
+        'most_visited_host': host_name or 'N/A',
+        'first_time_visitors': first_time_count,
+        'returning_visitors': unique - first_time_count,
+        'visit_frequency': {visit_day.strftime('%Y-%m-%d'): count for visit_day, count in frequency}
+    }
+
+def get_report_checkins(conditions, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Return one keyset page of matching check-ins, newest first.
+
+    The visitor is loaded from the filtering join and the host with a joined
+    load, both limited to the 'listing' profile's columns, so rendering the
+    page issues no per-row queries.
+
+    Args:
+        conditions: Filter conditions from report_conditions()
+        cursor: Cursor of the page to fetch (default: first page)
+        per_page: Number of check-ins per page
+
+    Returns:
+        KeysetPage: The check-ins on this page and the next page's cursor
+    """
+    query = CheckIn.query.join(
+        Visitor, CheckIn.visitor_id == Visitor.id
+    ).filter(*conditions).options(
+        *checkin_loader_options('listing', visitor_joined=True)
+    )
+    return keyset_paginate(query, (CheckIn.check_in_time, CheckIn.id), cursor, per_page)
+
+# Columns of exported report rows, in order
+EXPORT_COLUMNS = [
+    'checkin_id', 'check_in_time', 'check_out_time', 'duration_minutes', 'purpose',
+    'visitor_id', 'visitor_first_name', 'visitor_last_name', 'visitor_email',
+    'visitor_company', 'host_first_name', 'host_last_name',
+]
+
+def iter_report_rows(conditions, batch_size=1000):
+    """
+    Stream matching check-ins as plain tuples, oldest first.
+
+    Only the exported columns are selected and rows are fetched with
+    yield_per, which uses a server-side cursor on PostgreSQL, so memory use
+    stays flat however many rows match.
+
+    Args:
+        conditions: Filter conditions from report_conditions()
+        batch_size: Rows fetched from the cursor at a time
+
+    Yields:
+        tuple: Values in EXPORT_COLUMNS order
+    """
+    host = aliased(Staff)
+    stmt = select(
+        CheckIn.id, CheckIn.check_in_time, CheckIn.check_out_time, CheckIn.purpose,
+        Visitor.id, Visitor.first_name, Visitor.last_name, Visitor.email, Visitor.company,
+        host.first_name, host.last_name
+    ).join(
+        Visitor, CheckIn.visitor_id == Visitor.id
+    ).outerjoin(
+        host, CheckIn.staff_id == host.id
+    ).where(*conditions).order_by(
+        CheckIn.check_in_time, CheckIn.id
+    ).execution_options(yield_per=batch_size)
+
+    for (checkin_id, check_in, check_out, purpose, visitor_id, first_name, last_name,
+         email, company, host_first_name, host_last_name) in db.session.execute(stmt):
+        duration = round((check_out - check_in).total_seconds() / 60, 1) if check_out and check_in else None
+        yield (checkin_id, check_in, check_out, duration, purpose, visitor_id, first_name,
+               last_name, email, company, host_first_name, host_last_name)
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+def export_csv(rows, chunk_rows=500):
+    """
+    Encode report rows as CSV, yielding a chunk of text every ``chunk_rows`` rows.
+
+    The header is yielded on its own first, so the response starts
+    immediately even when the first rows take a while to arrive.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        writer.writerow(['' if value is None else _isoformat(value) for value in row])
+        count += 1
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_ndjson(rows, chunk_rows=500):
+    """Encode report rows as newline-delimited JSON objects, in chunks."""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({
+            column: _isoformat(value) for column, value in zip(EXPORT_COLUMNS, row)
+        }))
+        if len(lines) >= chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+# format -> (encoder, mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+}
@@ -0,0 +1,241 @@
+"""
+Active-visitor roster for Visitor Management System.
+Each worker keeps, per organization, the visitors currently checked in
+with the visitor and host details the roster pages display. Every
+check-in and check-out bumps the organization's roster version in the same
+transaction. Changes committed in this process update the roster directly;
+changes made by other workers are detected by reading the version (a
+primary key lookup), and the roster is rebuilt from the database with one
+joined query when it has moved. With a shared cache backend the rebuilt
+entries are also cached under that version, so one worker's query serves
+the rest.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.cache import get_cache
+from app.models import CheckIn, RosterVersion, Staff, Visitor
+from app.query_utils import upsert
+
+ROSTER_CACHE_SIZE = 256
+
+ROSTER_FIELDS = ['id', 'visitor_id', 'staff_id', 'purpose', 'check_in_time',
+                 'first_name', 'last_name', 'email', 'company', 'photo_blob',
+                 'host_first_name', 'host_last_name']
+
+class RosterEntry(namedtuple('RosterEntry', ROSTER_FIELDS)):
+    """One active check-in, with the visitor and host columns the pages show."""
+    __slots__ = ()
+
+    @property
+    def visitor_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def host_name(self):
+        if self.staff_id is None or self.host_first_name is None:
+            return None
+        return f"{self.host_first_name} {self.host_last_name}"
+
+class ActiveRoster:
+    """The active check-ins of one organization, newest first."""
+
+    def __init__(self, organization_id):
+        self.organization_id = organization_id
+        self.lock = threading.Lock()
+        self.entries = None  # check-in id -> RosterEntry, or None until loaded
+        self.ordered = []
+        self.pending = set()  # Check-ins committed here but not yet loaded
+        self.version = None  # Roster version the entries are current with
+        self.checked_at = 0.0
+
+    def _order(self):
+        self.ordered = sorted(self.entries.values(), key=lambda entry: (entry.check_in_time, entry.id),
+                              reverse=True)
+
+    def rebuild(self, version=None):
+        # The version is read before the entries, so they are at least as new
+        if version is None:
+            version = _database_version(self.organization_id)
+        cache = get_cache()
+        if cache.shared:
+            rows = cache.namespace('roster', self.organization_id).get_or_set(
+                f'entries:{version}', lambda: _load_entries(self.organization_id)
+            )
+        else:
+            rows = _load_entries(self.organization_id)
+        self.entries = {row.id: row for row in rows}
+        self.version = version
+        self.pending.clear()
+        self._order()
+
+    def load_pending(self):
+        ids, self.pending = self.pending, set()
+        for entry in _load_entries(self.organization_id, ids):
+            self.entries[entry.id] = entry
+        self._order()
+
+    def remove(self, checkin_ids):
+        with self.lock:
+            self.pending.difference_update(checkin_ids)
+            if self.entries is not None and any(self.entries.pop(checkin_id, None) for checkin_id in checkin_ids):
+                self._order()
+
+    def add(self, checkin_ids):
+        with self.lock:
+            self.pending.update(checkin_ids)
+
+    def advance(self, base, version):
+        """Move to ``version`` if the roster was current just before this process's changes."""
+        with self.lock:
+            if self.version == base:
+                self.version = version
+
+def _load_entries(organization_id, checkin_ids=None):
+    """Select active check-ins with their visitor and host columns in one query."""
+    query = db.session.query(
+        CheckIn.id, CheckIn.visitor_id, CheckIn.staff_id, CheckIn.purpose, CheckIn.check_in_time,
+        Visitor.first_name, Visitor.last_name, Visitor.email, Visitor.company, Visitor.photo_blob,
+        Staff.first_name, Staff.last_name
+    ).join(
+        Visitor, CheckIn.visitor_id == Visitor.id
+    ).outerjoin(
+        Staff, CheckIn.staff_id == Staff.id
+    ).filter(
+        CheckIn.organization_id == organization_id,
+        CheckIn.check_out_time.is_(None)
+    )
+    if checkin_ids is not None:
+        query = query.filter(CheckIn.id.in_(checkin_ids))
+    return [RosterEntry(*row) for row in query]
+
+def _database_version(organization_id):
+    """Return an organization's roster version, 0 before its first check-in."""
+    version = db.session.execute(
+        select(RosterVersion.version).where(RosterVersion.organization_id == organization_id)
+    ).scalar()
+    return version or 0
+
+def _bump_version(connection, organization_id):
+    """Increment an organization's roster version within the flush; returns the new version."""
+    table = RosterVersion.__table__
+    stmt = upsert(table).values(organization_id=organization_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['organization_id'],
+        set_={'version': table.c.version + 1}
+    ).returning(table.c.version)
+    return connection.execute(stmt).scalar_one()
+
+_rosters_lock = threading.Lock()
+_rosters = OrderedDict()  # organization id -> ActiveRoster
+
+def _roster(organization_id, create=True):
+    with _rosters_lock:
+        roster = _rosters.get(organization_id)
+        if roster is None and create:
+            roster = _rosters[organization_id] = ActiveRoster(organization_id)
+        if roster is not None:
+            _rosters.move_to_end(organization_id)
+        while len(_rosters) > ROSTER_CACHE_SIZE:
+            _rosters.popitem(last=False)
+    return roster
+
+def get_active_roster(organization_id):
+    """
+    Return an organization's active check-ins, newest first.
+
+    Every ROSTER_REVALIDATE_SECONDS (by default on every call) the roster's
+    version is compared with the database. Every check-in and check-out
+    bumps it, so a change made by another worker is always noticed, at the
+    cost of one primary key lookup instead of the joined query and per-row
+    lazy loads.
+
+    Returns:
+        list: RosterEntry tuples
+    """
+    roster = _roster(organization_id)
+    with roster.lock:
+        if roster.entries is None:
+            roster.rebuild()
+        else:
+            if roster.pending:
+                roster.load_pending()
+            if time.monotonic() - roster.checked_at >= current_app.config['ROSTER_REVALIDATE_SECONDS']:
+                version = _database_version(organization_id)
+                if version != roster.version:
+                    roster.rebuild(version)
+        roster.checked_at = time.monotonic()
+        return roster.ordered
+
+def count_active_visitors(organization_id):
+    """Return the number of visitors currently checked in."""
+    return len(get_active_roster(organization_id))
+
+def invalidate_roster(organization_id=None):
+    """Drop the cached roster of one organization, or of all of them."""
+    with _rosters_lock:
+        if organization_id is None:
+            _rosters.clear()
+        else:
+            _rosters.pop(organization_id, None)
+
+def bump_roster_versions(organization_ids):
+    """
+    Mark organizations' rosters as changed by something other than a
+    check-in or check-out, such as retention deleting check-ins.
+
+    The versions are bumped in the session's transaction, so every worker
+    rebuilds its roster once that commits; this process's rosters are
+    dropped then.
+    """
+    connection = db.session.connection()
+    for organization_id in organization_ids:
+        _bump_version(connection, organization_id)
+    db.session.info.setdefault('roster_invalidations', set()).update(organization_ids)
+
+# Check-ins and check-outs bump the roster version as they are flushed, and
+# are applied to this process's rosters only once the transaction commits
+
+def _record_change(connection, target, added):
+    session = object_session(target)
+    if session is None:
+        return
+    organization_id = target.organization_id
+    version = _bump_version(connection, organization_id)
+    change = session.info.setdefault('roster_changes', {}).setdefault(
+        organization_id, {'added': set(), 'removed': set(), 'base': version - 1}
+    )
+    change['added' if added else 'removed'].add(target.id)
+    change['version'] = version
+
+@event.listens_for(CheckIn, 'after_insert')
+def _checkin_inserted(mapper, connection, target):
+    if target.check_out_time is None:
+        _record_change(connection, target, added=True)
+
+@event.listens_for(CheckIn, 'after_update')
+def _checkin_updated(mapper, connection, target):
+    if target.check_out_time is not None and inspect(target).attrs.check_out_time.history.has_changes():
+        _record_change(connection, target, added=False)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_roster_changes(session):
+    for organization_id, change in session.info.pop('roster_changes', {}).items():
+        roster = _roster(organization_id, create=False)
+        if roster is not None:
+            roster.add(change['added'] - change['removed'])
+            roster.remove(change['removed'])
+            # The row lock serializes bumps, so no other change came in between
+            roster.advance(change['base'], change['version'])
+    for organization_id in session.info.pop('roster_invalidations', ()):
+        invalidate_roster(organization_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_roster_changes(session):
+    session.info.pop('roster_changes', None)
+    session.info.pop('roster_invalidations', None)
@@ -5,6 +5,8 @@ from urllib.parse import urlparse
 from app import db
 from app.models import User, Organization
 from app.forms import LoginForm, RegistrationForm, ForgotPasswordForm, ResetPasswordForm
+from app.organizations import invalidate_organization
+from app.user_sessions import forget_user, invalidate_user, remember_user
 from app.utils import send_password_reset_email, send_welcome_email, create_default_email_templates, create_default_badge_template
 
 auth = Blueprint('auth', __name__)
@@ -26,6 +28,7 @@ def login():
         db.session.commit()
         
         login_user(user, remember=form.remember_me.data)
+        remember_user(user)
         next_page = request.args.get('next')
         if not next_page or urlparse(next_page).netloc != '':
             next_page = url_for('dashboard.index')
@@ -36,6 +39,7 @@ def login():
 @auth.route('/logout')
 def logout():
     logout_user()
+    forget_user()
     return redirect(url_for('auth.login'))
 
 @auth.route('/register', methods=['GET', 'POST'])
@@ -73,6 +77,7 @@ def register():
         user.set_password(form.password.data)
         db.session.add(user)
         db.session.commit()
+        invalidate_organization(organization.id)  # List the new organization on the kiosk
         
         # Create default email templates
         create_default_email_templates(organization.id)
@@ -117,6 +122,7 @@ def reset_password(token):
     if form.validate_on_submit():
         user.set_password(form.password.data)
         db.session.commit()
+        invalidate_user(user.id)
         flash('Your password has been reset.', 'success')
         return redirect(url_for('auth.login'))
     
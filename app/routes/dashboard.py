@@ -1,8 +1,12 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
 from app import db
-from app.models import Visitor, CheckIn, Staff, Organization
+from app.models import Visitor, CheckIn, Staff
+from app.loaders import checkin_loader_options
+from app.organizations import get_organization
+from app.rollups import get_dashboard_counts
+from app.roster import count_active_visitors
 
 dashboard = Blueprint('dashboard', __name__)
 
@@ -12,47 +16,29 @@ def index():
     """Dashboard home page"""
     # Get today's date range
     today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today + timedelta(days=1)
-    
-    # Get last 7 days range
-    last_week = today - timedelta(days=7)
     
     # Get current organization
-    organization = Organization.query.get(current_user.organization_id)
+    organization = get_organization(current_user.organization_id)
     
     # Get visitor counts
     visitors_count = Visitor.query.filter_by(organization_id=current_user.organization_id).count()
     
-    visitors_today = CheckIn.query.join(
-        Visitor
-    ).filter(
-        Visitor.organization_id == current_user.organization_id,
-        CheckIn.check_in_time >= today,
-        CheckIn.check_in_time < tomorrow
-    ).count()
-    
-    visitors_week = CheckIn.query.join(
-        Visitor
-    ).filter(
-        Visitor.organization_id == current_user.organization_id,
-        CheckIn.check_in_time >= last_week
-    ).count()
+    # Check-in counters come from the daily rollup instead of scanning checkins
+    visit_counts = get_dashboard_counts(current_user.organization_id, today.date())
+    visitors_today = visit_counts['today']
+    visitors_week = visit_counts['week']
     
-    active_visitors = CheckIn.query.join(
-        Visitor
-    ).filter(
-        Visitor.organization_id == current_user.organization_id,
-        CheckIn.is_active == True
-    ).count()
+    # Visitors on site are counted from the in-memory roster
+    active_visitors = count_active_visitors(current_user.organization_id)
     
     # Get staff count
     staff_count = Staff.query.filter_by(organization_id=current_user.organization_id).count()
     
     # Get recent visitors (for dashboard table)
-    recent_visitors = CheckIn.query.join(
-        Visitor
-    ).filter(
-        Visitor.organization_id == current_user.organization_id
+    recent_visitors = CheckIn.query.filter(
+        CheckIn.organization_id == current_user.organization_id
+    ).options(
+        *checkin_loader_options('listing')
     ).order_by(
         CheckIn.check_in_time.desc()
     ).limit(10).all()
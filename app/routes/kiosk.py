@@ -1,42 +1,60 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app
+from io import BytesIO
+from flask import Blueprint, render_template, redirect, url_for, request, flash, session, current_app, abort, send_file, jsonify
 from flask_login import current_user
+from sqlalchemy import or_
 from datetime import datetime
 
 from app import db
 from app.models import Organization, Staff, Visitor, CheckIn
-from app.forms import VisitorCheckInForm, VisitorCheckOutForm
+from app.forms import VisitorCheckInForm, VisitorCheckOutForm, ExpressCheckInForm
+from app.loaders import checkin_loader_options
+from app.organizations import INACTIVE_SUBSCRIPTION_STATUSES, get_organization_or_404, organization_version
+from app.page_cache import cached_page
+from app.preregistration import ExpressCheckInError, express_check_in, render_qr_code, verify_express_token
+from app.rollups import record_check_in, record_check_out
+from app.roster import get_active_roster
+from app.search import search_visitors
 from app.utils import send_checkin_notification, send_checkout_notification, generate_badge_data, log_action
 
-kiosk = Blueprint('kiosk', __name__)
+kiosk = Blueprint('kiosk', __name__, url_prefix='/kiosk')
 
 @kiosk.route('/')
 def index():
     """Kiosk selection screen"""
-    # Get all active organizations
-    organizations = Organization.query.filter_by(is_active=True).all()
+    def render():
+        # Get all active organizations
+        organizations = Organization.query.filter(or_(
+            Organization.subscription_status.is_(None),
+            Organization.subscription_status.notin_(INACTIVE_SUBSCRIPTION_STATUSES)
+        )).order_by(Organization.name).all()
+        
+        return render_template('kiosk/index.html', 
+                              organizations=organizations,
+                              title="Visitor Kiosk")
     
-    return render_template('kiosk/index.html', 
-                          organizations=organizations,
-                          title="Visitor Kiosk")
+    return cached_page(organization_version(), render)
 
 @kiosk.route('/org/<int:org_id>')
 def organization(org_id):
     """Organization-specific kiosk landing page"""
-    organization = Organization.query.get_or_404(org_id)
+    organization = get_organization_or_404(org_id)
     
     # Verify organization is active
     if not organization.is_active:
         flash('This organization is not active.', 'danger')
         return redirect(url_for('kiosk.index'))
     
-    return render_template('kiosk/organization.html',
-                          organization=organization,
-                          title=f"Visitor Kiosk - {organization.name}")
+    def render():
+        return render_template('kiosk/organization.html',
+                              organization=organization,
+                              title=f"Visitor Kiosk - {organization.name}")
+    
+    return cached_page(organization_version(org_id), render, org_id)
 
 @kiosk.route('/org/<int:org_id>/check-in', methods=['GET', 'POST'])
 def check_in(org_id):
     """Visitor check-in form"""
-    organization = Organization.query.get_or_404(org_id)
+    organization = get_organization_or_404(org_id)
     
     # Verify organization is active
     if not organization.is_active:
@@ -45,7 +63,7 @@ def check_in(org_id):
     
     # Get staff for selection dropdown
     staff_choices = [(s.id, f"{s.first_name} {s.last_name} - {s.department}") for s in 
-                     Staff.query.filter_by(organization_id=org_id, is_active=True).all()]
+                     Staff.query.filter_by(organization_id=org_id).all()]
     
     # Create form with staff choices
     form = VisitorCheckInForm()
@@ -76,10 +94,13 @@ def check_in(org_id):
         checkin = CheckIn(
             visitor_id=visitor.id,
             staff_id=form.staff_id.data,
+            organization_id=org_id,
             purpose=form.purpose.data,
             check_in_time=datetime.utcnow()
         )
         db.session.add(checkin)
+        db.session.flush()
+        record_check_in(checkin, org_id)
         db.session.commit()
         
         # Log the action
@@ -105,49 +126,102 @@ def check_in(org_id):
                           form=form,
                           title=f"Visitor Check-In - {organization.name}")
 
-@kiosk.route('/org/<int:org_id>/check-out', methods=['GET', 'POST'])
-def check_out(org_id):
-    """Visitor check-out form"""
-    organization = Organization.query.get_or_404(org_id)
+@kiosk.route('/org/<int:org_id>/express', methods=['GET', 'POST'])
+def express(org_id):
+    """Express check-in for preregistered visitors: scan the QR code or type the code"""
+    organization = get_organization_or_404(org_id)
     
-    # Get search parameter
-    email = request.args.get('email', '')
+    # Verify organization is active
+    if not organization.is_active:
+        flash('This organization is not active.', 'danger')
+        return redirect(url_for('kiosk.index'))
+    
+    form = ExpressCheckInForm()
+    
+    if form.validate_on_submit():
+        try:
+            checkin = express_check_in(org_id, form.code.data)
+        except ExpressCheckInError as e:
+            form.code.errors.append(str(e))
+        else:
+            visitor = checkin.visitor
+            
+            # Log the action
+            log_action('visitor_check_in', {
+                'visitor_id': visitor.id,
+                'visitor_name': f"{visitor.first_name} {visitor.last_name}",
+                'staff_id': checkin.staff_id,
+                'check_in_time': checkin.check_in_time.isoformat(),
+                'express': True
+            })
+            
+            # Send notifications
+            send_checkin_notification(checkin)
+            
+            flash(f'Welcome, {visitor.first_name}! You have been checked in successfully.', 'success')
+            return redirect(url_for('kiosk.success', org_id=org_id))
     
-    # Get active check-ins, filtered by email if provided
-    query = CheckIn.query.join(
-        Visitor, CheckIn.visitor_id == Visitor.id
-    ).filter(
-        Visitor.organization_id == org_id,
-        CheckIn.check_out_time.is_(None)
-    )
+    return render_template('kiosk/express.html',
+                          organization=organization,
+                          form=form,
+                          title=f"Express Check-In - {organization.name}")
+
+@kiosk.route('/org/<int:org_id>/express/qr/<token>.png')
+def express_qr(org_id, token):
+    """QR code image of an express check-in token, linked from confirmation emails"""
+    try:
+        verify_express_token(token, org_id)
+        png = render_qr_code(token)
+    except (ExpressCheckInError, ImportError):
+        abort(404)
     
-    if email:
-        query = query.filter(Visitor.email.ilike(f'%{email}%'))
+    response = send_file(BytesIO(png), mimetype='image/png', max_age=86400)
+    response.cache_control.private = True
+    return response
+
+@kiosk.route('/org/<int:org_id>/search')
+def search(org_id):
+    """Typeahead search over the visitors currently checked in"""
+    organization = get_organization_or_404(org_id)
+    if not organization.is_active:
+        abort(404)
     
-    active_checkins = query.all()
+    # The kiosk is public, so only names and companies are returned
+    results = [{
+        'checkin_id': result['checkin_id'],
+        'first_name': result['first_name'],
+        'last_name': result['last_name'],
+        'company': result['company'],
+        'score': result['score']
+    } for result in search_visitors(org_id, request.args.get('q', ''), active_only=True)]
+    return jsonify({'results': results})
+
+@kiosk.route('/org/<int:org_id>/check-out', methods=['GET', 'POST'])
+def check_out(org_id):
+    """Visitor check-out form"""
+    organization = get_organization_or_404(org_id)
     
     # Verify organization is active
     if not organization.is_active:
         flash('This organization is not active.', 'danger')
         return redirect(url_for('kiosk.index'))
     
-    # Get active check-ins for the organization
-    active_checkins = CheckIn.query.join(
-        Visitor, CheckIn.visitor_id == Visitor.id
-    ).filter(
-        Visitor.organization_id == org_id,
-        CheckIn.check_out_time.is_(None)
-    ).all()
+    # Active check-ins are served from the in-memory roster
+    active_checkins = get_active_roster(org_id)
+    
+    # Narrow to search matches, best first (?email= is kept for old links)
+    search_query = request.args.get('q') or request.args.get('email', '')
+    if search_query:
+        ranking = {result['checkin_id']: position for position, result in
+                   enumerate(search_visitors(org_id, search_query, limit=50, active_only=True))}
+        active_checkins = sorted((entry for entry in active_checkins if entry.id in ranking),
+                                 key=lambda entry: ranking[entry.id])
     
     # Create visitor choices for the dropdown
-    visitor_choices = []
-    for checkin in active_checkins:
-        visitor = checkin.visitor
-        host = checkin.host
-        visitor_choices.append((
-            checkin.id, 
-            f"{visitor.first_name} {visitor.last_name} - Visiting {host.first_name if host else 'N/A'}"
-        ))
+    visitor_choices = [(
+        entry.id,
+        f"{entry.visitor_name} - Visiting {entry.host_first_name or 'N/A'}"
+    ) for entry in active_checkins]
     
     # Create form with visitor choices
     form = VisitorCheckOutForm()
@@ -155,11 +229,12 @@ def check_out(org_id):
     
     if form.validate_on_submit():
         checkin_id = form.visitor_id.data
-        checkin = CheckIn.query.get(checkin_id)
+        checkin = CheckIn.query.options(*checkin_loader_options('notification')).get(checkin_id)
         
         if checkin and checkin.check_out_time is None:
             # Update check-out time
             checkin.check_out_time = datetime.utcnow()
+            record_check_out(checkin, checkin.organization_id)
             db.session.commit()
             
             # Log the action
@@ -183,26 +258,31 @@ def check_out(org_id):
     return render_template('kiosk/check_out.html',
                           organization=organization,
                           form=form,
+                          active_checkins=active_checkins,
+                          search_query=search_query,
                           title=f"Visitor Check-Out - {organization.name}")
 
 @kiosk.route('/org/<int:org_id>/success')
 def success(org_id):
     """Success page after check-in/check-out"""
-    organization = Organization.query.get_or_404(org_id)
+    organization = get_organization_or_404(org_id)
     
     # Verify organization is active
     if not organization.is_active:
         flash('This organization is not active.', 'danger')
         return redirect(url_for('kiosk.index'))
     
-    return render_template('kiosk/success.html',
-                          organization=organization,
-                          title=f"Success - {organization.name}")
+    def render():
+        return render_template('kiosk/success.html',
+                              organization=organization,
+                              title=f"Success - {organization.name}")
+    
+    return cached_page(organization_version(org_id), render, org_id)
 
 @kiosk.route('/org/<int:org_id>/exit-kiosk', methods=['POST'])
 def exit_kiosk(org_id):
     """Exit kiosk mode with passcode"""
-    organization = Organization.query.get_or_404(org_id)
+    organization = get_organization_or_404(org_id)
     
     # Get passcode from request
     passcode = request.form.get('passcode')
@@ -0,0 +1,98 @@
+from io import BytesIO
+from flask import Blueprint, abort, request, send_file
+from flask_login import current_user
+from app import db
+from app.blobstore import INLINE_CONTENT_TYPES, get_blob_store, guess_content_type, is_blob_key
+from app.models import Document, Organization, Staff, Visitor
+from app.thumbnails import THUMBNAIL_FORMATS, THUMBNAIL_SIZES, get_thumbnail_path, thumbnail_etag
+
+media = Blueprint('media', __name__, url_prefix='/media')
+
+# Blob keys are content hashes, so a given URL never changes content
+BLOB_MAX_AGE = 365 * 24 * 3600
+
+# Blobs only members of the owning organization may see
+PRIVATE_BLOB_COLUMNS = [
+    (Visitor, Visitor.photo_blob),
+    (Staff, Staff.photo_blob),
+    (Document, Document.content_blob),
+]
+
+def _authorize(blob_hash):
+    """
+    Check that the current visitor may see a blob.
+
+    Logos are shown on the kiosk and in emails and are public; photos and
+    documents are only served to users of the organization they belong to.
+
+    Returns:
+        bool: True if the blob is public, False if it is private to the user
+    """
+    if not is_blob_key(blob_hash):
+        abort(404)
+    if db.session.query(Organization.id).filter(Organization.logo_blob == blob_hash).first() is not None:
+        return True
+    if current_user.is_authenticated:
+        for model, column in PRIVATE_BLOB_COLUMNS:
+            if db.session.query(model.id).filter(
+                column == blob_hash,
+                model.organization_id == current_user.organization_id
+            ).first() is not None:
+                return False
+    # Not found and not permitted look the same
+    abort(404)
+
+def _cache_headers(response, public):
+    # send_file marks responses public; shared caches must not keep private blobs
+    response.cache_control.public = public
+    response.cache_control.private = not public
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+@media.route('/<blob_hash>')
+def blob(blob_hash):
+    """Serve a stored photo, logo or document by its content hash"""
+    public = _authorize(blob_hash)
+    
+    store = get_blob_store()
+    path = store.local_path(blob_hash)
+    if path is not None:
+        try:
+            with open(path, 'rb') as f:
+                content_type = guess_content_type(f.read(16))
+        except FileNotFoundError:
+            abort(404)
+        source = path
+    else:
+        data = store.read(blob_hash)
+        if data is None:
+            abort(404)
+        content_type = guess_content_type(data)
+        source = BytesIO(data)
+    
+    # Only images and PDFs are shown in the browser
+    inline = content_type in INLINE_CONTENT_TYPES
+    response = send_file(source, mimetype=content_type if inline else 'application/octet-stream',
+                         as_attachment=not inline, download_name=blob_hash,
+                         max_age=BLOB_MAX_AGE, etag=blob_hash)
+    return _cache_headers(response, public)
+
+@media.route('/<blob_hash>/<size>')
+def thumbnail(blob_hash, size):
+    """Serve a cached, resized rendition of a stored image"""
+    if size not in THUMBNAIL_SIZES:
+        abort(404)
+    public = _authorize(blob_hash)
+    
+    # Serve WebP to browsers that advertise it, JPEG otherwise
+    fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+    
+    path = get_thumbnail_path(blob_hash, size, fmt)
+    if path is None:
+        abort(404)
+    
+    response = send_file(path, mimetype=THUMBNAIL_FORMATS[fmt][1], max_age=BLOB_MAX_AGE,
+                         etag=thumbnail_etag(blob_hash, size, fmt))
+    response.vary.add('Accept')
+    return _cache_headers(response, public)
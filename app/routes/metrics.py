@@ -0,0 +1,21 @@
+import hmac
+from flask import Blueprint, Response, abort, current_app, request
+from app.metrics import render_metrics
+from app.profiling import render_slowest_statements
+
+metrics = Blueprint('metrics', __name__)
+
+# Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+@metrics.route('/metrics')
+def index():
+    """Expose metrics of every worker in Prometheus text format"""
+    # Metrics name endpoints and SQL statements, so they are never public
+    token = current_app.config['METRICS_TOKEN']
+    if not token or not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(404)
+    
+    response = Response(render_metrics() + render_slowest_statements(), mimetype=METRICS_CONTENT_TYPE)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
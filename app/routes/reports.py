@@ -1,10 +1,13 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, jsonify, abort, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
 from app import db
-from app.models import Visitor, CheckIn, Staff
+from app.models import Visitor, Staff
 from app.forms import ReportFilterForm
-from collections import defaultdict
-from datetime import datetime, timedelta
+from app.organizations import get_organization
+from app.pagination import DEFAULT_PER_PAGE
+from app.report_engine import (report_conditions, get_report_summary, get_report_checkins,
+                               iter_report_rows, EXPORT_FORMATS)
+from datetime import datetime
 
 reports = Blueprint('reports', __name__, url_prefix='/reports')
 
@@ -19,90 +22,93 @@ def index():
         for s in Staff.query.filter_by(organization_id=current_user.organization_id).all()
     ]
     
-    # Get query parameters
+    conditions = _conditions_from_args()
+    
+    # Statistics are aggregated in SQL; only one page of check-ins is loaded
+    summary = get_report_summary(conditions)
+    page = get_report_checkins(conditions, cursor=request.args.get('cursor'))
+    
+    return render_template('reports/index.html', title='Reports',
+                          form=form,
+                          checkins=page.items,
+                          page=page,
+                          can_export=_can_export(),
+                          **summary)
+
+@reports.route('/api/checkins')
+@login_required
+def checkins_json():
+    """Return a page of report check-ins as JSON for infinite scroll"""
+    page = get_report_checkins(_conditions_from_args(),
+                               cursor=request.args.get('cursor'),
+                               per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int))
+    
+    items = []
+    for checkin in page.items:
+        items.append({
+            'id': checkin.id,
+            'visitor_id': checkin.visitor_id,
+            'visitor_name': f"{checkin.visitor.first_name} {checkin.visitor.last_name}",
+            'host_name': f"{checkin.host.first_name} {checkin.host.last_name}" if checkin.host else None,
+            'check_in_time': checkin.check_in_time.isoformat(),
+            'check_out_time': checkin.check_out_time.isoformat() if checkin.check_out_time else None,
+            'purpose': checkin.purpose
+        })
+    
+    return jsonify({'items': items, 'next_cursor': page.next_cursor})
+
+@reports.route('/export.<fmt>')
+@login_required
+def export(fmt):
+    """Stream every check-in matching the report filters as CSV or NDJSON"""
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    if not _can_export():
+        abort(403)
+    
+    encoder, mimetype, extension = EXPORT_FORMATS[fmt]
+    rows = iter_report_rows(_conditions_from_args(), current_app.config['EXPORT_BATCH_SIZE'])
+    filename = f"visitor_report_{datetime.utcnow().strftime('%Y%m%d')}.{extension}"
+    
+    response = Response(stream_with_context(encoder(rows)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'  # Let proxies pass chunks straight through
+    return response
+
+def _can_export():
+    """Whether the current organization's plan includes report exports"""
+    return get_organization(current_user.organization_id).has_feature('reports_export')
+
+def _conditions_from_args():
+    """Build report filter conditions from the request query string"""
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
     staff_id = request.args.get('staff_id', '0')
     purpose = request.args.get('purpose', '')
     
-    # Set initial query
-    query = CheckIn.query.join(Visitor).filter(
-        Visitor.organization_id == current_user.organization_id
-    )
-    
-    # Apply filters if provided
+    # Parse filters if provided
+    start_date_obj = None
     if start_date:
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            query = query.filter(CheckIn.check_in_time >= start_date_obj)
         except ValueError:
             pass
     
+    end_date_obj = None
     if end_date:
         try:
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
             end_date_obj = end_date_obj.replace(hour=23, minute=59, second=59)
-            query = query.filter(CheckIn.check_in_time <= end_date_obj)
         except ValueError:
             pass
     
-    if staff_id and staff_id != '0':
-        query = query.filter(CheckIn.staff_id == int(staff_id))
-    
-    if purpose:
-        query = query.filter(CheckIn.purpose.ilike(f'%{purpose}%'))
-    
-    # Execute query
-    checkins = query.order_by(CheckIn.check_in_time.desc()).all()
-    
-    # Calculate statistics
-    total_checkins = len(checkins)
-    unique_visitors = len(set(c.visitor_id for c in checkins))
-    
-    # Calculate average duration (only for checked out visits)
-    completed_visits = [c for c in checkins if c.check_out_time]
-    if completed_visits:
-        total_duration = sum((c.check_out_time - c.check_in_time).total_seconds() for c in completed_visits)
-        avg_duration = total_duration / len(completed_visits) / 60  # In minutes
-    else:
-        avg_duration = 0
-    
-    # Find most visited host
-    host_visits = defaultdict(int)
-    for checkin in checkins:
-        if checkin.host:
-            host_name = f"{checkin.host.first_name} {checkin.host.last_name}"
-            host_visits[host_name] += 1
-    
-    most_visited_host = max(host_visits.items(), key=lambda x: x[1])[0] if host_visits else "N/A"
-    
-    # Calculate first-time vs returning visitors
-    visitor_counts = defaultdict(int)
-    for checkin in checkins:
-        visitor_counts[checkin.visitor_id] += 1
-    
-    first_time_visitors = sum(1 for count in visitor_counts.values() if count == 1)
-    returning_visitors = unique_visitors - first_time_visitors
-    
-    # Calculate visit frequency by date
-    visit_frequency = defaultdict(int)
-    for checkin in checkins:
-        date_str = checkin.check_in_time.strftime('%Y-%m-%d')
-        visit_frequency[date_str] += 1
-    
-    # Sort by date
-    visit_frequency = dict(sorted(visit_frequency.items()))
-    
-    return render_template('reports/index.html', title='Reports',
-                          form=form,
-                          checkins=checkins,
-                          total_checkins=total_checkins,
-                          unique_visitors=unique_visitors,
-                          avg_duration=avg_duration,
-                          most_visited_host=most_visited_host,
-                          first_time_visitors=first_time_visitors,
-                          returning_visitors=returning_visitors,
-                          visit_frequency=visit_frequency)
+    return report_conditions(
+        current_user.organization_id,
+        start=start_date_obj,
+        end=end_date_obj,
+        staff_id=int(staff_id) if staff_id.isdigit() and staff_id != '0' else None,
+        purpose=purpose
+    )
 
 @reports.route('/visitor/<int:visitor_id>')
 @login_required
@@ -3,7 +3,9 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Organization, EmailTemplate, Document
 from app.forms import OrganizationSettingsForm, EmailTemplateForm, DocumentForm, BadgeTemplateForm
-from app.utils import encode_image, admin_required
+from app.email_rendering import invalidate_email_template, validate_email_template
+from app.organizations import invalidate_organization
+from app.utils import encode_image, store_image, admin_required
 
 settings = Blueprint('settings', __name__, url_prefix='/settings')
 
@@ -23,7 +25,20 @@ def organization():
     form = OrganizationSettingsForm(obj=organization)
     
     if form.validate_on_submit():
-        # Implementation will be added here
+        organization.name = form.name.data
+        organization.contact_email = form.contact_email.data
+        organization.contact_phone = form.contact_phone.data
+        organization.address = form.address.data
+        organization.primary_color = form.primary_color.data or organization.primary_color
+        organization.secondary_color = form.secondary_color.data or organization.secondary_color
+        logo_blob = store_image(form.logo.data)
+        if logo_blob:
+            organization.logo_blob = logo_blob
+        db.session.commit()
+        
+        # Kiosk pages and emails read the cached snapshot
+        invalidate_organization(organization.id)
+        
         flash('Organization settings saved successfully', 'success')
         return redirect(url_for('settings.index'))
     
@@ -48,9 +63,23 @@ def edit_email_template(id):
     
     form = EmailTemplateForm(obj=template)
     if form.validate_on_submit():
-        # Implementation will be added here
-        flash('Email template updated successfully', 'success')
-        return redirect(url_for('settings.email_templates'))
+        error = validate_email_template(form.subject.data, form.body.data)
+        if error:
+            flash(f'Email template could not be saved: {error}', 'danger')
+        else:
+            previous_type = template.template_type
+            template.name = form.name.data
+            template.subject = form.subject.data
+            template.body = form.body.data
+            template.template_type = form.template_type.data
+            db.session.commit()
+            
+            # Drop the compiled copies so the next email uses the new version
+            invalidate_email_template(current_user.organization_id, previous_type)
+            invalidate_email_template(current_user.organization_id, template.template_type)
+            
+            flash('Email template updated successfully', 'success')
+            return redirect(url_for('settings.email_templates'))
     
     return render_template('settings/edit_email_template.html', title='Edit Email Template', form=form, template=template)
 
@@ -110,6 +139,7 @@ def kiosk_settings():
         organization.auto_checkout_delay = request.form.get('auto_checkout_delay', 8)
         
         db.session.commit()
+        invalidate_organization(organization.id)
         flash('Kiosk settings updated successfully', 'success')
         return redirect(url_for('settings.index'))
     
@@ -3,7 +3,7 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Staff
 from app.forms import StaffForm
-from app.utils import encode_image
+from app.utils import encode_image, store_image
 
 staff = Blueprint('staff', __name__, url_prefix='/staff')
 
@@ -27,6 +27,8 @@ def add():
             phone=form.phone.data,
             department=form.department.data,
             position=form.position.data,
+            photo_blob=store_image(form.photo.data),
+            notification_digest=form.notification_digest.data,
             organization_id=current_user.organization_id
         )
         db.session.add(staff_member)
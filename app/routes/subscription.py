@@ -6,6 +6,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app import db
 from app.models import Organization, Subscription
+from app.organizations import invalidate_organization
 from app.utils import admin_required
 from app.subscription_plans import get_plan, get_all_plans, compare_plans
 from app.stripe_utils import create_customer, create_subscription, cancel_subscription, create_checkout_session, handle_webhook_event
@@ -172,6 +173,7 @@ def cancel():
             organization.subscription_plan = 'free'
             organization.subscription_status = 'cancelled'
             db.session.commit()
+            invalidate_organization(organization.id)
             
             flash('Your subscription has been cancelled', 'success')
         else:
@@ -219,6 +221,7 @@ def webhook():
                         stripe_subscription.current_period_end
                     )
                     db.session.commit()
+                    invalidate_organization(organization.id)
                     
                     # Create or update subscription record
                     subscription = Subscription.query.filter_by(
@@ -271,6 +274,7 @@ def webhook():
                     organization.subscription_plan = 'free'
                     organization.subscription_status = 'cancelled'
                     db.session.commit()
+                    invalidate_organization(organization.id)
                     
                     # Update subscription record
                     subscription = Subscription.query.filter_by(
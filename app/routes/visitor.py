@@ -1,9 +1,18 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+import json
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy import func
 from app import db
 from app.models import Visitor, CheckIn, Staff
-from app.forms import VisitorCheckInForm, VisitorCheckOutForm, PreregisterVisitorForm, StaffForm
-from app.utils import send_checkin_notification, send_checkout_notification, encode_image, generate_badge_data
+from app.bulk_import import ImportFileError, copy_upload, iter_visitor_import, read_rows
+from app.forms import VisitorCheckInForm, VisitorCheckOutForm, PreregisterVisitorForm, StaffForm, VisitorImportForm, PreregistrationImportForm
+from app.loaders import checkin_loader_options
+from app.pagination import DEFAULT_PER_PAGE, keyset_paginate
+from app.preregistration import iter_preregistration_import, preregister_visitor
+from app.rollups import record_check_in, record_check_out
+from app.roster import get_active_roster
+from app.search import SEARCH_RESULT_LIMIT, search_visitors
+from app.utils import send_checkin_notification, send_checkout_notification, encode_image, generate_badge_data, admin_required, log_action
 from datetime import datetime
 
 visitor = Blueprint('visitor', __name__, url_prefix='/visitors')
@@ -11,10 +20,68 @@ visitor = Blueprint('visitor', __name__, url_prefix='/visitors')
 @visitor.route('/')
 @login_required
 def index():
-    """List all visitors for the organization"""
-    visitors = Visitor.query.filter_by(organization_id=current_user.organization_id)\
-        .order_by(Visitor.created_at.desc()).all()
-    return render_template('visitor/index.html', title='Visitors', visitors=visitors, now=datetime.utcnow)
+    """List visitors for the organization, one keyset page at a time"""
+    page = _visitor_page(request.args.get('cursor'))
+    visit_stats = _visit_stats([v.id for v in page.items])
+    
+    # Active check-ins are listed independently of the visitor page
+    active_checkins = get_active_roster(current_user.organization_id)
+    
+    return render_template('visitor/index.html', title='Visitors', visitors=page.items, page=page,
+                          visit_stats=visit_stats, active_checkins=active_checkins, now=datetime.utcnow)
+
+@visitor.route('/api/visitors')
+@login_required
+def visitors_json():
+    """Return a page of visitors as JSON for infinite scroll"""
+    page = _visitor_page(request.args.get('cursor'),
+                         per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int))
+    visit_stats = _visit_stats([v.id for v in page.items])
+    
+    items = []
+    for v in page.items:
+        total_visits, last_visit = visit_stats.get(v.id, (0, None))
+        items.append({
+            'id': v.id,
+            'first_name': v.first_name,
+            'last_name': v.last_name,
+            'email': v.email,
+            'company': v.company,
+            'created_at': v.created_at.isoformat() if v.created_at else None,
+            'last_visit': last_visit.isoformat() if last_visit else None,
+            'total_visits': total_visits,
+            'url': url_for('visitor.view', visitor_id=v.id)
+        })
+    
+    return jsonify({'items': items, 'next_cursor': page.next_cursor})
+
+@visitor.route('/api/search')
+@login_required
+def search_json():
+    """Typeahead search over the organization's visitors by name, email or company"""
+    results = search_visitors(current_user.organization_id, request.args.get('q', ''),
+                              limit=min(request.args.get('limit', SEARCH_RESULT_LIMIT, type=int), 50))
+    for result in results:
+        result['url'] = url_for('visitor.view', visitor_id=result['id'])
+    return jsonify({'results': results})
+
+def _visitor_page(cursor, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of the organization's visitors, newest first"""
+    query = Visitor.query.filter_by(organization_id=current_user.organization_id)
+    return keyset_paginate(query, (Visitor.created_at, Visitor.id), cursor, per_page)
+
+def _visit_stats(visitor_ids):
+    """Map visitor ID to (total visits, last check-in time) with one grouped query"""
+    if not visitor_ids:
+        return {}
+    
+    rows = db.session.query(
+        CheckIn.visitor_id, func.count(CheckIn.id), func.max(CheckIn.check_in_time)
+    ).filter(
+        CheckIn.visitor_id.in_(visitor_ids)
+    ).group_by(CheckIn.visitor_id).all()
+    
+    return {visitor_id: (count, last_visit) for visitor_id, count, last_visit in rows}
 
 @visitor.route('/check-in', methods=['GET', 'POST'])
 @login_required
@@ -50,10 +117,13 @@ def check_in():
         checkin = CheckIn(
             visitor_id=visitor.id,
             staff_id=form.staff_id.data,
+            organization_id=current_user.organization_id,
             purpose=form.purpose.data,
             check_in_time=datetime.utcnow()
         )
         db.session.add(checkin)
+        db.session.flush()
+        record_check_in(checkin, current_user.organization_id)
         db.session.commit()
         
         # Send notifications
@@ -71,29 +141,18 @@ def check_out():
     form = VisitorCheckOutForm()
     
     # Get active check-ins for the organization
-    active_checkins = CheckIn.query.join(
-        Visitor, CheckIn.visitor_id == Visitor.id
-    ).filter(
-        Visitor.organization_id == current_user.organization_id,
-        CheckIn.check_out_time.is_(None)
-    ).all()
+    active_checkins = get_active_roster(current_user.organization_id)
     
     # Create visitor choices for the dropdown
-    visitor_choices = []
-    for checkin in active_checkins:
-        visitor = checkin.visitor
-        host = checkin.host
-        visitor_choices.append((
-            checkin.id, 
-            f"{visitor.first_name} {visitor.last_name} - {visitor.email}"
-        ))
+    visitor_choices = [(entry.id, f"{entry.visitor_name} - {entry.email}") for entry in active_checkins]
     
     form.visitor_id.choices = visitor_choices
     
     if form.validate_on_submit():
-        checkin = CheckIn.query.get(form.visitor_id.data)
+        checkin = CheckIn.query.options(*checkin_loader_options('notification')).get(form.visitor_id.data)
         if checkin and checkin.check_out_time is None:
             checkin.check_out_time = datetime.utcnow()
+            record_check_out(checkin, checkin.organization_id)
             db.session.commit()
             
             # Send notifications
@@ -104,7 +163,8 @@ def check_out():
         else:
             flash('Invalid check-in record or visitor already checked out', 'danger')
     
-    return render_template('visitor/check_out.html', title='Check Out Visitor', form=form)
+    return render_template('visitor/check_out.html', title='Check Out Visitor', form=form,
+                          active_checkins=active_checkins)
 
 @visitor.route('/preregister', methods=['GET', 'POST'])
 @login_required
@@ -115,10 +175,101 @@ def preregister():
     form.staff_id.choices = [(s.id, f"{s.first_name} {s.last_name} - {s.department}") 
                             for s in Staff.query.filter_by(organization_id=current_user.organization_id).all()]
     
-    # Implementation will be added here
+    if form.validate_on_submit():
+        try:
+            expected_arrival = datetime.strptime(form.expected_arrival.data.strip(), '%Y-%m-%d %H:%M')
+        except ValueError:
+            form.expected_arrival.errors.append('Use the format YYYY-MM-DD HH:MM')
+            return render_template('visitor/preregister.html', title='Preregister Visitor', form=form)
+        
+        preregistration = preregister_visitor(
+            current_user.organization_id,
+            form.staff_id.data,
+            form.first_name.data,
+            form.last_name.data,
+            form.email.data,
+            expected_arrival,
+            phone=form.phone.data,
+            company=form.company.data,
+            purpose=form.purpose.data
+        )
+        
+        log_action('visitor_preregistered', {
+            'preregistration_id': preregistration.id,
+            'visitor_name': f"{preregistration.first_name} {preregistration.last_name}",
+            'staff_id': preregistration.staff_id,
+            'expected_arrival': preregistration.expected_arrival.isoformat()
+        })
+        
+        flash(f'{preregistration.first_name} {preregistration.last_name} has been preregistered. '
+              f'A confirmation with check-in code {preregistration.code} will be emailed shortly.', 'success')
+        return redirect(url_for('visitor.index'))
     
     return render_template('visitor/preregister.html', title='Preregister Visitor', form=form)
 
+@visitor.route('/preregister/bulk', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def preregister_bulk():
+    """Preregister guests from a CSV, iCalendar or XLSX file, streaming progress as NDJSON"""
+    form = PreregistrationImportForm()
+    form.staff_id.choices = [(s.id, f"{s.first_name} {s.last_name} - {s.department}")
+                            for s in Staff.query.filter_by(organization_id=current_user.organization_id).all()]
+    if not form.validate_on_submit():
+        return render_template('visitor/preregister_bulk.html', title='Bulk Preregistration', form=form)
+    
+    filename = form.file.data.filename
+    upload = copy_upload(form.file.data.stream)
+    organization_id = current_user.organization_id
+    default_staff_id = form.staff_id.data
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    
+    def generate():
+        report = None
+        with upload:
+            try:
+                rows = read_rows(upload, filename)
+                for report in iter_preregistration_import(organization_id, rows, default_staff_id, batch_size):
+                    yield json.dumps({'event': 'progress', **report.to_dict(include_errors=False)}) + '\n'
+            except ImportFileError as e:
+                yield json.dumps({'event': 'error', 'message': str(e)}) + '\n'
+                return
+        
+        log_action('visitors_preregistered', report.to_dict(include_errors=False))
+        yield json.dumps({'event': 'done', **report.to_dict()}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@visitor.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_visitors():
+    """Bulk import visitors from a CSV or XLSX file, streaming progress as NDJSON"""
+    form = VisitorImportForm()
+    if not form.validate_on_submit():
+        return render_template('visitor/import.html', title='Import Visitors', form=form)
+    
+    filename = form.file.data.filename
+    upload = copy_upload(form.file.data.stream)
+    organization_id = current_user.organization_id
+    batch_size = current_app.config['IMPORT_BATCH_SIZE']
+    
+    def generate():
+        report = None
+        with upload:
+            try:
+                rows = read_rows(upload, filename)
+                for report in iter_visitor_import(organization_id, rows, batch_size):
+                    yield json.dumps({'event': 'progress', **report.to_dict(include_errors=False)}) + '\n'
+            except ImportFileError as e:
+                yield json.dumps({'event': 'error', 'message': str(e)}) + '\n'
+                return
+        
+        log_action('visitors_imported', report.to_dict(include_errors=False))
+        yield json.dumps({'event': 'done', **report.to_dict()}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @visitor.route('/view/<int:visitor_id>')
 @login_required
 def view(visitor_id):
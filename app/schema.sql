@@ -6,6 +6,7 @@ CREATE TABLE organizations (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    logo_blob VARCHAR(64),
     logo TEXT,
     primary_color VARCHAR(20) DEFAULT '#007bff',
     secondary_color VARCHAR(20) DEFAULT '#6c757d',
@@ -47,7 +48,9 @@ CREATE TABLE staff (
     phone VARCHAR(20),
     department VARCHAR(64),
     position VARCHAR(64),
+    photo_blob VARCHAR(64),
     photo TEXT,
+    notification_digest BOOLEAN DEFAULT FALSE,
     organization_id INTEGER NOT NULL REFERENCES organizations(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -61,28 +64,33 @@ CREATE TABLE visitors (
     phone VARCHAR(20),
     company VARCHAR(100),
     purpose VARCHAR(200),
+    photo_blob VARCHAR(64),
     photo TEXT,
     organization_id INTEGER NOT NULL REFERENCES organizations(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Check-ins table
+-- Check-ins table (partitioned by month of check_in_time)
 CREATE TABLE checkins (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     visitor_id INTEGER NOT NULL REFERENCES visitors(id),
     staff_id INTEGER REFERENCES staff(id),
-    check_in_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id),
+    check_in_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     check_out_time TIMESTAMP,
     badge_printed BOOLEAN DEFAULT FALSE,
     is_active BOOLEAN DEFAULT TRUE,
     purpose VARCHAR(200),
-    notes TEXT
-);
+    notes TEXT,
+    PRIMARY KEY (id, check_in_time)
+) PARTITION BY RANGE (check_in_time);
+
+CREATE TABLE checkins_default PARTITION OF checkins DEFAULT;
 
 -- Badges table
 CREATE TABLE badges (
     id SERIAL PRIMARY KEY,
-    check_in_id INTEGER NOT NULL REFERENCES checkins(id),
+    check_in_id INTEGER NOT NULL,  -- checkins(id); no foreign key since checkins is partitioned
     template_data TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     printed_at TIMESTAMP
@@ -104,7 +112,8 @@ CREATE TABLE email_templates (
 CREATE TABLE documents (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
-    content TEXT NOT NULL,
+    content_blob VARCHAR(64),
+    content TEXT,
     document_type VARCHAR(50) NOT NULL,
     organization_id INTEGER NOT NULL REFERENCES organizations(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -137,7 +146,10 @@ CREATE TABLE preregistered_visitors (
     staff_id INTEGER NOT NULL REFERENCES staff(id),
     organization_id INTEGER NOT NULL REFERENCES organizations(id),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    status VARCHAR(20) DEFAULT 'pending'
+    status VARCHAR(20) DEFAULT 'pending',
+    code VARCHAR(16),  -- Express check-in code
+    confirmation_sent_at TIMESTAMP,
+    check_in_id INTEGER  -- No FK: checkins is partitioned
 );
 
 -- Settings table
@@ -150,14 +162,65 @@ CREATE TABLE settings (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Logs table
+-- Logs table (partitioned by month of created_at)
 CREATE TABLE logs (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     organization_id INTEGER NOT NULL REFERENCES organizations(id),
     user_id INTEGER REFERENCES users(id),
     event_type VARCHAR(50) NOT NULL,
     event_data TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE logs_default PARTITION OF logs DEFAULT;
+-- Monthly partitions (e.g. logs_p2026_01) are created by `flask maintain-partitions`
+
+-- Daily visit rollups table (maintained on check-in/check-out)
+CREATE TABLE daily_visit_rollups (
+    id SERIAL PRIMARY KEY,
+    organization_id INTEGER NOT NULL REFERENCES organizations(id),
+    day DATE NOT NULL,
+    check_ins INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    completed_visits INTEGER NOT NULL DEFAULT 0,
+    total_duration_seconds BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT uq_daily_visit_rollups_org_day UNIQUE (organization_id, day)
+);
+
+-- Active roster versions (bumped on check-in/check-out)
+CREATE TABLE roster_versions (
+    organization_id INTEGER PRIMARY KEY REFERENCES organizations(id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Outbound email queue (sent by the background outbox worker)
+CREATE TABLE email_outbox (
+    id SERIAL PRIMARY KEY,
+    organization_id INTEGER REFERENCES organizations(id),
+    subject VARCHAR(255) NOT NULL,
+    sender VARCHAR(120) NOT NULL,
+    recipients TEXT NOT NULL,
+    cc TEXT,
+    bcc TEXT,
+    text_body TEXT,
+    html_body TEXT,
+    attachments TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+-- Visit notifications held for host digests
+CREATE TABLE pending_notifications (
+    id SERIAL PRIMARY KEY,
+    staff_id INTEGER NOT NULL REFERENCES staff(id),
+    check_in_id INTEGER NOT NULL,  -- checkins(id); no foreign key since checkins is partitioned
+    is_checkout BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Create indexes for performance
@@ -166,12 +229,20 @@ CREATE INDEX idx_users_username ON users(username);
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_staff_organization ON staff(organization_id);
 CREATE INDEX idx_visitors_organization ON visitors(organization_id);
-CREATE INDEX idx_checkins_visitor ON checkins(visitor_id);
+CREATE INDEX idx_visitors_org_created ON visitors(organization_id, created_at DESC, id DESC);
+-- Trigram index for visitor search (requires the pg_trgm extension)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_visitors_search_trgm ON visitors USING gin ((lower(coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(company, ''))) gin_trgm_ops);
+CREATE INDEX idx_checkins_org_time ON checkins(organization_id, check_in_time DESC, id DESC);
+CREATE INDEX idx_checkins_org_active ON checkins(organization_id) WHERE check_out_time IS NULL;
+CREATE INDEX idx_checkins_visitor_time ON checkins(visitor_id, check_in_time);
 CREATE INDEX idx_checkins_staff ON checkins(staff_id);
-CREATE INDEX idx_checkins_active ON checkins(is_active);
 CREATE INDEX idx_email_templates_org_type ON email_templates(organization_id, template_type);
 CREATE INDEX idx_preregistered_visitors_status ON preregistered_visitors(status);
 CREATE INDEX idx_preregistered_visitors_expected_arrival ON preregistered_visitors(expected_arrival);
+CREATE UNIQUE INDEX idx_preregistered_visitors_code ON preregistered_visitors(code);
 CREATE INDEX idx_logs_organization ON logs(organization_id);
 CREATE INDEX idx_logs_event_type ON logs(event_type);
-CREATE INDEX idx_settings_org_key ON settings(organization_id, key);
\ No newline at end of file
+CREATE INDEX idx_settings_org_key ON settings(organization_id, key);
+CREATE INDEX idx_email_outbox_pending ON email_outbox(status, next_attempt_at);
+CREATE INDEX idx_pending_notifications_staff ON pending_notifications(staff_id, created_at);
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Visitor search for Visitor Management System.
+Typeahead search over visitor names, emails and companies. On PostgreSQL
+queries use a pg_trgm GIN index on a combined search document; on other
+databases (SQLite in tests) each organization's visitors are held in an
+in-process trigram index that is kept current as visitors are saved.
+"""
+
+import heapq
+import math
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from sqlalchemy import event, func, or_, select
+from app import db
+from app.models import CheckIn, Visitor
+from app.query_utils import dialect_name
+from app.roster import get_active_roster
+
+SEARCH_INDEX_NAME = 'idx_visitors_search_trgm'
+SEARCH_RESULT_LIMIT = 10
+MIN_QUERY_LENGTH = 2
+
+# Share of the query's trigrams a visitor must contain to match when the
+# query is not a plain substring, roughly pg_trgm's word_similarity threshold
+NGRAM_MATCH_THRESHOLD = 0.4
+
+# Above this many times the result limit, a query's rarest trigram is
+# treated as common and visitors are scanned newest first instead
+NGRAM_SCAN_FACTOR = 50
+
+# How long an in-process index is trusted before it is checked against the
+# table; saves in this process update it immediately
+NGRAM_INDEX_REVALIDATE_SECONDS = 30
+NGRAM_INDEX_CACHE_SIZE = 64
+
+_WORDS = re.compile(r'\w+', re.UNICODE)
+_SPACES = re.compile(r'\s+')
+
+def normalize_query(query):
+    """Lower-case a search string and collapse its whitespace."""
+    return _SPACES.sub(' ', (query or '').strip().lower())
+
+def search_document():
+    """SQL expression of the lower-cased text a visitor is searched by."""
+    return func.lower(
+        func.coalesce(Visitor.first_name, '') + ' ' +
+        func.coalesce(Visitor.last_name, '') + ' ' +
+        func.coalesce(Visitor.email, '') + ' ' +
+        func.coalesce(Visitor.company, '')
+    )
+
+def prepare_search_indexes():
+    """
+    Enable pg_trgm and build the trigram index on visitors (PostgreSQL only).
+
+    The index is built concurrently so check-ins continue while it builds.
+
+    Returns:
+        bool: True if the index was created or already existed
+    """
+    if dialect_name() != 'postgresql':
+        return False
+
+    # Not declared on the model: create_all() cannot give the expression the
+    # trigram operator class, and SQLite has no use for the index
+    document = str(search_document().compile(
+        dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}
+    )).replace(f'{Visitor.__tablename__}.', '')
+    ddl = (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX_NAME} "
+           f"ON {Visitor.__tablename__} USING gin (({document}) gin_trgm_ops)")
+
+    db.session.commit()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        connection.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        connection.exec_driver_sql(ddl)
+    return True
+
+def trigrams(text, prefix=False):
+    """
+    Return the set of trigrams of a string, padded per word as pg_trgm does.
+
+    'ann' gives '  a', ' an', 'ann', 'nn '. With ``prefix`` the last word
+    is treated as still being typed and gets no trailing-space trigram.
+    """
+    grams = set()
+    words = _WORDS.findall(text.lower())
+    for position, word in enumerate(words):
+        padded = f'  {word}' if prefix and position == len(words) - 1 else f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class NgramIndex:
+    """An in-memory trigram index over one organization's visitors."""
+
+    def __init__(self, stamp=None):
+        self.stamp = stamp
+        self.checked_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.postings = defaultdict(set)  # trigram -> visitor ids
+        self.documents = {}  # visitor id -> (search text, result dict)
+
+    def add(self, visitor_id, first_name, last_name, email, company):
+        """Index a visitor, replacing any earlier version of it."""
+        text = normalize_query(' '.join(value or '' for value in (first_name, last_name, email, company)))
+        with self.lock:
+            self._remove(visitor_id)
+            self.documents[visitor_id] = (text, {
+                'id': visitor_id,
+                'first_name': first_name,
+                'last_name': last_name,
+                'email': email,
+                'company': company,
+            })
+            for gram in trigrams(text):
+                self.postings[gram].add(visitor_id)
+
+    def _remove(self, visitor_id):
+        previous = self.documents.pop(visitor_id, None)
+        if previous:
+            for gram in trigrams(previous[0]):
+                self.postings[gram].discard(visitor_id)
+
+    def search(self, query, limit=SEARCH_RESULT_LIMIT, allowed=None):
+        """
+        Rank visitors against a normalized query.
+
+        A visitor matches when it contains at least NGRAM_MATCH_THRESHOLD
+        of the query's trigrams. Visitors containing the query as a
+        substring rank first, then those with the most trigrams in common;
+        ties go to the newest visitor. The last word of the query is
+        matched as a prefix, as it is typed.
+
+        Args:
+            query (str): Normalized search string
+            limit (int): Maximum number of results
+            allowed (set, optional): Only consider these visitor ids
+
+        Returns:
+            list: (score, result dict) tuples, best first
+        """
+        grams = trigrams(query, prefix=True)
+        if not grams:
+            return []
+        with self.lock:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+            required = max(1, math.ceil(NGRAM_MATCH_THRESHOLD * len(grams)))
+
+            if allowed is None and len(postings[0]) > limit * NGRAM_SCAN_FACTOR:
+                # Short or common queries: every trigram is frequent, so walk
+                # visitors newest first and stop once enough full matches are found
+                results = self._scan(query, postings, limit)
+                if results is not None:
+                    return results
+
+            if allowed is not None and len(allowed) <= len(postings[0]):
+                candidates = allowed & self.documents.keys()
+            else:
+                # Any match contains one of the rarest trigrams
+                candidates = set().union(*postings[:len(postings) - required + 1])
+                if allowed is not None:
+                    candidates &= allowed
+
+            ranked = []
+            for visitor_id in candidates:
+                shared = sum(1 for posting in postings if visitor_id in posting)
+                if shared < required:
+                    continue
+                text, result = self.documents[visitor_id]
+                score = shared / len(grams) + (1 if query in text else 0)
+                ranked.append((score, visitor_id, result))
+        return [(score, result) for score, _, result in heapq.nlargest(limit, ranked, key=lambda item: item[:2])]
+
+    def _scan(self, query, postings, limit):
+        """Collect the newest visitors containing every trigram, or None if too few do."""
+        substring, complete = [], []
+        for visitor_id in reversed(self.documents):
+            if not all(visitor_id in posting for posting in postings):
+                continue
+            text, result = self.documents[visitor_id]
+            if query in text:
+                substring.append((2.0, result))
+                if len(substring) == limit:
+                    break
+            elif len(complete) < limit:
+                complete.append((1.0, result))
+        if len(substring) + len(complete) < limit:
+            return None
+        return (substring + complete)[:limit]
+
+_indexes_lock = threading.Lock()
+_indexes = OrderedDict()  # organization id -> NgramIndex
+
+def _index_stamp(organization_id):
+    """Cheap fingerprint of an organization's visitors: (count, max id)."""
+    return tuple(db.session.query(func.count(Visitor.id), func.max(Visitor.id)).filter(
+        Visitor.organization_id == organization_id
+    ).one())
+
+def _build_index(organization_id, stamp):
+    index = NgramIndex(stamp)
+    query = db.session.query(
+        Visitor.id, Visitor.first_name, Visitor.last_name, Visitor.email, Visitor.company
+    ).filter(Visitor.organization_id == organization_id).execution_options(yield_per=5000)
+    for row in query:
+        index.add(*row)
+    return index
+
+def get_ngram_index(organization_id):
+    """
+    Return the organization's in-process trigram index, building it if needed.
+
+    After NGRAM_INDEX_REVALIDATE_SECONDS the index is compared with the
+    table's (count, max id) and rebuilt if visitors were added elsewhere,
+    e.g. by a bulk import or another worker.
+    """
+    with _indexes_lock:
+        index = _indexes.get(organization_id)
+        if index is not None:
+            _indexes.move_to_end(organization_id)
+
+    if index is not None and time.monotonic() - index.checked_at < NGRAM_INDEX_REVALIDATE_SECONDS:
+        return index
+
+    stamp = _index_stamp(organization_id)
+    if index is not None and index.stamp == stamp:
+        index.checked_at = time.monotonic()
+        return index
+
+    index = _build_index(organization_id, stamp)
+    with _indexes_lock:
+        _indexes[organization_id] = index
+        _indexes.move_to_end(organization_id)
+        while len(_indexes) > NGRAM_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+@event.listens_for(Visitor, 'after_insert')
+@event.listens_for(Visitor, 'after_update')
+def _index_saved_visitor(mapper, connection, target):
+    """Keep a loaded in-process index current with visitors saved here."""
+    with _indexes_lock:
+        index = _indexes.get(target.organization_id)
+    if index is not None:
+        index.add(target.id, target.first_name, target.last_name, target.email, target.company)
+
+def _active_checkins(organization_id):
+    """Map visitor id to active check-in id for an organization."""
+    return {entry.visitor_id: entry.id for entry in get_active_roster(organization_id)}
+
+def _search_postgresql(organization_id, query, limit, active_only):
+    document = search_document()
+    score = func.word_similarity(query, document)
+    columns = [Visitor.id, Visitor.first_name, Visitor.last_name, Visitor.email, Visitor.company,
+               score.label('score')]
+    if active_only:
+        columns.append(CheckIn.id.label('checkin_id'))
+
+    statement = select(*columns).where(
+        Visitor.organization_id == organization_id,
+        # Both operators are answered from the trigram index
+        or_(document.contains(query, autoescape=True), document.op('%>')(query))
+    )
+    if active_only:
+        statement = statement.join(CheckIn, CheckIn.visitor_id == Visitor.id).where(
+            CheckIn.organization_id == organization_id,
+            CheckIn.check_out_time.is_(None)
+        )
+    statement = statement.order_by(score.desc(), Visitor.id.desc()).limit(limit)
+    return [dict(row._mapping) for row in db.session.execute(statement)]
+
+def _search_ngram(organization_id, query, limit, active_only):
+    index = get_ngram_index(organization_id)
+    active = _active_checkins(organization_id) if active_only else None
+    results = []
+    for score, result in index.search(query, limit, set(active) if active is not None else None):
+        result = dict(result, score=round(score, 3))
+        if active is not None:
+            result['checkin_id'] = active[result['id']]
+        results.append(result)
+    return results
+
+def search_visitors(organization_id, query, limit=SEARCH_RESULT_LIMIT, active_only=False):
+    """
+    Find an organization's visitors by name, email or company.
+
+    Args:
+        organization_id: ID of the organization to search
+        query (str): Search text; fewer than MIN_QUERY_LENGTH characters returns nothing
+        limit (int): Maximum number of results
+        active_only (bool): Only visitors currently checked in, with their checkin_id
+
+    Returns:
+        list: Result dicts (id, first_name, last_name, email, company, score
+        and, for active_only, checkin_id), best match first
+    """
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    if dialect_name() == 'postgresql':
+        return _search_postgresql(organization_id, query, limit, active_only)
+    return _search_ngram(organization_id, query, limit, active_only)
@@ -3,6 +3,8 @@ Subscription plans configuration for Visitor Management System.
 This module defines the available subscription plans and their features.
 """
 
+from types import MappingProxyType
+
 # Define subscription plans and their features
 SUBSCRIPTION_PLANS = {
     "free": {
@@ -23,6 +25,8 @@ SUBSCRIPTION_PLANS = {
             "reports_export": False,
             "custom_branding": False,
             "api_access": False,
+            "log_retention_months": 3,  # Months of audit log history kept
+            "checkin_retention_months": 12,  # Months of check-in history kept
         }
     },
     "basic": {
@@ -43,6 +47,8 @@ SUBSCRIPTION_PLANS = {
             "reports_export": True,
             "custom_branding": False,
             "api_access": False,
+            "log_retention_months": 12,  # Months of audit log history kept
+            "checkin_retention_months": 24,  # Months of check-in history kept
         }
     },
     "professional": {
@@ -63,6 +69,8 @@ SUBSCRIPTION_PLANS = {
             "reports_export": True,
             "custom_branding": True,
             "api_access": False,
+            "log_retention_months": 24,  # Months of audit log history kept
+            "checkin_retention_months": 36,  # Months of check-in history kept
         }
     },
     "enterprise": {
@@ -83,10 +91,18 @@ SUBSCRIPTION_PLANS = {
             "reports_export": True,
             "custom_branding": True,
             "api_access": True,
+            "log_retention_months": 60,  # Months of audit log history kept
+            "checkin_retention_months": 84,  # Months of check-in history kept
         }
     },
 }
 
+# Each plan's features as a read-only map, so plan checks are dictionary lookups
+PLAN_FEATURES = {
+    plan_id: MappingProxyType(dict(plan["features"]))
+    for plan_id, plan in SUBSCRIPTION_PLANS.items()
+}
+
 def get_plan(plan_id):
     """Get a subscription plan by its ID."""
     return SUBSCRIPTION_PLANS.get(plan_id, SUBSCRIPTION_PLANS["free"])
@@ -95,10 +111,13 @@ def get_all_plans():
     """Get all available subscription plans."""
     return SUBSCRIPTION_PLANS
 
+def get_plan_features(plan_id):
+    """Get the read-only feature map of a plan (unknown plans get the free plan's)."""
+    return PLAN_FEATURES.get(plan_id, PLAN_FEATURES["free"])
+
 def get_plan_feature(plan_id, feature_name):
     """Get a specific feature value for a plan."""
-    plan = get_plan(plan_id)
-    return plan["features"].get(feature_name)
+    return get_plan_features(plan_id).get(feature_name)
 
 def compare_plans():
     """Generate a comparison of all subscription plans."""
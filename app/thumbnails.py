@@ -0,0 +1,123 @@
+"""
+Image thumbnails for Visitor Management System.
+Resized JPEG/WebP renditions of stored photos and logos are generated with
+Pillow on first request and cached on disk, keyed by blob hash, size and
+format, so each rendition is only ever produced once.
+"""
+
+import io
+import os
+import tempfile
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app.blobstore import get_blob_store, is_blob_key
+
+# Longest edge in pixels for each named thumbnail size
+THUMBNAIL_SIZES = {
+    'sm': 64,
+    'md': 160,
+    'lg': 480,
+}
+
+THUMBNAIL_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+}
+
+# Image formats accepted as uploads, as Pillow names them
+UPLOAD_IMAGE_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+def is_uploadable_image(data):
+    """Check that bytes decode as a JPEG, PNG, GIF or WebP image."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            return image.format in UPLOAD_IMAGE_FORMATS
+    except Exception:
+        # Pillow raises a variety of errors for malformed files
+        return False
+
+def thumbnail_cache_dir():
+    """Return the directory rendered thumbnails are cached in."""
+    return current_app.config.get('THUMBNAIL_CACHE_PATH') or os.path.join(current_app.instance_path, 'thumbnails')
+
+def thumbnail_etag(blob_hash, size, fmt):
+    """Return the strong ETag for a thumbnail rendition."""
+    return f'{blob_hash}-{size}-{fmt}'
+
+def render_thumbnail(data, size, fmt):
+    """
+    Resize image bytes to a thumbnail.
+
+    Args:
+        data (bytes): The original image
+        size (str): A key of THUMBNAIL_SIZES
+        fmt (str): A key of THUMBNAIL_FORMATS
+
+    Returns:
+        bytes: The encoded thumbnail, or None if the data is not an image
+    """
+    pil_format, _, options = THUMBNAIL_FORMATS[fmt]
+    edge = THUMBNAIL_SIZES[size]
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    if image.mode not in ('RGB', 'L'):
+        # Flatten transparency onto white, since JPEG has no alpha channel
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.convert('RGBA').split()[-1])
+        image = background
+
+    image.thumbnail((edge, edge), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, pil_format, **options)
+    return output.getvalue()
+
+def get_thumbnail_path(blob_hash, size, fmt):
+    """
+    Return the path of a cached thumbnail, generating it if needed.
+
+    Args:
+        blob_hash: Blob key of the original image
+        size (str): A key of THUMBNAIL_SIZES
+        fmt (str): A key of THUMBNAIL_FORMATS
+
+    Returns:
+        str: Path of the thumbnail file, or None if the blob is missing or
+        is not an image
+    """
+    if not is_blob_key(blob_hash) or size not in THUMBNAIL_SIZES or fmt not in THUMBNAIL_FORMATS:
+        return None
+
+    directory = os.path.join(thumbnail_cache_dir(), blob_hash[:2])
+    path = os.path.join(directory, f'{thumbnail_etag(blob_hash, size, fmt)}.{fmt}')
+    if os.path.exists(path):
+        return path
+
+    data = get_blob_store().read(blob_hash)
+    if data is None:
+        return None
+
+    thumbnail = render_thumbnail(data, size, fmt)
+    if thumbnail is None:
+        return None
+
+    # Concurrent requests may render the same thumbnail; the atomic
+    # replace means the last writer wins with identical content
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(thumbnail)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return path
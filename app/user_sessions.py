@@ -0,0 +1,110 @@
+"""
+Logged-in user sessions for Visitor Management System.
+At login the user's profile is copied into the signed session cookie with
+a stamp of the fields that decide whether the session stays valid
+(password hash, is_active, is_admin). Later requests rebuild the user from
+that snapshot; the current stamp is kept in the application cache for
+USER_CACHE_TTL and read from the database only when it is missing there or
+the user was changed, instead of loading the users row on every request.
+"""
+
+import hashlib
+import hmac
+from flask import current_app, session
+from flask_login import UserMixin
+from app import db
+from app.cache import get_cache
+from app.models import User
+from app.organizations import get_organization
+
+SESSION_KEY = '_user_snapshot'
+
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name',
+                   'organization_id', 'is_admin', 'is_active')
+
+class SessionUser(UserMixin):
+    """The logged-in user, rebuilt from its session snapshot without a query."""
+
+    def __init__(self, snapshot):
+        self.id = snapshot['id']
+        self.username = snapshot['username']
+        self.email = snapshot['email']
+        self.first_name = snapshot['first_name']
+        self.last_name = snapshot['last_name']
+        self.organization_id = snapshot['organization_id']
+        self.is_admin = snapshot['is_admin']
+        self._is_active = snapshot['is_active']
+
+    @property
+    def is_active(self):
+        return self._is_active
+
+    @property
+    def organization(self):
+        """The user's organization, as a cached snapshot."""
+        return get_organization(self.organization_id)
+
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+def auth_stamp(user_id, password_hash, is_active, is_admin):
+    """Keyed hash of the fields a session depends on; the password hash itself never enters the cookie."""
+    message = f'{user_id}:{password_hash}:{int(bool(is_active))}:{int(bool(is_admin))}'.encode('utf-8')
+    return hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'), message, hashlib.sha256).hexdigest()[:32]
+
+def _stamps():
+    return get_cache().namespace('user_stamp')
+
+def remember_user(user):
+    """Store a user's snapshot in the session; call after login_user()."""
+    snapshot = {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+    snapshot['stamp'] = auth_stamp(user.id, user.password_hash, user.is_active, user.is_admin)
+    session[SESSION_KEY] = snapshot
+    _stamps().set(str(user.id), snapshot['stamp'], current_app.config['USER_CACHE_TTL'])
+    return SessionUser(snapshot)
+
+def forget_user():
+    """Remove the user's snapshot from the session; call with logout_user()."""
+    session.pop(SESSION_KEY, None)
+
+def invalidate_user(user_id):
+    """Make the next request of a changed user recheck its stamp."""
+    _stamps().delete(str(user_id))
+
+def _current_stamp(user_id):
+    row = db.session.query(User.password_hash, User.is_active, User.is_admin).filter(User.id == user_id).first()
+    return auth_stamp(user_id, *row) if row is not None else None
+
+def load_session_user(user_id):
+    """
+    Return the logged-in user for Flask-Login's user loader.
+
+    Args:
+        user_id (str): ID stored by Flask-Login in the session
+
+    Returns:
+        SessionUser: The user, or None if the session is no longer valid
+    """
+    user_id = int(user_id)
+    snapshot = session.get(SESSION_KEY)
+    if not snapshot or snapshot.get('id') != user_id:
+        # New session, e.g. restored from the remember-me cookie
+        user = User.query.get(user_id)
+        return remember_user(user) if user else None
+
+    stamp = _stamps().get_or_set(str(user_id), lambda: _current_stamp(user_id),
+                                 current_app.config['USER_CACHE_TTL'])
+
+    if stamp == snapshot['stamp']:
+        return SessionUser(snapshot)
+
+    forget_user()
+    if stamp is None:
+        return None
+    user = User.query.get(user_id)
+    if user is None:
+        return None
+    # A changed password ends the session; other changes refresh the snapshot
+    if auth_stamp(user_id, user.password_hash, snapshot['is_active'], snapshot['is_admin']) != snapshot['stamp']:
+        return None
+    return remember_user(user)
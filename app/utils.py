@@ -2,6 +2,7 @@ import os
 import json
 import base64
 import io
+import logging
 from functools import wraps
 from datetime import datetime, timedelta
 from flask import url_for, current_app, render_template, abort
@@ -9,7 +10,17 @@ from flask_login import current_user
 from flask_mail import Message
 import stripe
 from app import mail, db
-from app.models import Organization, EmailTemplate, Document, Badge, Log
+from app.audit import record_audit_event
+from app.blobstore import get_blob_store
+from app.digests import queue_digest_notification
+from app.email_rendering import (CHECKIN_FIELDS, HOST_FIELDS, ORGANIZATION_FIELDS, VISITOR_FIELDS,
+                                  get_compiled_template, template_values)
+from app.mail_queue import enqueue_email
+from app.models import Organization, EmailTemplate, Document, Badge
+from app.organizations import get_organization
+from app.thumbnails import is_uploadable_image
+
+logger = logging.getLogger(__name__)
 
 # Set Stripe API key
 if os.environ.get('STRIPE_SECRET_KEY'):
@@ -24,7 +35,8 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def send_email(subject, recipients, text_body, html_body, sender=None, cc=None, bcc=None, attachments=None):
+def send_email(subject, recipients, text_body, html_body, sender=None, cc=None, bcc=None, attachments=None,
+               commit=True):
     """
     Send an email with optional cc, bcc, and attachments
     
@@ -37,13 +49,37 @@ def send_email(subject, recipients, text_body, html_body, sender=None, cc=None,
         cc (list, optional): List of cc recipients
         bcc (list, optional): List of bcc recipients
         attachments (list, optional): List of attachment dicts with keys 'filename', 'content_type', and 'data'
+        commit (bool): Commit a queued email immediately. Callers queueing it
+            inside a transaction of their own pass False and commit it themselves.
     
     Returns:
-        bool: True if email was sent successfully, False otherwise
+        bool: True if email was sent (or queued for sending) successfully, False otherwise
     """
     if not sender:
         sender = current_app.config['MAIL_DEFAULT_SENDER']
-        
+    
+    # Hand the email to the outbox worker so the request never waits on SMTP
+    if current_app.config.get('EMAIL_QUEUE_ENABLED'):
+        organization_id = current_user.organization_id if current_user and current_user.is_authenticated else None
+        try:
+            # A failed insert only undoes the savepoint, not the caller's work
+            with db.session.begin_nested():
+                enqueue_email(subject, recipients, text_body, html_body, sender,
+                              cc=cc, bcc=bcc, attachments=attachments,
+                              organization_id=organization_id)
+        except Exception as e:
+            logger.error(f"Error queueing email: {str(e)}")
+            return False
+        if commit:
+            try:
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error committing queued email: {str(e)}")
+                db.session.rollback()
+                return False
+        _log_email('email_queued', recipients, subject, cc, bcc, attachments)
+        return True
+    
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
@@ -65,9 +101,19 @@ def send_email(subject, recipients, text_body, html_body, sender=None, cc=None,
                 data=attachment['data']
             )
     
-    # Log the email attempt
     try:
-        log_action('email_sent', {
+        mail.send(msg)
+    except Exception as e:
+        logger.error(f"Error sending email: {str(e)}")
+        # We silently fail rather than stopping the app functionality
+        return False
+    _log_email('email_sent', recipients, subject, cc, bcc, attachments)
+    return True
+
+def _log_email(event_type, recipients, subject, cc, bcc, attachments):
+    """Log an email once it has been sent or queued"""
+    try:
+        log_action(event_type, {
             'to': recipients,
             'subject': subject,
             'cc': cc,
@@ -77,14 +123,6 @@ def send_email(subject, recipients, text_body, html_body, sender=None, cc=None,
     except Exception:
         # If logging fails, continue silently
         pass
-    
-    try:
-        mail.send(msg)
-        return True
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        # We silently fail rather than stopping the app functionality
-        return False
 
 def send_welcome_email(user, organization):
     """Send welcome email to newly registered user"""
@@ -126,15 +164,25 @@ def send_checkin_notification(checkin):
     """Send email notification for visitor check-in"""
     send_visitor_notification(checkin, is_checkout=False)
 
-def send_visitor_notification(checkin, is_checkout=False):
+def visit_duration(checkin):
+    """Format the length of a completed visit, e.g. '1 hours, 5 minutes'"""
+    if not checkin.check_out_time or not checkin.check_in_time:
+        return ''
+    delta = checkin.check_out_time - checkin.check_in_time
+    hours, remainder = divmod(delta.seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return f"{hours} hours, {minutes} minutes"
+
+def send_visitor_notification(checkin, is_checkout=False, digest=True):
     """
     Send email notification for visitor check-in or check-out
     
     Args:
         checkin: The CheckIn model instance
         is_checkout: Boolean indicating if this is a checkout notification (default: False)
+        digest: Hold the notification for the host's digest if they opted in (default: True)
     """
-    organization = Organization.query.get(checkin.visitor.organization_id)
+    organization = get_organization(checkin.visitor.organization_id)
     if not organization.enable_email_notifications:
         return
     
@@ -143,20 +191,21 @@ def send_visitor_notification(checkin, is_checkout=False):
     if not host or not host.email:
         return
     
+    # Hosts in digest mode get one email per window instead of one per visit
+    if digest and host.notification_digest:
+        queue_digest_notification(checkin, is_checkout)
+        return
+    
     # Calculate duration for checkout
-    duration = ''
-    if is_checkout and checkin.check_out_time and checkin.check_in_time:
-        delta = checkin.check_out_time - checkin.check_in_time
-        hours, remainder = divmod(delta.seconds, 3600)
-        minutes, _ = divmod(remainder, 60)
-        duration = f"{hours} hours, {minutes} minutes"
-    
-    # Get template from database or use default
+    duration = visit_duration(checkin) if is_checkout else ''
+    
+    # Get compiled template from the cache or use default
     template_type = 'check_out' if is_checkout else 'check_in'
-    template = EmailTemplate.query.filter_by(
-        organization_id=organization.id,
-        template_type=template_type
-    ).first()
+    try:
+        template = get_compiled_template(organization.id, template_type)
+    except Exception as e:
+        print(f"Error compiling email template: {str(e)}")
+        template = None
     
     if template:
         # Use custom template from database
@@ -174,29 +223,28 @@ def send_visitor_notification(checkin, is_checkout=False):
             'check_out_time': check_out_time,
             'duration': duration,
             'host_name': f"{host.first_name} {host.last_name}",
-            'organization_name': organization.name
+            'organization_name': organization.name,
+            'visitor': template_values(checkin.visitor, VISITOR_FIELDS),
+            'checkin': template_values(checkin, CHECKIN_FIELDS),
+            'host': template_values(host, HOST_FIELDS),
+            'organization': template_values(organization, ORGANIZATION_FIELDS)
         }
         
-        # Replace placeholders in template
-        subject = template.subject
-        body = template.body
-        
-        for key, value in context.items():
-            placeholder = '{{' + key + '}}'
-            if value:
-                subject = subject.replace(placeholder, value)
-                body = body.replace(placeholder, value)
-            else:
-                subject = subject.replace(placeholder, '')
-                body = body.replace(placeholder, '')
-                
-        send_email(
-            subject=subject,
-            recipients=[host.email],
-            text_body=body,
-            html_body=body
-        )
-    else:
+        try:
+            subject, text_body, html_body = template.render(context)
+        except Exception as e:
+            # A template that cannot render falls back to the built-in one
+            print(f"Error rendering email template: {str(e)}")
+            template = None
+        else:
+            send_email(
+                subject=subject,
+                recipients=[host.email],
+                text_body=text_body,
+                html_body=html_body
+            )
+    
+    if not template:
         # Use built-in template
         current_year = datetime.utcnow().year
         
@@ -247,6 +295,33 @@ def encode_image(image_file):
         print(f"Error encoding image: {str(e)}")
         return None
 
+def store_image(image_file):
+    """
+    Save an uploaded image to the blob store
+    
+    Args:
+        image_file: The uploaded file (werkzeug FileStorage)
+    
+    Returns:
+        str: The blob key to store on the model, or None if there is no
+        image or the file is not one
+    """
+    if not image_file:
+        return None
+    
+    try:
+        img_data = image_file.read()
+        if not img_data:
+            return None
+        # Only real images are stored; the file extension proves nothing
+        if not is_uploadable_image(img_data):
+            print("Error storing image: not a JPEG, PNG, GIF or WebP image")
+            return None
+        return get_blob_store().put(img_data)
+    except Exception as e:
+        print(f"Error storing image: {str(e)}")
+        return None
+
 def generate_badge_data(checkin):
     """Generate badge data for printing"""
     organization = Organization.query.get(checkin.visitor.organization_id)
@@ -417,19 +492,19 @@ def create_default_email_templates(organization_id):
         },
         {
             'name': 'Preregistration Confirmation',
-            'subject': 'Visitor Preregistration: {{visitor_name}} on {{expected_arrival}}',
+            'subject': 'Your visit to {{organization_name}} on {{expected_arrival}}',
             'body': """
                 <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
                     <h2>Visitor Preregistration Confirmation</h2>
-                    <p>Hello,</p>
-                    <p>A visitor has been preregistered to meet you:</p>
+                    <p>Dear {{visitor_name}},</p>
+                    <p>Your visit has been confirmed:</p>
                     <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                        <p><strong>Name:</strong> {{visitor_name}}</p>
-                        <p><strong>Company:</strong> {{visitor_company}}</p>
+                        <p><strong>Host:</strong> {{host_name}}</p>
                         <p><strong>Purpose:</strong> {{visitor_purpose}}</p>
                         <p><strong>Expected Arrival:</strong> {{expected_arrival}}</p>
+                        <p><strong>Express Check-in Code:</strong> {{code}}</p>
                     </div>
-                    <p>You will be notified when the visitor checks in.</p>
+                    <p>Enter your code at the reception kiosk to check in.</p>
                     <p>Thank you,<br>{{organization_name}} Visitor Management System</p>
                 </div>
             """,
@@ -525,22 +600,16 @@ def create_default_badge_template(organization_id):
     db.session.commit()
 
 def log_action(event_type, event_data=None):
-    """Log an action in the system"""
+    """Log an action in the system (buffered; written when the request ends)"""
     if not current_user or not current_user.is_authenticated:
         return
     
     try:
-        log = Log(
+        record_audit_event(
             organization_id=current_user.organization_id,
             user_id=current_user.id,
             event_type=event_type,
-            event_data=json.dumps(event_data) if event_data else None,
-            created_at=datetime.utcnow()
+            event_data=event_data
         )
-        
-        db.session.add(log)
-        db.session.commit()
     except Exception as e:
-        print(f"Error logging action: {str(e)}")
-        # Roll back any failed transaction
-        db.session.rollback()
\ No newline at end of file
+        print(f"Error logging action: {str(e)}")
\ No newline at end of file
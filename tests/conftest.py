@@ -0,0 +1,46 @@
+"""
+Shared fixtures: an application on a throwaway SQLite database with one
+organization, a host and an admin user.
+"""
+
+import pytest
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'false')
+    monkeypatch.setenv('ASSETS_PATH', str(tmp_path / 'assets'))
+    monkeypatch.setenv('CACHE_PATH', str(tmp_path / 'cache'))
+    monkeypatch.setenv('BLOB_STORAGE_PATH', str(tmp_path / 'blobs'))
+    monkeypatch.setenv('THUMBNAIL_CACHE_PATH', str(tmp_path / 'thumbnails'))
+
+    from app import create_app, db
+    from app.models import Organization, Staff, User
+    from app.roster import invalidate_roster
+
+    invalidate_roster()  # Rosters are kept per process, across databases
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, MAIL_SUPPRESS_SEND=True)
+    with app.app_context():
+        organization = Organization(name='Acme', contact_email='office@acme.example')
+        db.session.add(organization)
+        db.session.flush()
+        db.session.add(Staff(organization_id=organization.id, first_name='Hana', last_name='Host',
+                             email='hana@acme.example'))
+        admin = User(username='admin', email='admin@acme.example', organization_id=organization.id,
+                     is_admin=True)
+        admin.set_password('secret')
+        db.session.add(admin)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def admin_client(client):
+    client.post('/login', data={'email': 'admin@acme.example', 'password': 'secret'})
+    return client
@@ -0,0 +1,68 @@
+import os
+import shutil
+import brotli
+import pytest
+from app.assets import build_assets, minify_js
+
+def _build(app):
+    manifest = build_assets(app.static_folder, app.config['ASSETS_PATH'])
+    app.extensions['assets'] = manifest
+    return manifest
+
+def test_built_assets_are_served_precompressed(app, client):
+    manifest = _build(app)
+    hashed = manifest['files']['css/kiosk-bundle.css']
+
+    response = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    assert 'immutable' in response.headers['Cache-Control']
+
+def test_files_from_earlier_builds_are_still_served(app, client):
+    manifest = _build(app)
+    # A file the previous release built, no longer in the manifest
+    current = os.path.join(app.config['ASSETS_PATH'], manifest['files']['css/kiosk-bundle.css'])
+    earlier = os.path.join(app.config['ASSETS_PATH'], 'css/kiosk-bundle.0123456789ab.css')
+    shutil.copy(current, earlier)
+    shutil.copy(current + '.gz', earlier + '.gz')
+
+    response = client.get('/static/css/kiosk-bundle.0123456789ab.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'gzip'
+    assert response.mimetype == 'text/css'
+
+    assert client.get('/static/css/kiosk-bundle.ba9876543210.css').status_code == 404
+    assert client.get('/static/../assets/css/kiosk-bundle.0123456789ab.css').status_code == 404
+
+def test_brotli_variants_are_built_and_served(app, client):
+    manifest = _build(app)
+    hashed = manifest['files']['css/kiosk-bundle.css']
+    assert 'br' in manifest['encodings'][hashed]
+    path = os.path.join(app.config['ASSETS_PATH'], hashed)
+    with open(path, 'rb') as f, open(path + '.br', 'rb') as compressed:
+        assert brotli.decompress(compressed.read()) == f.read()
+
+    response = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.content_encoding == 'br'
+    with open(path + '.br', 'rb') as compressed:
+        assert response.data == compressed.read()
+
+@pytest.mark.parametrize('source, expected', [
+    # Postfix increments and decrements end an expression, so the slash divides
+    ('y = x++ / 2; s = "a/ b    c";', 'y=x++ / 2;s="a/ b    c";'),
+    ('y = x-- / 2; s = "a/ b    c";', 'y=x-- / 2;s="a/ b    c";'),
+    ('y = a[0]++ / 2; s = "a/ b    c";', 'y=a[0]++ / 2;s="a/ b    c";'),
+    ('y = f() / 2 / g; s = "  ";', 'y=f() / 2 / g;s="  ";'),
+    ('y = 10 / 2; z = "a/ b    c";', 'y=10 / 2;z="a/ b    c";'),
+    ('y = "x" / 2; z = / a  b /g;', 'y="x" / 2;z= / a  b /g;'),
+    ('y = this.return / 2; s = "a/ b    c";', 'y=this.return / 2;s="a/ b    c";'),
+    # Elsewhere a slash starts a regular expression, which is copied as-is
+    ('x = ++/ a  b /.lastIndex;', 'x=++/ a  b /.lastIndex;'),
+    ('return / a  b /.test(s);', 'return / a  b /.test(s);'),
+    ('f(/ a  b /g, "  ");', 'f(/ a  b /g,"  ");'),
+    ('x = a + / a  b /.source;', 'x=a+ / a  b /.source;'),
+    ('x = y ? / a  b / : z;', 'x=y? / a  b / :z;'),
+])
+def test_minify_js_tells_division_from_regular_expressions(source, expected):
+    assert minify_js(source) == expected + '\n'
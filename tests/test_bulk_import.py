@@ -0,0 +1,62 @@
+import io
+import json
+from datetime import datetime
+from openpyxl import Workbook
+from app.models import PreregisteredVisitor, Staff, Visitor
+
+def _xlsx(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    data = io.BytesIO()
+    workbook.save(data)
+    data.seek(0)
+    return data
+
+def _events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def test_visitors_are_imported_from_xlsx(app, admin_client):
+    upload = _xlsx([
+        ['First Name', 'Surname', 'E-mail', 'Company', 'First Visit'],
+        ['Ada', 'Lovelace', 'ada@example.com', 'Analytical', datetime(2024, 1, 31, 9, 30)],
+        [None, None, None, None, None],
+        ['Alan', 'Turing', 'alan@example.com', None, '2024-02-01'],
+        ['Grace', 'Hopper', 'ada@example.com', 'Navy', None],
+    ])
+
+    response = admin_client.post('/visitors/import', data={'file': (upload, 'visitors.xlsx')},
+                                 content_type='multipart/form-data')
+    assert response.status_code == 200
+    done = _events(response)[-1]
+    assert done['event'] == 'done'
+    assert (done['imported'], done['duplicates'], done['error_count']) == (2, 1, 0)
+
+    with app.app_context():
+        visitors = {visitor.email: visitor for visitor in Visitor.query.all()}
+    assert set(visitors) == {'ada@example.com', 'alan@example.com'}
+    assert visitors['ada@example.com'].company == 'Analytical'
+    assert visitors['ada@example.com'].created_at == datetime(2024, 1, 31, 9, 30)
+    assert visitors['alan@example.com'].created_at == datetime(2024, 2, 1)
+
+def test_a_file_that_is_not_a_spreadsheet_is_reported(admin_client):
+    response = admin_client.post('/visitors/import', data={'file': (io.BytesIO(b'first,last\n'), 'visitors.xlsx')},
+                                 content_type='multipart/form-data')
+    assert _events(response) == [{'event': 'error', 'message': 'The file is not an XLSX spreadsheet.'}]
+
+def test_guests_are_preregistered_from_an_upload(app, admin_client):
+    with app.app_context():
+        staff_id = Staff.query.one().id
+    upload = io.BytesIO(b'first_name,last_name,email,expected_arrival\n'
+                        b'Ada,Lovelace,ada@example.com,2030-01-31 09:30\n')
+
+    response = admin_client.post('/visitors/preregister/bulk',
+                                 data={'file': (upload, 'guests.csv'), 'staff_id': staff_id},
+                                 content_type='multipart/form-data')
+    done = _events(response)[-1]
+    assert done['event'] == 'done'
+    assert done['imported'] == 1
+
+    with app.app_context():
+        guest = PreregisteredVisitor.query.one()
+    assert (guest.email, guest.staff_id) == ('ada@example.com', staff_id)
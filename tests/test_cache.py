@@ -0,0 +1,48 @@
+import threading
+import pytest
+from app.cache import Cache, CacheBackend, FileBackend
+
+def test_value_that_cannot_be_cached_is_still_returned(app, tmp_path):
+    cache = Cache(FileBackend(str(tmp_path / 'cache')))
+    namespace = cache.namespace('test')
+
+    # Lambdas cannot be pickled
+    value = namespace.get_or_set('key', lambda: (lambda: 'loaded'))
+    assert value() == 'loaded'
+
+    def disk_full(path, data):
+        raise OSError('No space left on device')
+
+    cache.backend._write = disk_full
+    assert namespace.get_or_set('other', lambda: 42) == 42
+
+def test_file_counter_is_never_seen_empty(tmp_path):
+    backend = FileBackend(str(tmp_path / 'cache'))
+    backend.incr('generation')
+    done = threading.Event()
+    missing = []
+
+    def read():
+        while not done.is_set():
+            if backend.get('generation') is None:
+                missing.append(True)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        for _ in range(300):
+            backend.incr('generation')
+    finally:
+        done.set()
+        reader.join()
+
+    assert int(backend.get('generation')) == 301
+    assert not missing
+
+def test_incomplete_backend_cannot_be_created():
+    class GetOnlyBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
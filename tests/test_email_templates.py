@@ -0,0 +1,58 @@
+from app import db
+from app.email_rendering import invalidate_email_template, validate_email_template
+from app.models import CheckIn, EmailTemplate, OutboundEmail, Visitor
+
+MALICIOUS_BODY = '<p>{{ visitor.query.delete() }}</p>'
+
+def test_template_calling_model_methods_is_rejected(app):
+    with app.app_context():
+        assert validate_email_template('Visitor arrived', MALICIOUS_BODY) is not None
+        assert validate_email_template('{{ organization.update(name="x") }}', '<p>Hi</p>') is not None
+        assert validate_email_template('{{ visitor_name }} arrived', '<p>{{ visitor.first_name }}</p>') is None
+
+def test_stored_malicious_template_has_no_effect(app, client):
+    with app.app_context():
+        # Saved before validation existed, or written to the table directly
+        db.session.add(EmailTemplate(name='Arrival', subject='Visitor arrived', body=MALICIOUS_BODY,
+                                     template_type='check_in', organization_id=1))
+        db.session.commit()
+        invalidate_email_template(1)
+
+    response = client.post('/kiosk/org/1/check-in', data={
+        'first_name': 'Vera', 'last_name': 'Visitor', 'email': 'vera@example.com',
+        'purpose': 'Meeting', 'staff_id': '1',
+    })
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert Visitor.query.count() == 1
+        assert CheckIn.query.count() == 1
+        # The built-in notification is sent instead
+        email = OutboundEmail.query.one()
+        assert 'Vera Visitor' in email.subject
+
+def test_preregistration_template_gets_plain_values(app, client):
+    from datetime import datetime, timedelta
+    from app.models import PreregisteredVisitor
+    from app.preregistration import preregister_visitor, process_preregistration_confirmations
+
+    with app.test_request_context():
+        db.session.add(EmailTemplate(name='Welcome', subject='See you soon',
+                                     body='<p>{{ visitor.first_name }}</p><p>{{ visitor.query.delete() }}</p>',
+                                     template_type='preregister', organization_id=1))
+        db.session.commit()
+        invalidate_email_template(1)
+        code = preregister_visitor(1, 1, 'Pia', 'Guest', 'pia@example.com',
+                                   datetime.utcnow() + timedelta(hours=2)).code
+
+        assert process_preregistration_confirmations() == 1
+        assert PreregisteredVisitor.query.count() == 1
+        email = OutboundEmail.query.one()
+        assert code in email.text_body
+
+    # The code from the email checks the guest in at the kiosk
+    response = client.post('/kiosk/org/1/express', data={'code': code})
+    assert response.status_code == 302
+    with app.app_context():
+        assert CheckIn.query.count() == 1
+        assert PreregisteredVisitor.query.one().status == 'checked_in'
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta
+import pytest
+from app.models import CheckIn
+from app.preregistration import (ExpressCheckInError, express_check_in, generate_express_token,
+                                 preregister_visitor, qr_code_available)
+
+def _preregister(arrival):
+    return preregister_visitor(1, 1, 'Pia', 'Guest', 'pia@example.com', arrival)
+
+def test_typed_code_checks_in_within_validity(app):
+    preregistration = _preregister(datetime.utcnow() - timedelta(days=1))
+    checkin = express_check_in(1, preregistration.code.lower())
+    assert checkin.visitor.email == 'pia@example.com'
+
+def test_typed_code_expires_with_token(app):
+    preregistration = _preregister(datetime.utcnow() - timedelta(days=app.config['EXPRESS_TOKEN_VALID_DAYS'] + 1))
+
+    with pytest.raises(ExpressCheckInError, match='expired'):
+        express_check_in(1, preregistration.code)
+    with pytest.raises(ExpressCheckInError, match='expired'):
+        express_check_in(1, generate_express_token(preregistration))
+    assert CheckIn.query.count() == 0
+
+def test_qr_code_is_rendered(app, client):
+    assert qr_code_available()
+    token = generate_express_token(_preregister(datetime.utcnow()))
+    response = client.get(f'/kiosk/org/1/express/qr/{token}.png')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
@@ -0,0 +1,42 @@
+from app import db
+from app.models import CheckIn
+
+def _check_in(client, first_name, last_name, company):
+    response = client.post('/kiosk/org/1/check-in', data={
+        'first_name': first_name, 'last_name': last_name, 'email': f'{first_name.lower()}@example.com',
+        'company': company, 'purpose': 'Meeting', 'staff_id': '1',
+    })
+    assert response.status_code == 302
+
+def test_search_finds_checked_in_visitors(app, client):
+    _check_in(client, 'Vera', 'Visitor', 'Globex')
+    _check_in(client, 'Otto', 'Other', 'Initech')
+
+    response = client.get('/kiosk/org/1/search?q=vera')
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['first_name'] for result in results] == ['Vera']
+    # The kiosk is public, so no contact details are returned
+    assert 'email' not in results[0]
+
+def test_check_out_lists_and_checks_out_visitors(app, client):
+    _check_in(client, 'Vera', 'Visitor', 'Globex')
+    _check_in(client, 'Otto', 'Other', 'Initech')
+
+    response = client.get('/kiosk/org/1/check-out')
+    assert response.status_code == 200
+    assert b'Vera Visitor' in response.data and b'Otto Other' in response.data
+
+    response = client.get('/kiosk/org/1/check-out?q=otto')
+    assert b'Otto Other' in response.data and b'Vera Visitor' not in response.data
+
+    with app.app_context():
+        checkin_id = CheckIn.query.join(CheckIn.visitor).filter_by(first_name='Otto').one().id
+    response = client.post('/kiosk/org/1/check-out', data={'visitor_id': str(checkin_id)})
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(CheckIn, checkin_id).check_out_time is not None
+    response = client.get('/kiosk/org/1/check-out')
+    assert b'Vera Visitor' in response.data and b'Otto Other' not in response.data
+    assert client.get('/kiosk/org/1/search?q=otto').get_json()['results'] == []
@@ -0,0 +1,58 @@
+from app.models import Organization
+
+def test_kiosk_pages_render(client):
+    for path in ('/kiosk/', '/kiosk/org/1', '/kiosk/org/1/check-in', '/kiosk/org/1/check-out',
+                 '/kiosk/org/1/express', '/kiosk/org/1/success'):
+        assert client.get(path).status_code == 200, path
+
+def test_inactive_organization_is_hidden(app, client):
+    from app import db
+    from app.organizations import invalidate_organization
+
+    with app.app_context():
+        db.session.get(Organization, 1).subscription_status = 'unpaid'
+        db.session.commit()
+        invalidate_organization(1)
+
+    assert b'Acme' not in client.get('/kiosk/').data
+    response = client.get('/kiosk/org/1')
+    assert response.status_code == 302
+
+def test_cached_page_answers_conditional_requests(client):
+    for path in ('/kiosk/', '/kiosk/org/1', '/kiosk/org/1/success'):
+        first = client.get(path)
+        etag = first.headers['ETag']
+        assert first.headers['Last-Modified']
+        assert 'no-cache' in first.headers['Cache-Control']
+
+        revalidated = client.get(path, headers={'If-None-Match': etag})
+        assert revalidated.status_code == 304, path
+        assert revalidated.data == b''
+
+def test_branding_change_replaces_page(app, client):
+    from app import db
+    from app.organizations import invalidate_organization
+
+    etag = client.get('/kiosk/org/1').headers['ETag']
+    with app.app_context():
+        db.session.get(Organization, 1).name = 'Acme Labs'
+        db.session.commit()
+        invalidate_organization(1)
+
+    response = client.get('/kiosk/org/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Acme Labs' in response.data
+    assert response.headers['ETag'] != etag
+
+def test_page_with_flash_is_not_cached(client):
+    response = client.post('/kiosk/org/1/check-in', data={
+        'first_name': 'Vera', 'last_name': 'Visitor', 'email': 'vera@example.com',
+        'purpose': 'Meeting', 'staff_id': '1',
+    })
+    assert response.status_code == 302
+
+    success = client.get('/kiosk/org/1/success')
+    assert b'Welcome, Vera' in success.data
+    assert 'ETag' not in success.headers
+    # The flash was shown once; the cached page does not repeat it
+    assert b'Welcome, Vera' not in client.get('/kiosk/org/1/success').data
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import select
+from app import db, mail, utils
+from app.mail_queue import enqueue_email, process_outbox
+from app.models import Organization, OutboundEmail
+from app.utils import send_email
+
+def _enqueue(subject):
+    return enqueue_email(subject, ['hana@acme.example'], 'Hello', '<p>Hello</p>', 'office@acme.example',
+                         organization_id=1)
+
+def test_enqueue_does_not_commit_the_caller(app):
+    db.session.get(Organization, 1).name = 'Renamed'
+    _enqueue('Hello')
+    db.session.rollback()
+
+    assert db.session.get(Organization, 1).name == 'Acme'
+    assert OutboundEmail.query.count() == 0
+
+def test_outbox_commits_claim_before_sending(app, monkeypatch):
+    _enqueue('First')
+    _enqueue('Second')
+    db.session.commit()
+    seen = []
+
+    class Connection:
+        def send(self, message):
+            # Another worker sees the claim while the email is being sent
+            with db.engine.connect() as connection:
+                next_attempt_at, = connection.execute(
+                    select(OutboundEmail.next_attempt_at).where(OutboundEmail.subject == message.subject)
+                ).one()
+            seen.append((message.subject, next_attempt_at > datetime.utcnow()))
+
+    @contextmanager
+    def connect():
+        yield Connection()
+
+    monkeypatch.setattr(mail, 'connect', connect)
+
+    assert process_outbox() == 2
+    assert seen == [('First', True), ('Second', True)]
+    assert {email.status for email in OutboundEmail.query} == {'sent'}
+
+def test_notification_email_is_committed_after_the_check_in(app, client):
+    # Badge printing commits after the notification; without it nothing else does
+    db.session.get(Organization, 1).enable_badge_printing = False
+    db.session.commit()
+
+    response = client.post('/kiosk/org/1/check-in', data={
+        'first_name': 'Vera', 'last_name': 'Visitor', 'email': 'vera@example.com',
+        'purpose': 'Meeting', 'staff_id': '1',
+    })
+    assert response.status_code == 302
+    db.session.remove()
+    assert OutboundEmail.query.count() == 1
+
+def test_send_email_in_a_transaction_is_committed_by_the_caller(app):
+    db.session.get(Organization, 1).name = 'Renamed'
+    assert send_email('Hello', ['hana@acme.example'], 'Hello', '<p>Hello</p>', commit=False)
+    db.session.rollback()
+
+    assert db.session.get(Organization, 1).name == 'Acme'
+    assert OutboundEmail.query.count() == 0
+
+def test_failed_enqueue_keeps_the_callers_work(app, monkeypatch):
+    def enqueue_and_fail(*args, **kwargs):
+        _enqueue('Half written')
+        raise RuntimeError('outbox unavailable')
+
+    monkeypatch.setattr(utils, 'enqueue_email', enqueue_and_fail)
+    db.session.get(Organization, 1).name = 'Renamed'
+    assert not send_email('Hello', ['hana@acme.example'], 'Hello', '<p>Hello</p>', commit=False)
+    db.session.commit()
+
+    db.session.remove()
+    assert db.session.get(Organization, 1).name == 'Renamed'
+    assert OutboundEmail.query.count() == 0
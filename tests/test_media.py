@@ -0,0 +1,72 @@
+import io
+import pytest
+from PIL import Image
+from app import db
+from app.blobstore import BlobStore, get_blob_store
+from app.models import Organization, Visitor
+
+def _png():
+    output = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 0, 0)).save(output, 'PNG')
+    return output.getvalue()
+
+def _save_logo(admin_client, data):
+    return admin_client.post('/settings/organization', data={
+        'name': 'Acme', 'contact_email': 'office@acme.example',
+        'logo': (io.BytesIO(data), 'logo.png'),
+    }, content_type='multipart/form-data')
+
+def test_html_disguised_as_logo_is_rejected(app, admin_client):
+    _save_logo(admin_client, b'<html><script>alert(document.cookie)</script></html>')
+    with app.app_context():
+        assert db.session.get(Organization, 1).logo_blob is None
+
+def test_logo_is_public(app, admin_client):
+    _save_logo(admin_client, _png())
+    with app.app_context():
+        logo_blob = db.session.get(Organization, 1).logo_blob
+    assert logo_blob
+
+    admin_client.get('/logout')
+    response = admin_client.get(f'/media/{logo_blob}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert 'public' in response.headers['Cache-Control']
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+
+def _visitor_blob(app, data):
+    with app.app_context():
+        key = get_blob_store().put(data)
+        db.session.add(Visitor(first_name='Vera', last_name='Visitor', organization_id=1, photo_blob=key))
+        db.session.commit()
+    return key
+
+def test_photo_needs_organization_login(app, client, admin_client):
+    key = _visitor_blob(app, _png())
+
+    response = admin_client.get(f'/media/{key}')
+    assert response.status_code == 200
+    assert 'private' in response.headers['Cache-Control']
+    assert 'public' not in response.headers['Cache-Control']
+    assert admin_client.get(f'/media/{key}/sm').status_code == 200
+
+    admin_client.get('/logout')
+    assert admin_client.get(f'/media/{key}').status_code == 404
+    assert admin_client.get(f'/media/{key}/sm').status_code == 404
+
+def test_other_content_is_downloaded(app, admin_client):
+    key = _visitor_blob(app, b'<html><script>alert(1)</script></html>')
+
+    response = admin_client.get(f'/media/{key}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/octet-stream'
+    assert response.headers['Content-Disposition'].startswith('attachment')
+    assert response.headers['X-Content-Type-Options'] == 'nosniff'
+
+def test_incomplete_blob_store_cannot_be_created():
+    class ReadOnlyStore(BlobStore):
+        def read(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import Visitor
+from app.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+COLUMNS = (Visitor.created_at, Visitor.id)
+
+def test_tampered_cursors_are_ignored():
+    assert decode_cursor(encode_cursor([datetime(2024, 1, 1), 5]), COLUMNS) == [datetime(2024, 1, 1), 5]
+    assert decode_cursor(encode_cursor([None, 5]), COLUMNS) == [None, 5]
+    for values in (['2024-01-01T00:00:00', '5'], ['2024-01-01T00:00:00', True], [123, 5],
+                   ['not a date', 5], ['2024-01-01T00:00:00', None], ['2024-01-01T00:00:00', 5.5]):
+        assert decode_cursor(encode_cursor(values), COLUMNS) is None
+    assert decode_cursor('not base64!', COLUMNS) is None
+
+def test_pages_include_rows_without_a_sort_key(app):
+    now = datetime.utcnow()
+    for i in range(7):
+        visitor = Visitor(first_name=f'Guest{i}', last_name='Visitor', organization_id=1)
+        db.session.add(visitor)
+        db.session.flush()
+        # Imported visitors may have no creation time
+        visitor.created_at = None if i % 3 == 0 else now - timedelta(minutes=i)
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        page = keyset_paginate(Visitor.query, COLUMNS, cursor, per_page=2)
+        seen.extend(visitor.id for visitor in page)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+        assert decode_cursor(cursor, COLUMNS) is not None
+
+    # Visitors without a creation time first, then newest first
+    visitors = Visitor.query.all()
+    undated = sorted((v.id for v in visitors if v.created_at is None), reverse=True)
+    dated = [v.id for v in sorted((v for v in visitors if v.created_at), key=lambda v: (v.created_at, v.id),
+                                  reverse=True)]
+    assert seen == undated + dated
@@ -0,0 +1,31 @@
+import pytest
+
+@pytest.fixture
+def profiling(app):
+    app.config.update(PROFILING_ENABLED=True, PROFILING_TOKEN='profile-secret', METRICS_TOKEN='metrics-secret')
+
+def test_anonymous_clients_cannot_request_profiles(app, client, profiling):
+    response = client.get('/kiosk/', headers={'X-Profile-SQL': '1'})
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+def test_admins_and_token_holders_get_server_timing(app, client, admin_client, profiling):
+    response = admin_client.get('/', headers={'X-Profile-SQL': '1'})
+    assert 'queries' in response.headers['Server-Timing']
+
+    response = client.get('/kiosk/', headers={'X-Profile-SQL': 'profile-secret'})
+    assert 'queries' in response.headers['Server-Timing']
+
+def test_sampled_requests_do_not_expose_timing(app, client, profiling):
+    app.config['PROFILING_SAMPLE_RATE'] = 1.0
+    assert 'Server-Timing' not in client.get('/kiosk/').headers
+
+def test_metrics_need_the_token(app, client):
+    assert client.get('/metrics').status_code == 404
+
+    app.config['METRICS_TOKEN'] = 'metrics-secret'
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+    response = client.get('/metrics', headers={'Authorization': 'Bearer metrics-secret'})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import CheckIn, Staff, Visitor
+from app.roster import invalidate_roster
+
+VIEWS = ['/', '/reports/', '/kiosk/org/1/check-out', '/visitors/check-out']
+
+def _add_visits(count, checked_out=False):
+    """Add visits, each by a new visitor to a new host, as listings show one row per visit."""
+    now = datetime.utcnow()
+    for i in range(count):
+        host = Staff(first_name=f'Host{i}', last_name='Staff', email=f'host{i}.{now.timestamp()}@acme.example',
+                     organization_id=1)
+        visitor = Visitor(first_name=f'Guest{i}', last_name='Visitor', organization_id=1,
+                          photo='x' * 1000)
+        db.session.add_all([host, visitor])
+        db.session.flush()
+        db.session.add(CheckIn(visitor_id=visitor.id, staff_id=host.id, organization_id=1, purpose='Meeting',
+                               check_in_time=now - timedelta(minutes=i + 1),
+                               check_out_time=now if checked_out else None))
+    db.session.commit()
+    invalidate_roster()
+
+def _count_statements(client, path):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+@pytest.mark.parametrize('path', VIEWS)
+def test_statement_count_does_not_grow_with_rows(app, admin_client, path):
+    client = admin_client if not path.startswith('/kiosk') else app.test_client()
+    _add_visits(2)
+    _add_visits(2, checked_out=True)
+    # The first request warms per-process caches
+    client.get(path)
+    few = _count_statements(client, path)
+
+    _add_visits(20)
+    _add_visits(20, checked_out=True)
+    client.get(path)
+    many = _count_statements(client, path)
+    assert many == few
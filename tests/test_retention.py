@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import Badge, CheckIn, PendingNotification, RosterVersion, Visitor
+from app.partitions import maintain_partitions
+from app.roster import get_active_roster
+
+def _old_check_in():
+    visitor = Visitor(first_name='Olga', last_name='Old', organization_id=1)
+    db.session.add(visitor)
+    db.session.flush()
+    db.session.add(CheckIn(visitor_id=visitor.id, staff_id=1, organization_id=1, purpose='Meeting',
+                           check_in_time=datetime.utcnow() - timedelta(days=3 * 365)))
+    db.session.commit()
+
+def test_retention_is_off_by_default(app):
+    assert app.config['RETENTION_ENABLED'] is False
+    _old_check_in()
+
+    assert maintain_partitions() == {}
+    assert CheckIn.query.count() == 1
+
+def test_retention_deletes_history_when_enabled(app):
+    _old_check_in()
+
+    results = maintain_partitions(retention=True)
+    assert results['checkins']['rows_deleted'] == 1
+    assert CheckIn.query.count() == 0
+
+def test_check_in_references_have_no_foreign_key(app):
+    # A partitioned checkins table has no key on id alone to reference
+    for model in (Badge, PendingNotification):
+        assert not [key for key in model.__table__.foreign_keys if key.column.table.name == 'checkins']
+
+    _old_check_in()
+    checkin = CheckIn.query.one()
+    db.session.add(Badge(check_in_id=checkin.id, template_data='{}'))
+    db.session.add(PendingNotification(staff_id=1, check_in_id=checkin.id))
+    db.session.commit()
+    assert Badge.query.one().check_in is checkin
+    assert PendingNotification.query.one().checkin is checkin
+    assert checkin.badge == [Badge.query.one()]
+
+@pytest.mark.parametrize('revalidate_seconds', [0, 3600])
+def test_purged_check_ins_leave_the_roster(app, revalidate_seconds):
+    app.config['ROSTER_REVALIDATE_SECONDS'] = revalidate_seconds
+    _old_check_in()
+    assert [entry.first_name for entry in get_active_roster(1)] == ['Olga']
+    version = db.session.get(RosterVersion, 1).version
+
+    maintain_partitions(retention=True)
+    # Other workers see the version move; this one drops its roster
+    assert db.session.get(RosterVersion, 1).version == version + 1
+    assert get_active_roster(1) == []
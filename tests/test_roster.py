@@ -0,0 +1,71 @@
+from datetime import datetime
+from sqlalchemy import event, insert, update
+from app import db
+from app.models import CheckIn, RosterVersion, Visitor
+from app.roster import get_active_roster
+
+def _visitor(first_name):
+    visitor = Visitor(first_name=first_name, last_name='Visitor', organization_id=1)
+    db.session.add(visitor)
+    db.session.commit()
+    return visitor.id
+
+def _check_in(visitor_id):
+    checkin = CheckIn(visitor_id=visitor_id, staff_id=1, organization_id=1, purpose='Meeting')
+    db.session.add(checkin)
+    db.session.commit()
+    return checkin.id
+
+def _other_worker(*statements):
+    """Commit statements on a separate connection, as another worker's request would."""
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+        connection.execute(update(RosterVersion).where(RosterVersion.organization_id == 1)
+                           .values(version=RosterVersion.version + 1))
+
+def _count_statements(func):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+def test_local_changes_keep_the_roster_current(app):
+    vera = _check_in(_visitor('Vera'))
+    assert [entry.id for entry in get_active_roster(1)] == [vera]
+
+    otto = _check_in(_visitor('Otto'))
+    checkin = db.session.get(CheckIn, vera)
+    checkin.check_out_time = datetime.utcnow()
+    db.session.commit()
+
+    assert [entry.id for entry in get_active_roster(1)] == [otto]
+    # Up to date: only the version is read
+    assert _count_statements(lambda: get_active_roster(1)) == 1
+    assert db.session.get(RosterVersion, 1).version == 3
+
+def test_other_workers_changes_are_noticed(app):
+    vera = _check_in(_visitor('Vera'))
+    otto_id = _visitor('Otto')
+    get_active_roster(1)
+
+    # Another worker checks Otto in and Vera out
+    _other_worker(
+        insert(CheckIn).values(visitor_id=otto_id, staff_id=1, organization_id=1, purpose='Meeting',
+                               check_in_time=datetime.utcnow()),
+        update(CheckIn).where(CheckIn.id == vera).values(check_out_time=datetime.utcnow()),
+    )
+    assert [entry.first_name for entry in get_active_roster(1)] == ['Otto']
+
+def test_revalidation_interval_skips_the_version_read(app):
+    _check_in(_visitor('Vera'))
+    app.config['ROSTER_REVALIDATE_SECONDS'] = 60
+    get_active_roster(1)
+    assert _count_statements(lambda: get_active_roster(1)) == 0